@@ -1,34 +1,46 @@
 from gpio import *
 from time import *
 
+NAP_MASODPERC = 24 * 60 * 60
+
+def napi_masodperc():
+    # Aktuális idő lekérdezése a time modulból, éjfél óta eltelt másodpercekben
+    aktualis_ido = localtime()
+    ora = aktualis_ido[3]    # Az óra a 3. elem a time tuple-ben
+    perc = aktualis_ido[4]   # A perc a 4. elem a time tuple-ben
+    masodperc = aktualis_ido[5]
+    return ora * 3600 + perc * 60 + masodperc
+
 def main():
     # Konfiguráljuk a kimenetet a locsoló rendszerhez
     pinMode(2, OUT)  # D2: Locsolo rendszer vezerlese
+    locsolas_kezdete = 17 * 3600  # Locsolas kezdete (17:00) masodpercben
     locsolas_idotartam = 30  # Locsolas idotartama percben
+    locsolas_vege = locsolas_kezdete + locsolas_idotartam * 60
+    locsol = None
     
     while True:
-        # Aktuális idő lekérdezése a time modulból
-        aktualis_ido = localtime()
-        ora = aktualis_ido[3]    # Az óra a 3. elem a time tuple-ben
-        perc = aktualis_ido[4]   # A perc a 4. elem a time tuple-ben
+        most = napi_masodperc()
         
-        # Időzítés ellenőrzése (17:00)
-        if ora == 17 and perc == 0:
-            print("17:00 - Locsolas kezdese")
-            digitalWrite(2, HIGH)  # Locsolo rendszer bekapcsolasa
-            
-            # Locsolás a beállított ideig
-            sleep(locsolas_idotartam * 60)  # Másodpercekre átváltva
-            
-            # Locsolás befejezése
-            digitalWrite(2, LOW)  # Locsolo rendszer kikapcsolasa
-            print("Locsolas befejezve")
-            
-            # Várjunk 1 percet, hogy ne induljon újra azonnal
-            sleep(60)
+        # A kimenet állapota az időablakból következik, így egy késve
+        # induló program is helyesen kapcsol
+        if locsolas_kezdete <= most < locsolas_vege:
+            if locsol is not True:
+                print("17:00 - Locsolas kezdese")
+                digitalWrite(2, HIGH)  # Locsolo rendszer bekapcsolasa
+                locsol = True
+            # Alvás a locsolás végéig
+            varakozas = locsolas_vege - most
+        else:
+            if locsol is not False:
+                digitalWrite(2, LOW)  # Locsolo rendszer kikapcsolasa
+                if locsol:
+                    print("Locsolas befejezve")
+                locsol = False
+            # Alvás pontosan a következő locsolás kezdetéig
+            varakozas = (locsolas_kezdete - most) % NAP_MASODPERC
         
-        # Ellenőrzés 10 másodpercenként
-        sleep(10)
+        sleep(max(1, varakozas))
         
 if __name__ == "__main__":
     main()
\ No newline at end of file
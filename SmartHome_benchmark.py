@@ -0,0 +1,703 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import random
+import threading
+import time
+import tracemalloc
+
+from SmartHome_script import (SmartHomeController, DeviceRegistryMixin, DeviceRegistry, PacketTracerInterface,
+                              AsyncPacketTracerInterface, BinaryProtocol, log)
+from SmartHome_simulator import GatewaySimulator, generate_devices
+
+# --------------------------
+# Mérési segédosztályok
+# --------------------------
+class BenchmarkInterface(DeviceRegistryMixin):
+    """
+    Hálózat nélküli interfész a vezérlő belső költségeinek méréséhez.
+    A kiküldött parancsokat csak megszámolja.
+    """
+    def __init__(self, device_registry):
+        self.connected = True
+        self.device_registry = DeviceRegistry(device_registry)
+        self.commands = 0
+
+    def set_device_states(self, states, priority=False):
+        self.commands += 1
+        return {device_id: True for device_id in states}
+
+def build_threshold_controller(routine_count, sensor_id="IoT:Sensor:Temp:1", seed=42):
+    """
+    Vezérlő létrehozása routine_count darab véletlen küszöbű
+    "above"/"below" automatizálással egyetlen hőmérséklet-szenzoron.
+    """
+    rng = random.Random(seed)
+    registry = {sensor_id: {"type": "temp_sensor", "name": "Hőmérséklet", "value": 22.0}}
+    controller = SmartHomeController(BenchmarkInterface(registry))
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        for idx in range(routine_count):
+            controller.add_routine(
+                name=f"threshold_{idx}",
+                trigger={
+                    "type": "sensor",
+                    "device_id": sensor_id,
+                    "condition": rng.choice(["above", "below"]),
+                    "value": round(rng.uniform(0.0, 40.0), 2),
+                    "hysteresis": rng.choice([0.0, 0.5])
+                },
+                actions=[]
+            )
+    return controller
+
+def legacy_check(routines, value):
+    """
+    Az eredeti, lineáris if/elif feltételláncot utánzó kiértékelés:
+    minden automatizálás feltételét minden mérésnél ellenőrzi.
+    """
+    triggered = []
+    for routine in routines:
+        if not routine["enabled"]:
+            continue
+        trigger = routine["trigger"]
+        condition_met = False
+        if trigger["condition"] == "above" and value > trigger["value"]:
+            condition_met = True
+        elif trigger["condition"] == "below" and value < trigger["value"]:
+            condition_met = True
+        elif trigger["condition"] == "equal" and value == trigger["value"]:
+            condition_met = True
+        if condition_met:
+            triggered.append(routine)
+    return triggered
+
+def legacy_evaluate(trigger, device_registry):
+    """
+    Egy összetett kiváltó teljes, rekurzív kiértékelése (feltételhálózat
+    nélkül, minden ütemben minden automatizálásra).
+    """
+    kind = trigger["type"]
+    if kind == "all":
+        return all(legacy_evaluate(condition, device_registry) for condition in trigger["conditions"])
+    if kind == "any":
+        return any(legacy_evaluate(condition, device_registry) for condition in trigger["conditions"])
+    if kind == "between":
+        return True
+    return SmartHomeController._condition_met(trigger, device_registry[trigger["device_id"]]["value"])
+
+def legacy_apply_sensor_values(device_registry, sensor_values):
+    """
+    Az eredeti, szótár alapú nyilvántartás szenzorérték-frissítése.
+    """
+    changed = []
+    for device_id, value in sensor_values.items():
+        device = device_registry.get(device_id)
+        if device is not None:
+            if device.get("value") != value:
+                changed.append(device_id)
+            device["value"] = value
+    return changed
+
+def random_walk(count, start=22.0, step=0.3, seed=7):
+    """
+    Lassan változó, hőmérséklet-szerű mérési sorozat.
+    """
+    rng = random.Random(seed)
+    values = []
+    value = start
+    for _ in range(count):
+        value = min(40.0, max(0.0, value + rng.uniform(-step, step)))
+        values.append(round(value, 2))
+    return values
+
+# --------------------------
+# Mérések
+# --------------------------
+def benchmark_triggers(routine_count=10000, reading_count=2000):
+    """
+    A lineáris feltételkiértékelés és a küszöbérték-index összehasonlítása.
+    Visszaadja a mérési eredményeket (mérésenkénti átlagidő mikroszekundumban).
+    """
+    controller = build_threshold_controller(routine_count)
+    sensor_id = next(iter(controller.routine_index))
+    device = controller.pt_interface.device_registry[sensor_id]
+    index = controller.routine_index[sensor_id]
+    readings = random_walk(reading_count)
+
+    # 1. Eredeti lineáris lánc
+    start = time.perf_counter()
+    for value in readings:
+        legacy_check(controller.routines, value)
+    legacy_time = time.perf_counter() - start
+
+    # 2. Teljesülő automatizálások lekérdezése az indexből
+    start = time.perf_counter()
+    for value in readings:
+        index.satisfied(value)
+    satisfied_time = time.perf_counter() - start
+
+    # 3. Élvezérelt kiértékelés a vezérlőn keresztül (állapotváltással együtt)
+    with contextlib.redirect_stdout(io.StringIO()):
+        controller.check_routines()
+    fired = 0
+    start = time.perf_counter()
+    for value in readings:
+        device["value"] = value
+        fired += len(controller._triggered_routines([sensor_id]))
+    indexed_time = time.perf_counter() - start
+
+    return {
+        "benchmark": "triggers",
+        "routines": routine_count,
+        "readings": reading_count,
+        "legacy_us_per_reading": legacy_time / reading_count * 1e6,
+        "satisfied_us_per_reading": satisfied_time / reading_count * 1e6,
+        "indexed_us_per_reading": indexed_time / reading_count * 1e6,
+        "fired": fired,
+    }
+
+def build_compound_controller(routine_count, temp_count=200, motion_count=50, seed=3):
+    """
+    Vezérlő routine_count darab összetett automatizálással: "hőmérséklet a
+    küszöb fölött ÉS (mozgás VAGY éjszaka)". A küszöbök egész fokok, így a
+    részfeltételek jó része több automatizálásban is szerepel.
+    """
+    rng = random.Random(seed)
+    registry = {f"IoT:Sensor:Temp:{idx}": {"type": "temp_sensor", "name": f"Hőmérséklet {idx}", "value": 22.0}
+                for idx in range(1, temp_count + 1)}
+    registry.update({f"IoT:Sensor:Motion:{idx}": {"type": "motion_sensor", "name": f"Mozgás {idx}", "value": False}
+                     for idx in range(1, motion_count + 1)})
+    controller = SmartHomeController(BenchmarkInterface(registry), report_interval=None)
+
+    for idx in range(routine_count):
+        controller.add_routine(
+            name=f"compound_{idx}",
+            trigger={"type": "all", "conditions": [
+                {"type": "sensor", "device_id": f"IoT:Sensor:Temp:{rng.randint(1, temp_count)}",
+                 "condition": "above", "value": float(rng.randint(20, 30)), "hysteresis": 0.5},
+                {"type": "any", "conditions": [
+                    {"type": "sensor", "device_id": f"IoT:Sensor:Motion:{rng.randint(1, motion_count)}",
+                     "condition": "equal", "value": True},
+                    {"type": "between", "start": "19:00", "end": "06:00"},
+                ]},
+            ]},
+            actions=[]
+        )
+    return controller
+
+def benchmark_compound(routine_counts=(100, 1000, 10000), reading_count=2000, legacy_reading_count=100):
+    """
+    Az összetett kiváltók feltételhálózatának mérése a szabálykészlet
+    méretének függvényében, a teljes újrakiértékeléshez képest. Minden
+    mérés egy véletlen szenzor értékét változtatja meg.
+    """
+    results = []
+    for routine_count in routine_counts:
+        controller = build_compound_controller(routine_count)
+        registry = controller.pt_interface.device_registry
+        sensors = controller._trigger_sensor_ids()
+        rng = random.Random(9)
+        readings = []
+        for _ in range(reading_count):
+            device_id = rng.choice(sensors)
+            if "Motion" in device_id:
+                readings.append((device_id, rng.random() < 0.5))
+            else:
+                readings.append((device_id, round(rng.uniform(18.0, 32.0), 1)))
+        controller.check_routines()
+
+        fired = 0
+        start = time.perf_counter()
+        for device_id, value in readings:
+            registry[device_id]["value"] = value
+            fired += len(controller._triggered_routines([device_id]))
+        network_time = time.perf_counter() - start
+
+        # Összehasonlítás: minden mérésnél minden automatizálás újraértékelése
+        states = {}
+        start = time.perf_counter()
+        for device_id, value in readings[:legacy_reading_count]:
+            registry[device_id]["value"] = value
+            for routine in controller.routines:
+                states[routine["name"]] = legacy_evaluate(routine["trigger"], registry)
+        legacy_time = time.perf_counter() - start
+
+        results.append({
+            "benchmark": "compound",
+            "routines": routine_count,
+            "nodes": len(controller.conditions),
+            "readings": reading_count,
+            "network_us_per_reading": network_time / reading_count * 1e6,
+            "legacy_us_per_reading": legacy_time / legacy_reading_count * 1e6,
+            "fired": fired,
+        })
+    return results
+
+def benchmark_registry(device_count=50000, batch_count=200, batch_size=500):
+    """
+    A szótár alapú és a tömör (DeviceRecord) nyilvántartás összehasonlítása:
+    memória a felderítési válasz betöltése után, és a szenzorérték-frissítés
+    mérésenkénti ideje.
+    """
+    # A felderítéshez hasonlóan JSON-ból beolvasott eszközök
+    payload = json.dumps(generate_devices(device_count))
+
+    tracemalloc.start()
+    legacy_registry = json.loads(payload)
+    legacy_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    interface = BenchmarkInterface(json.loads(payload))
+    compact_memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    rng = random.Random(5)
+    sensors = [device_id for device_id, device in legacy_registry.items() if device["type"] == "temp_sensor"]
+    batches = [{device_id: round(rng.uniform(15, 30), 1) for device_id in rng.sample(sensors, min(batch_size, len(sensors)))}
+               for _ in range(batch_count)]
+    readings = sum(len(batch) for batch in batches)
+
+    start = time.perf_counter()
+    for batch in batches:
+        legacy_apply_sensor_values(legacy_registry, batch)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for batch in batches:
+        interface._apply_sensor_values(batch)
+    compact_time = time.perf_counter() - start
+
+    return {
+        "benchmark": "registry",
+        "devices": device_count,
+        "readings": readings,
+        "dict_memory_kb": legacy_memory / 1024,
+        "compact_memory_kb": compact_memory / 1024,
+        "dict_ns_per_reading": legacy_time / readings * 1e9,
+        "compact_ns_per_reading": compact_time / readings * 1e9,
+    }
+
+def benchmark_wire(device_count=6000, rounds=200, updates=50):
+    """
+    A JSON és a bináris (BinaryProtocol) szenzorérték-válasz összehasonlítása:
+    méret és feldolgozási idő a kódoló szintjén, valamint egy teljes
+    update_sensor_values hívás ideje és forgalma a gateway szimulátor ellen.
+    """
+    devices = generate_devices(device_count)
+    values = {device_id: device["value"] for device_id, device in devices.items() if "value" in device}
+    device_handles = {device_id: handle for handle, device_id in enumerate(devices)}
+    handle_ids = {handle: device_id for device_id, handle in device_handles.items()}
+    json_payload = json.dumps(values).encode('utf-8')
+    binary_payload = BinaryProtocol.encode_sensor_values(values, device_handles)
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        json.loads(json_payload)
+    json_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        BinaryProtocol.decode_sensor_values(binary_payload, handle_ids)
+    binary_time = time.perf_counter() - start
+
+    result = {
+        "benchmark": "wire",
+        "devices": device_count,
+        "sensors": len(values),
+        "json_bytes": len(json_payload),
+        "binary_bytes": len(binary_payload),
+        "json_parse_ns_per_reading": json_time / (rounds * len(values)) * 1e9,
+        "binary_parse_ns_per_reading": binary_time / (rounds * len(values)) * 1e9,
+    }
+
+    # Teljes lekérdezés a szimulátor ellen, mindkét kódolással
+    for encoding, key in (("json", "json"), ("auto", "binary")):
+        simulator = GatewaySimulator(device_count=device_count, port=0, seed=1)
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            port = simulator.start()
+        interface = PacketTracerInterface('127.0.0.1', port, encoding=encoding)
+        interface.connect()
+        interface.discover_devices()
+        interface.update_sensor_values()
+
+        received = interface.metrics.bytes_received
+        start = time.perf_counter()
+        for _ in range(updates):
+            interface.update_sensor_values()
+        result[f"{key}_update_ms"] = (time.perf_counter() - start) / updates * 1000
+        result[f"{key}_bytes_per_update"] = (interface.metrics.bytes_received - received) / updates
+
+        interface.close()
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            simulator.stop()
+    return result
+
+def benchmark_delta(device_count=6000, rounds=50, change_counts=(0, 10, 100)):
+    """
+    Teljes (GET_SENSOR_VALUES, egyeztetett kódolással) és növekményes
+    (GET_SENSOR_CHANGES) szenzorlekérdezés összehasonlítása: lekérdezésenkénti
+    idő és fogadott bájtok, két lekérdezés között change_count változással.
+    """
+    simulator = GatewaySimulator(device_count=device_count, port=0, seed=9)
+    port = simulator.start()
+    pt_interface = PacketTracerInterface('127.0.0.1', port, pool_size=0)
+    pt_interface.connect()
+    pt_interface.discover_devices()
+    sensors = [device_id for device_id, device in simulator.devices.items() if "sensor" in device["type"]]
+    rng = random.Random(4)
+
+    def change(count):
+        for device_id in rng.sample(sensors, count):
+            value = simulator.devices[device_id]["value"]
+            simulator.set_sensor_value(device_id, round(value + 0.5, 1) if isinstance(value, float) else not value)
+
+    results = []
+    for change_count in change_counts:
+        measured = {}
+        for name, update in (("full", pt_interface.update_sensor_values),
+                             ("delta", pt_interface.update_sensor_changes)):
+            # A másik mérés közbeni változások ne számítsanak bele
+            update()
+            elapsed = 0.0
+            received = pt_interface.metrics.bytes_received
+            for _ in range(rounds):
+                change(change_count)
+                start = time.perf_counter()
+                update()
+                elapsed += time.perf_counter() - start
+            measured[name] = (elapsed / rounds * 1000, (pt_interface.metrics.bytes_received - received) / rounds)
+        results.append({
+            "benchmark": "delta",
+            "sensors": len(sensors),
+            "changes_per_poll": change_count,
+            "full_ms": measured["full"][0],
+            "full_bytes": measured["full"][1],
+            "delta_ms": measured["delta"][0],
+            "delta_bytes": measured["delta"][1],
+        })
+    pt_interface.close()
+    simulator.stop()
+    return results
+
+def percentile(values, fraction):
+    """
+    Egyszerű percentilis (a legközelebbi rangú elem) egy nem üres listára.
+    """
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+def add_random_routines(controller, count, seed=11, exclude=()):
+    """
+    count darab véletlen automatizálás felvétele a vezérlő szenzoraira és
+    beavatkozóira (hőmérséklet-küszöbök, mozgás- és füstfeltételek).
+    Az exclude eszközeit egyik automatizálás sem használja.
+    """
+    rng = random.Random(seed)
+    devices = {device_id: device for device_id, device in controller.pt_interface.device_registry.items()
+               if device_id not in exclude}
+    temp_sensors = [device_id for device_id, device in devices.items() if device["type"] == "temp_sensor"]
+    flag_sensors = [device_id for device_id, device in devices.items()
+                    if device["type"] in ("motion_sensor", "smoke_sensor")]
+    actuators = [device_id for device_id, device in devices.items() if "sensor" not in device["type"]]
+
+    for idx in range(count):
+        if temp_sensors and rng.random() < 0.5:
+            trigger = {"type": "sensor", "device_id": rng.choice(temp_sensors),
+                       "condition": rng.choice(["above", "below"]), "value": round(rng.uniform(15, 30), 1)}
+        else:
+            trigger = {"type": "sensor", "device_id": rng.choice(flag_sensors),
+                       "condition": "equal", "value": rng.choice([True, False])}
+        actions = [{"device_id": rng.choice(actuators), "command": {"status": rng.choice([True, False])}}]
+        controller.add_routine(name=f"random_{idx}", trigger=trigger, actions=actions)
+
+class ActuationProbe:
+    """
+    A szimulátorhoz érkező állapotbeállítások figyelése egy kiválasztott
+    eszközön (a szenzorváltozás -> SET_STATE késleltetés méréséhez).
+    """
+    def __init__(self, device_id):
+        self.device_id = device_id
+        self.event = threading.Event()
+        self.timestamp = None
+
+    def __call__(self, device_id, state, timestamp):
+        if device_id == self.device_id:
+            self.timestamp = timestamp
+            self.event.set()
+
+    def wait(self, timeout):
+        """
+        Vár a következő beállításra; visszaadja az időbélyegét vagy None-t.
+        """
+        if not self.event.wait(timeout):
+            return None
+        self.event.clear()
+        return self.timestamp
+
+def benchmark_end_to_end(device_count=60, routine_count=10, rtt=0.0, trials=50, ticks=50, commands=200):
+    """
+    A vezérlő mérése egy helyi gateway szimulátor ellen: szenzorváltozás ->
+    SET_STATE késleltetés (p50/p99), parancsáteresztés, ütemidő és memória.
+    """
+    simulator = GatewaySimulator(device_count=device_count, port=0, latency=rtt, seed=1)
+    port = simulator.start()
+    probe_sensor = "IoT:Sensor:Motion:1"
+    probe_actuator = "IoT:Light:1"
+    probe = ActuationProbe(probe_actuator)
+    simulator.state_listeners.append(probe)
+
+    # Memória: a nyilvántartás és az automatizálások felépítése
+    tracemalloc.start()
+    pt_interface = PacketTracerInterface(port=port)
+    controller = SmartHomeController(pt_interface, report_interval=3600, compact_report=True)
+    controller.initialize()
+    add_random_routines(controller, routine_count, exclude=(probe_sensor, probe_actuator))
+    # Mérőautomatizálások: a mozgásérzékelő állapotát követi a lámpa
+    controller.add_routine("probe_on", {"type": "sensor", "device_id": probe_sensor,
+                                        "condition": "equal", "value": True},
+                           [{"device_id": probe_actuator, "command": {"status": True}}], priority=100)
+    controller.add_routine("probe_off", {"type": "sensor", "device_id": probe_sensor,
+                                         "condition": "equal", "value": False},
+                           [{"device_id": probe_actuator, "command": {"status": False}}], priority=100)
+    memory_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # Ütemidő: teljes lekérdezés és kiértékelés, két ütem között egy szenzorváltozással
+    tick_times = []
+    for _ in range(ticks):
+        simulator.random_sensor_change()
+        start = time.perf_counter()
+        pt_interface.update_sensor_values()
+        controller.check_routines()
+        tick_times.append(time.perf_counter() - start)
+
+    # Késleltetés: eseményvezérelt monitorozás mellett a mérőszenzor billentése
+    controller.start_monitoring()
+    time.sleep(0.2)
+    probe.event.clear()
+    latencies = []
+    value = not pt_interface.device_registry[probe_sensor]["value"]
+    for _ in range(trials):
+        changed_at = time.time()
+        simulator.set_sensor_value(probe_sensor, value)
+        actuated_at = probe.wait(timeout=max(1.0, 20 * rtt))
+        if actuated_at is not None:
+            latencies.append(actuated_at - changed_at)
+        value = not value
+    controller.stop_monitoring()
+
+    # Parancsáteresztés: szinkron SET_STATE-ek egymás után
+    start = time.perf_counter()
+    for idx in range(commands):
+        pt_interface.set_device_state(probe_actuator, {"status": idx % 2 == 0})
+    sync_rate = commands / (time.perf_counter() - start)
+    pt_interface.close()
+
+    # Parancsáteresztés: aszinkron, egy kapcsolaton párhuzamosan futó GET_STATE-ek
+    async def pipelined():
+        async_interface = AsyncPacketTracerInterface(port=port)
+        await async_interface.connect()
+        await async_interface.discover_devices()
+        started = time.perf_counter()
+        await asyncio.gather(*(async_interface.get_device_state(probe_actuator) for _ in range(commands)))
+        elapsed = time.perf_counter() - started
+        await async_interface.close()
+        return commands / elapsed
+    async_rate = asyncio.run(pipelined())
+    simulator.stop()
+
+    return {
+        "benchmark": "end_to_end",
+        "devices": device_count,
+        "routines": routine_count,
+        "rtt_ms": rtt * 1000,
+        "latency_p50_ms": percentile(latencies, 0.50) * 1000 if latencies else None,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000 if latencies else None,
+        "latency_samples": len(latencies),
+        "tick_p50_ms": percentile(tick_times, 0.50) * 1000,
+        "tick_p99_ms": percentile(tick_times, 0.99) * 1000,
+        "sync_set_commands_per_s": sync_rate,
+        "async_get_commands_per_s": async_rate,
+        "memory_kb": memory_bytes / 1024,
+    }
+
+def benchmark_priority(pool_size, rtt=0.005, load_threads=4, trials=30, device_count=60):
+    """
+    Biztonsági automatizálás kiváltásától a beavatkozásig eltelt idő
+    (p50/p99), miközben load_threads szál folyamatosan normál forgalmat
+    (állapotbeállítás és -lekérdezés) küld ugyanazon az interfészen.
+    pool_size=0 esetén minden kérés egy kapcsolaton sorban áll.
+    """
+    simulator = GatewaySimulator(device_count=device_count, port=0, latency=rtt, seed=5)
+    port = simulator.start()
+    alarm_sensor = "IoT:Sensor:Smoke:1"
+    alarm_actuator = "IoT:Light:3"
+    probe = ActuationProbe(alarm_actuator)
+    simulator.state_listeners.append(probe)
+
+    pt_interface = PacketTracerInterface(port=port, pool_size=pool_size)
+    controller = SmartHomeController(pt_interface, report_interval=None)
+    controller.pt_interface.connect()
+    controller.devices = pt_interface.discover_devices()
+    controller.add_routine("alarm_on", {"type": "sensor", "device_id": alarm_sensor, "condition": "equal",
+                                        "value": True},
+                           [{"device_id": alarm_actuator, "command": {"status": True}}], priority=10)
+    controller.add_routine("alarm_off", {"type": "sensor", "device_id": alarm_sensor, "condition": "equal",
+                                         "value": False},
+                           [{"device_id": alarm_actuator, "command": {"status": False}}], priority=10)
+
+    # Háttérforgalom: a mérőeszközön kívüli beavatkozók kapcsolgatása és lekérdezése
+    actuators = [device_id for device_id, device in pt_interface.device_registry.items()
+                 if "sensor" not in device["type"] and device_id != alarm_actuator]
+    running = True
+
+    def load(seed):
+        rng = random.Random(seed)
+        while running:
+            targets = rng.sample(actuators, 8)
+            pt_interface.set_device_states({device_id: {"status": rng.random() < 0.5} for device_id in targets})
+            pt_interface.get_device_states(targets)
+
+    load_workers = [threading.Thread(target=load, args=(idx,), daemon=True) for idx in range(load_threads)]
+    for worker in load_workers:
+        worker.start()
+
+    controller.start_monitoring()
+    time.sleep(0.3)
+    probe.event.clear()
+    latencies = []
+    value = not pt_interface.device_registry[alarm_sensor]["value"]
+    for _ in range(trials):
+        changed_at = time.time()
+        simulator.set_sensor_value(alarm_sensor, value)
+        actuated_at = probe.wait(timeout=max(1.0, 50 * rtt))
+        if actuated_at is not None:
+            latencies.append(actuated_at - changed_at)
+        value = not value
+        time.sleep(rtt)
+    controller.stop_monitoring()
+    running = False
+    for worker in load_workers:
+        worker.join()
+    pt_interface.close()
+    simulator.stop()
+
+    return {
+        "benchmark": "priority",
+        "pool_size": pool_size,
+        "rtt_ms": rtt * 1000,
+        "load_threads": load_threads,
+        "latency_p50_ms": percentile(latencies, 0.50) * 1000 if latencies else None,
+        "latency_p99_ms": percentile(latencies, 0.99) * 1000 if latencies else None,
+        "latency_samples": len(latencies),
+    }
+
+# --------------------------
+# Főprogram
+# --------------------------
+def parse_list(text, value_type):
+    """
+    Vesszővel elválasztott lista beolvasása.
+    """
+    return [value_type(item) for item in text.split(",") if item]
+
+def main():
+    parser = argparse.ArgumentParser(description="Okos Otthon Vezérlő teljesítménymérés")
+    parser.add_argument("--suite", choices=["all", "triggers", "compound", "registry", "wire", "delta", "priority", "e2e"], default="all")
+    parser.add_argument("--devices", default="60,600", help="eszközszámok (vesszővel elválasztva)")
+    parser.add_argument("--routines", default="10,1000", help="automatizálásszámok")
+    parser.add_argument("--rtt", default="0,0.005", help="hálózati késleltetések másodpercben")
+    parser.add_argument("--trials", type=int, default=50, help="késleltetésmérések száma")
+    parser.add_argument("--output", help="JSON Lines kimeneti fájl")
+    args = parser.parse_args()
+
+    print("=== Okos Otthon Vezérlő teljesítménymérés ===")
+    # A vezérlő naplója nem része a mérésnek, csak a hibák jelennek meg
+    log.configure(level="ERROR")
+    results = []
+
+    if args.suite in ("all", "triggers"):
+        result = benchmark_triggers()
+        results.append(result)
+        print(f"\nKüszöbérték-kiváltók ({result['routines']} automatizálás, {result['readings']} mérés):")
+        print(f"  - Lineáris feltétellánc:      {result['legacy_us_per_reading']:10.1f} µs/mérés")
+        print(f"  - Index, teljesülők listája:  {result['satisfied_us_per_reading']:10.1f} µs/mérés")
+        print(f"  - Index, élvezérelt kiértékelés: {result['indexed_us_per_reading']:7.1f} µs/mérés")
+
+    if args.suite in ("all", "compound"):
+        print("\nÖsszetett kiváltók (egy szenzor változik mérésenként):")
+        print(f"  {'autom.':>7} {'csomópont':>10} {'hálózat µs':>11} {'teljes újraért. µs':>19}")
+        for result in benchmark_compound():
+            results.append(result)
+            print(f"  {result['routines']:>7} {result['nodes']:>10} {result['network_us_per_reading']:>11.1f} "
+                  f"{result['legacy_us_per_reading']:>19.1f}")
+
+    if args.suite in ("all", "registry"):
+        result = benchmark_registry()
+        results.append(result)
+        print(f"\nEszköznyilvántartás ({result['devices']} eszköz, {result['readings']} mérés):")
+        print(f"  - Szótárak:       {result['dict_memory_kb']:10.0f} KB, {result['dict_ns_per_reading']:6.0f} ns/mérés")
+        print(f"  - DeviceRecord:   {result['compact_memory_kb']:10.0f} KB, {result['compact_ns_per_reading']:6.0f} ns/mérés")
+
+    if args.suite in ("all", "wire"):
+        result = benchmark_wire()
+        results.append(result)
+        print(f"\nSzenzorérték-válasz ({result['sensors']} szenzor):")
+        print(f"  - JSON:     {result['json_bytes']:8d} B, {result['json_parse_ns_per_reading']:6.0f} ns/mérés, "
+              f"{result['json_update_ms']:6.2f} ms/lekérdezés, {result['json_bytes_per_update']:8.0f} B/lekérdezés")
+        print(f"  - Bináris:  {result['binary_bytes']:8d} B, {result['binary_parse_ns_per_reading']:6.0f} ns/mérés, "
+              f"{result['binary_update_ms']:6.2f} ms/lekérdezés, {result['binary_bytes_per_update']:8.0f} B/lekérdezés")
+
+    if args.suite in ("all", "delta"):
+        with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+            delta_results = benchmark_delta()
+        print(f"\nTeljes és növekményes szenzorlekérdezés ({delta_results[0]['sensors']} szenzor):")
+        print(f"  {'változás':>9} {'teljes ms':>10} {'teljes B':>10} {'növekm. ms':>11} {'növekm. B':>10}")
+        for result in delta_results:
+            results.append(result)
+            print(f"  {result['changes_per_poll']:>9} {result['full_ms']:>10.2f} {result['full_bytes']:>10.0f} "
+                  f"{result['delta_ms']:>11.3f} {result['delta_bytes']:>10.0f}")
+
+    if args.suite in ("all", "priority"):
+        print("\nBiztonsági beavatkozás háttérforgalom mellett (RTT 5 ms, 4 terhelő szál):")
+        print(f"  {'sávok':>7} {'p50 ms':>8} {'p99 ms':>8}")
+        for pool_size in (0, 2):
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                result = benchmark_priority(pool_size)
+            results.append(result)
+            print(f"  {pool_size:>7} {result['latency_p50_ms'] or 0:>8.2f} {result['latency_p99_ms'] or 0:>8.2f}")
+
+    if args.suite in ("all", "e2e"):
+        print("\nVégponttól végpontig (gateway szimulátor ellen):")
+        print(f"  {'eszköz':>7} {'autom.':>7} {'RTT ms':>7} {'p50 ms':>8} {'p99 ms':>8} "
+              f"{'ütem ms':>8} {'szinkron/s':>11} {'aszinkron/s':>12} {'mem KB':>9}")
+        for device_count in parse_list(args.devices, int):
+            for routine_count in parse_list(args.routines, int):
+                for rtt in parse_list(args.rtt, float):
+                    # A vezérlő konzolkimenete nem része a mérésnek
+                    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                        result = benchmark_end_to_end(device_count, routine_count, rtt, trials=args.trials)
+                    results.append(result)
+                    print(f"  {device_count:>7} {routine_count:>7} {result['rtt_ms']:>7.1f} "
+                          f"{result['latency_p50_ms'] or 0:>8.2f} {result['latency_p99_ms'] or 0:>8.2f} "
+                          f"{result['tick_p50_ms']:>8.2f} {result['sync_set_commands_per_s']:>11.0f} "
+                          f"{result['async_get_commands_per_s']:>12.0f} {result['memory_kb']:>9.0f}")
+
+    # Gépi feldolgozásra: soronként egy JSON eredmény
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            for result in results:
+                output_file.write(json.dumps(result) + "\n")
+    else:
+        print()
+        for result in results:
+            print(json.dumps(result))
+
+if __name__ == "__main__":
+    main()
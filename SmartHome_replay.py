@@ -0,0 +1,290 @@
+import argparse
+import json
+import math
+import sys
+import time
+
+from SmartHome_script import (SmartHomeController, DeviceRegistryMixin, DeviceRegistry, PacketTracerInterface,
+                              SensorRecorder, SensorRecording, Metrics, log)
+from SmartHome_simulator import GatewaySimulator
+
+# A seed-del generált felvételek rögzített kezdete (2024-01-01 00:00 UTC),
+# hogy ugyanaz a seed mindig ugyanazt a felvételt adja
+GENERATED_START = 1704067200.0
+
+# --------------------------
+# Virtuális óra
+# --------------------------
+class VirtualClock:
+    """
+    Kézzel léptetett óra a vezérlő számára (clock paraméter). Csak előre
+    halad, így a vezérlő időbélyegei monotonok maradnak.
+    """
+    def __init__(self, start=0.0):
+        self.now = start
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, timestamp):
+        self.now = max(self.now, timestamp)
+
+# --------------------------
+# Visszajátszás
+# --------------------------
+class ReplayInterface(DeviceRegistryMixin):
+    """
+    Hálózat nélküli interfész a visszajátszáshoz. A nyilvántartást a
+    felvétel fejlécéből építi fel; a vezérlő parancsait a virtuális
+    időbélyeggel az akciónaplóba írja és átvezeti a nyilvántartásba.
+    A már kért állapotban lévő eszköznek - a valódi interfészhez
+    hasonlóan - nem küld parancsot.
+    """
+    def __init__(self, devices, clock, actions):
+        self.connected = True
+        self.device_registry = DeviceRegistry(devices)
+        self.clock = clock
+        self.actions = actions
+        self.metrics = Metrics()
+
+    def connect(self):
+        return True
+
+    def subscribe(self, device_ids=None):
+        return False
+
+    def update_sensor_values(self, device_ids=None):
+        return self.device_registry
+
+    def get_device_states(self, device_ids):
+        return {device_id: self.device_registry[device_id].to_dict()
+                for device_id in device_ids if device_id in self.device_registry}
+
+    def set_device_state(self, device_id, state):
+        return self.set_device_states({device_id: state})[device_id]
+
+    def set_device_states(self, states, priority=False):
+        results = {}
+        for device_id, state in states.items():
+            if device_id not in self.device_registry:
+                results[device_id] = False
+                continue
+            if not self._state_matches(device_id, state):
+                self.actions.append({"time": self.clock(), "device_id": device_id, "state": state})
+                self._apply_state(device_id, state)
+            results[device_id] = True
+        return results
+
+    def close(self):
+        pass
+
+
+class ReplayController(SmartHomeController):
+    """
+    Vezérlő, amely a kiváltott automatizálások nevét is az akciónaplóba írja.
+    """
+    def execute_routines(self, routines):
+        for routine in routines:
+            self.pt_interface.actions.append({"time": self.clock(), "routine": routine["name"]})
+        super().execute_routines(routines)
+
+
+def next_deadline(controller):
+    """
+    A vezérlő következő időfüggő eseménye: időzítő határideje vagy egy
+    minimális tartási idő miatt visszatartott állapotváltás lejárta.
+    """
+    deadlines = [routine["changed_at"] + routine["trigger"].get("min_hold", 0)
+                 for routine in controller.pending_routines.values() if routine["enabled"]]
+    if deadlines:
+        # A következő ábrázolható időpont: ekkor now - changed_at biztosan eléri a tartási időt
+        deadlines = [math.nextafter(min(deadlines), math.inf)]
+    timer_deadline = controller.timers.next_deadline()
+    if timer_deadline is not None:
+        deadlines.append(timer_deadline)
+    return min(deadlines) if deadlines else None
+
+
+def advance(controller, clock, timestamp):
+    """
+    A virtuális óra léptetése timestamp-ig; a közben esedékes időzítőket
+    és visszatartott állapotváltásokat időrendben, a saját időpontjukban
+    dolgozza fel.
+    """
+    while True:
+        deadline = next_deadline(controller)
+        if deadline is None or deadline > timestamp:
+            break
+        clock.advance(deadline)
+        controller.run_timers()
+        if controller.pending_routines:
+            controller.check_routines([])
+    clock.advance(timestamp)
+
+
+def load_routines(path):
+    """
+    Automatizálások betöltése JSON fájlból; a fájl az add_routine
+    paramétereit (name, trigger, actions, priority) tartalmazó objektumok listája.
+    """
+    with open(path, "r", encoding="utf-8") as routines_file:
+        routines = json.load(routines_file)
+
+    def setup(controller):
+        for routine in routines:
+            controller.add_routine(routine["name"], routine["trigger"], routine["actions"],
+                                   routine.get("priority", 0))
+    return setup
+
+
+def replay(path, setup=None, until=None):
+    """
+    Egy felvétel visszajátszása a vezérlőn virtuális órával, valós
+    várakozás nélkül. setup(controller) veszi fel az automatizálásokat
+    (alapértelmezés: setup_routines); until megadásakor eddig az
+    időbélyegig játszik le. Visszaadja az akciónaplót (időrendben a
+    kiváltott automatizálásokat és a kiküldött eszközparancsokat) és a
+    lejátszott szakasz hosszát másodpercben.
+    """
+    recording = SensorRecording(path)
+    clock = VirtualClock(recording.start)
+    actions = []
+    interface = ReplayInterface(recording.devices, clock, actions)
+    controller = ReplayController(interface, use_push=False, report_interval=None, clock=clock)
+    controller.devices = interface.device_registry
+    (setup or SmartHomeController.setup_routines)(controller)
+
+    # Kiinduló állapot: minden kiváltó kiértékelése a fejléc értékeivel
+    controller.check_routines()
+    for timestamp, values in recording:
+        if until is not None and timestamp > until:
+            break
+        advance(controller, clock, timestamp)
+        controller.check_routines(interface._apply_sensor_values(values))
+    advance(controller, clock, clock.now if until is None else until)
+    return actions, clock.now - recording.start
+
+# --------------------------
+# Felvétel készítése
+# --------------------------
+def record(path, host, port, duration, poll_interval=2.0):
+    """
+    Szenzorfolyam felvétele egy gateway-ről duration másodpercig.
+    Feliratkozással a gateway eseményeit, különben poll_interval
+    másodpercenkénti lekérdezés eredményét rögzíti.
+    """
+    pt_interface = PacketTracerInterface(host, port)
+    if not pt_interface.connect() or not pt_interface.discover_devices():
+        return None
+    recorder = pt_interface.enable_recording(path)
+    subscribed = pt_interface.subscribe()
+    if subscribed:
+        # Kiinduló állapot a feliratkozás után
+        pt_interface.update_sensor_values()
+
+    deadline = time.monotonic() + duration
+    try:
+        while time.monotonic() < deadline:
+            if subscribed:
+                if pt_interface.wait_for_events(timeout=min(1.0, max(0.001, deadline - time.monotonic()))) is None:
+                    subscribed = False
+            else:
+                pt_interface.update_sensor_values()
+                time.sleep(max(0.0, min(poll_interval, deadline - time.monotonic())))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        pt_interface.close()
+    return recorder.count
+
+
+def generate(path, device_count=30, hours=24.0, change_rate=0.5, start=None, seed=None):
+    """
+    Szintetikus felvétel készítése a gateway szimulátor változásmodelljével
+    (change_rate változás / másodperc, exponenciális várakozásokkal),
+    valós idő eltelte nélkül. A felvétel start időpontban kezdődik;
+    alapértelmezése seed megadásakor GENERATED_START, különben a
+    jelenlegi idő.
+    """
+    simulator = GatewaySimulator(device_count=device_count, seed=seed)
+    recorder = SensorRecorder(path, DeviceRegistry(simulator.devices))
+    if start is None:
+        start = GENERATED_START if seed is not None else time.time()
+    timestamp = start
+    end = timestamp + hours * 3600
+    while True:
+        timestamp += simulator.rng.expovariate(change_rate)
+        if timestamp > end:
+            break
+        device_id = simulator.random_sensor_change()
+        recorder.record(timestamp, {device_id: simulator.devices[device_id]["value"]})
+    recorder.close()
+    return recorder.count
+
+# --------------------------
+# Főprogram
+# --------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Szenzorfolyam felvétele és visszajátszása")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = commands.add_parser("record", help="felvétel egy gateway-ről")
+    record_parser.add_argument("path", help="felvételfájl (.gz végződésnél tömörítve)")
+    record_parser.add_argument("--host", default="127.0.0.1")
+    record_parser.add_argument("--port", type=int, default=5000)
+    record_parser.add_argument("--duration", type=float, default=3600.0, help="felvétel hossza másodpercben")
+    record_parser.add_argument("--poll-interval", type=float, default=2.0,
+                               help="lekérdezési időköz, ha a feliratkozás nem lehetséges")
+
+    generate_parser = commands.add_parser("generate", help="szintetikus felvétel a szimulátor modelljével")
+    generate_parser.add_argument("path")
+    generate_parser.add_argument("--devices", type=int, default=30, help="szintetikus eszközök száma")
+    generate_parser.add_argument("--hours", type=float, default=24.0, help="a felvétel hossza órában")
+    generate_parser.add_argument("--change-rate", type=float, default=0.5, help="szenzorváltozás / másodperc")
+    generate_parser.add_argument("--seed", type=int, default=None)
+    generate_parser.add_argument("--start", type=float, default=None,
+                                 help="a felvétel kezdete Unix időbélyegként (alapértelmezés: "
+                                      "--seed megadásakor rögzített, különben a jelenlegi idő)")
+
+    replay_parser = commands.add_parser("replay", help="felvétel visszajátszása virtuális órával")
+    replay_parser.add_argument("path")
+    replay_parser.add_argument("--routines", help="automatizálások JSON fájlja (alapértelmezés: a beépítettek)")
+    replay_parser.add_argument("--output", help="az akciónapló JSON Lines fájlja (alapértelmezés: kimenet)")
+    replay_parser.add_argument("--log-level", default="WARNING", help="a vezérlő naplózási szintje")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        count = record(args.path, args.host, args.port, args.duration, args.poll_interval)
+        if count is None:
+            print("Nem sikerült kapcsolódni a gateway-hez!")
+            sys.exit(1)
+        print(f"{count} változáscsomag rögzítve: {args.path}")
+
+    elif args.command == "generate":
+        count = generate(args.path, args.devices, args.hours, args.change_rate, args.start, args.seed)
+        print(f"{count} változáscsomag generálva: {args.path}")
+
+    else:
+        log.configure(level=args.log_level)
+        setup = load_routines(args.routines) if args.routines else None
+        started = time.perf_counter()
+        actions, span = replay(args.path, setup)
+        elapsed = time.perf_counter() - started
+        log.flush()
+
+        output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+        try:
+            for action in actions:
+                output.write(json.dumps(action, ensure_ascii=False) + "\n")
+        finally:
+            if args.output:
+                output.close()
+
+        fired = sum(1 for action in actions if "routine" in action)
+        print(f"{fired} kiváltás, {len(actions) - fired} eszközparancs; "
+              f"lejátszás {elapsed:.2f} s alatt", file=sys.stderr)
+        if span > 0:
+            print(f"A felvétel hossza {span / 3600:.1f} óra ({span / elapsed:.0f}x valós idő)", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
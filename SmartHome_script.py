@@ -1,251 +1,3760 @@
 import socket
 import json
+import asyncio
+import itertools
+import struct
+import heapq
+import bisect
+import array
+import mmap
+import os
+import sys
 import time
 import threading
-from datetime import datetime
+import queue
+import random
+import gzip
+import hashlib
+import atexit
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# --------------------------
+# Naplózás
+# --------------------------
+class LogSink:
+    """
+    Nem blokkoló, sor alapú napló. A hívó csak egy bejegyzést tesz egy
+    korlátos sorba; a formázás és a kiírás egy külön szálon történik, így
+    a monitorozó szál sosem vár a konzolra vagy a fájlra. Ha a sor megtelt,
+    a bejegyzés elvész (a számuk a dropped attribútumban látható, és a
+    következő kiírt bejegyzés előtt egy figyelmeztetés jelzi).
+    
+    Minden bejegyzésnek szintje, eseményneve és mezői vannak; az üzenet
+    egy str.format sablon, amelyet a kiíró szál tölt ki a mezőkből.
+    format="text" esetén csak az üzenet jelenik meg (mint korábban a
+    print), format="json" esetén soronként egy JSON objektum. A sample
+    szótár eseménynév -> megtartási arány párjaival a gyakori események
+    ritkíthatók (pl. {"device_state_set": 0.1}).
+    """
+    LEVELS = {"DEBUG": 10, "INFO": 20, "WARNING": 30, "ERROR": 40}
+    
+    def __init__(self, level="INFO", format="text", stream=None, capacity=10000, sample=None):
+        self.level = self.LEVELS[level]
+        self.format = format
+        # None: a kiíráskor érvényes sys.stdout
+        self.stream = stream
+        self.sample = dict(sample or {})
+        self._sample_credit = {}
+        self.queue = queue.Queue(maxsize=capacity)
+        self.dropped = 0
+        self._reported_drops = 0
+        self.thread = None
+        self._start_lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._after_fork)
+    
+    def _after_fork(self):
+        """
+        Fork után a gyermekfolyamatban a kiíró szál nem fut tovább (csak a
+        thread attribútum öröklődik), a sor és a zár pedig a szülő
+        állapotában maradhatott. Új sort és zárat hoz létre, így az első
+        bejegyzés a gyermekben új kiíró szálat indít; a szülő még ki nem
+        írt bejegyzéseit a szülő írja ki.
+        """
+        self.queue = queue.Queue(maxsize=self.queue.maxsize)
+        self.dropped = 0
+        self._reported_drops = 0
+        self.thread = None
+        self._start_lock = threading.Lock()
+    
+    def configure(self, level=None, format=None, stream=None, sample=None):
+        """
+        A napló beállításainak módosítása (csak a megadott értékek változnak).
+        """
+        if level is not None:
+            self.level = self.LEVELS[level]
+        if format is not None:
+            self.format = format
+        if stream is not None:
+            self.stream = stream
+        if sample is not None:
+            self.sample = dict(sample)
+            self._sample_credit = {}
+    
+    def debug(self, event, message, **fields):
+        self._emit(10, event, message, fields)
+    
+    def info(self, event, message, **fields):
+        self._emit(20, event, message, fields)
+    
+    def warning(self, event, message, **fields):
+        self._emit(30, event, message, fields)
+    
+    def error(self, event, message, **fields):
+        self._emit(40, event, message, fields)
+    
+    def _emit(self, level, event, message, fields):
+        """
+        Egy bejegyzés sorba állítása; sosem blokkol.
+        """
+        if level < self.level:
+            return
+        rate = self.sample.get(event)
+        if rate is not None:
+            # Determinisztikus ritkítás: minden 1/rate-edik bejegyzés marad
+            credit = self._sample_credit.get(event, 0.0) + rate
+            if credit < 1.0:
+                self._sample_credit[event] = credit
+                return
+            self._sample_credit[event] = credit - 1.0
+        
+        if self.thread is None:
+            self._start()
+        try:
+            self.queue.put_nowait((time.time(), level, event, message, fields))
+        except queue.Full:
+            self.dropped += 1
+    
+    def _start(self):
+        """
+        A kiíró szál indítása (az első bejegyzésnél).
+        """
+        with self._start_lock:
+            if self.thread is None:
+                thread = threading.Thread(target=self._write_loop, name="log-writer")
+                thread.daemon = True
+                thread.start()
+                self.thread = thread
+    
+    def _write_loop(self):
+        """
+        A bejegyzések formázása és kiírása a háttérszálon.
+        """
+        level_names = {value: name for name, value in self.LEVELS.items()}
+        while True:
+            item = self.queue.get()
+            if isinstance(item, threading.Event):
+                # flush() jelzése: az előtte sorba állított bejegyzések kiírva
+                item.set()
+                continue
+            
+            stream = self.stream or sys.stdout
+            try:
+                if self.dropped != self._reported_drops:
+                    lost = self.dropped - self._reported_drops
+                    self._reported_drops = self.dropped
+                    stream.write(self._format((time.time(), 30, "log_dropped",
+                                               "{count} naplóbejegyzés elveszett (megtelt a sor)",
+                                               {"count": lost}), level_names) + "\n")
+                stream.write(self._format(item, level_names) + "\n")
+                if self.queue.empty():
+                    stream.flush()
+            except Exception:
+                # A napló hibája nem állíthatja le a programot
+                pass
+    
+    def _format(self, item, level_names):
+        """
+        Egy bejegyzés szöveges vagy JSON alakja.
+        """
+        timestamp, level, event, message, fields = item
+        try:
+            text = message.format(**fields)
+        except (KeyError, IndexError, ValueError):
+            text = message
+        if self.format != "json":
+            return text
+        record = {"ts": timestamp, "level": level_names[level], "event": event, "message": text}
+        record.update(fields)
+        return json.dumps(record, ensure_ascii=False, default=str)
+    
+    def flush(self, timeout=1.0):
+        """
+        Legfeljebb timeout másodpercig vár, hogy a sorban lévő bejegyzések
+        kiíródjanak.
+        """
+        if self.thread is None:
+            return True
+        marker = threading.Event()
+        try:
+            self.queue.put(marker, timeout=timeout)
+        except queue.Full:
+            return False
+        return marker.wait(timeout)
+
+# Az egész program közös naplója
+log = LogSink()
+atexit.register(log.flush)
+
+# --------------------------
+# Szenzor előzmények
+# --------------------------
+class SensorHistory:
+    """
+    Egy szenzor utolsó capacity darab mérése fix méretű gyűrűpufferben
+    (időbélyeg és érték, double tömbök). Fájl megadásakor a puffer egy
+    mmap-elt fájlban van, így az előzmények újraindítás után is megmaradnak.
+    A memóriaigény a futásidőtől független.
+    """
+    # Fájlfejléc: azonosító, kapacitás, eddig írt mérések száma
+    HEADER = struct.Struct("<4sIQ")
+    MAGIC = b"SHH1"
+    
+    def __init__(self, capacity=1024, path=None):
+        self.capacity = capacity
+        self.path = path
+        self._mmap = None
+        self._file = None
+        self.count = 0
+        
+        if path is None:
+            self.timestamps = array.array('d', bytes(8 * capacity))
+            self.values = array.array('d', bytes(8 * capacity))
+        else:
+            self._open_mapped(path)
+    
+    def _open_mapped(self, path):
+        """
+        A gyűrűpuffer megnyitása (vagy létrehozása) egy mmap-elt fájlban.
+        """
+        size = self.HEADER.size + 16 * self.capacity
+        existing = os.path.exists(path) and os.path.getsize(path) == size
+        self._file = open(path, "r+b" if existing else "w+b")
+        if not existing:
+            self._file.truncate(size)
+        self._mmap = mmap.mmap(self._file.fileno(), size)
+        
+        magic, capacity, count = self.HEADER.unpack_from(self._mmap)
+        if magic == self.MAGIC and capacity == self.capacity:
+            self.count = count
+        else:
+            self.HEADER.pack_into(self._mmap, 0, self.MAGIC, self.capacity, 0)
+        
+        data = memoryview(self._mmap)[self.HEADER.size:]
+        self.timestamps = data[:8 * self.capacity].cast('d')
+        self.values = data[8 * self.capacity:].cast('d')
+    
+    def append(self, timestamp, value):
+        """
+        Egy mérés hozzáadása; a legrégebbi mérést felülírja, ha a puffer megtelt.
+        """
+        position = self.count % self.capacity
+        self.timestamps[position] = timestamp
+        self.values[position] = value
+        self.count += 1
+        if self._mmap is not None:
+            self.HEADER.pack_into(self._mmap, 0, self.MAGIC, self.capacity, self.count)
+    
+    def __len__(self):
+        return min(self.count, self.capacity)
+    
+    def recent(self, since=None):
+        """
+        A mérések (időbélyeg, érték) párjai a legújabbtól visszafelé,
+        since megadásakor csak az annál nem régebbiek.
+        """
+        for offset in range(1, len(self) + 1):
+            position = (self.count - offset) % self.capacity
+            timestamp = self.timestamps[position]
+            if since is not None and timestamp < since:
+                return
+            yield timestamp, self.values[position]
+    
+    def stats(self, window, now=None):
+        """
+        Az utolsó window másodperc méréseinek minimuma, maximuma és átlaga.
+        Mérés hiányában None.
+        """
+        now = time.time() if now is None else now
+        values = [value for _, value in self.recent(since=now - window)]
+        if not values:
+            return None
+        return {
+            "min": min(values),
+            "max": max(values),
+            "mean": sum(values) / len(values),
+            "count": len(values)
+        }
+    
+    def close(self):
+        """
+        Az mmap-elt fájl lezárása.
+        """
+        if self._mmap is not None:
+            self.timestamps.release()
+            self.values.release()
+            self._mmap.flush()
+            self._mmap.close()
+            self._file.close()
+            self._mmap = None
+
+
+class SensorHistoryStore:
+    """
+    Szenzoronkénti előzmények gyűjteménye. A numerikus és logikai értékeket
+    tárolja (a logikai érték 1.0 / 0.0), a többit figyelmen kívül hagyja.
+    """
+    def __init__(self, capacity=1024, directory=None):
+        self.capacity = capacity
+        self.directory = directory
+        self.histories = {}
+        if directory is not None:
+            os.makedirs(directory, exist_ok=True)
+    
+    def _path(self, device_id):
+        """
+        Az eszköz előzményfájljának útvonala, vagy None memóriában tartott
+        előzményeknél. Az olvasható (csak betűket és számokat megtartó)
+        név mellé az azonosító rövid kivonata kerül, mert az olvasható név
+        nem egyértelmű (pl. "a:b" és "a_b" ugyanaz lenne).
+        """
+        if self.directory is None:
+            return None
+        file_name = "".join(char if char.isalnum() else "_" for char in device_id)
+        digest = hashlib.blake2s(device_id.encode("utf-8"), digest_size=6).hexdigest()
+        return os.path.join(self.directory, f"{file_name}-{digest}.hist")
+    
+    def _history(self, device_id):
+        """
+        Az eszköz előzménypufferének lekérése, szükség esetén létrehozása.
+        """
+        history = self.histories.get(device_id)
+        if history is None:
+            history = SensorHistory(self.capacity, self._path(device_id))
+            self.histories[device_id] = history
+        return history
+    
+    def record(self, device_id, value, timestamp=None):
+        """
+        Egy mérés rögzítése.
+        """
+        if not isinstance(value, (int, float)):
+            return
+        self._history(device_id).append(time.time() if timestamp is None else timestamp, float(value))
+    
+    def stats(self, device_id, window, now=None):
+        """
+        Egy szenzor utolsó window másodpercének minimuma, maximuma és átlaga.
+        Ismeretlen eszköznél None; a lekérdezés nem hoz létre előzményfájlt.
+        """
+        if device_id not in self.histories:
+            path = self._path(device_id)
+            if path is None or not os.path.exists(path):
+                return None
+            # Korábbi futásból megmaradt előzmények
+            self._history(device_id)
+        return self.histories[device_id].stats(window, now)
+    
+    def close(self):
+        """
+        Az összes előzménypuffer lezárása.
+        """
+        for history in self.histories.values():
+            history.close()
+        self.histories.clear()
+
+# --------------------------
+# Szenzorfolyam rögzítése
+# --------------------------
+class SensorRecorder:
+    """
+    A beérkező szenzorváltozások rögzítése tömör, soronkénti JSON fájlba
+    (.gz végződésnél gzip tömörítéssel), későbbi visszajátszáshoz.
+    Az első sor a fejléc: az első változás időpontja, a szenzorazonosítók
+    listája és a nyilvántartás akkori pillanatképe. A többi sor egy-egy
+    változáscsomag: [az előző csomag óta eltelt ms, index, érték, index,
+    érték, ...], ahol az index az azonosítólistára mutat. A listában nem
+    szereplő eszköz első előfordulásakor egy csak az azonosítóját
+    tartalmazó sor bővíti a listát.
+    """
+    FORMAT = "SHR1"
+    
+    def __init__(self, path, registry):
+        self.path = path
+        self.registry = registry
+        self.start = None
+        self.count = 0
+        self._file = None
+        self._indexes = {}
+        self._offset = 0
+        self._closed = False
+        self._lock = threading.Lock()
+    
+    def _open(self, timestamp):
+        """
+        A fájl megnyitása és a fejléc kiírása az első változáskor.
+        """
+        opener = gzip.open if self.path.endswith(".gz") else open
+        self._file = opener(self.path, "wt", encoding="utf-8")
+        devices = self.registry.to_dict()
+        ids = [device_id for device_id, device in devices.items() if "sensor" in device.get("type", "")]
+        self._indexes = {device_id: idx for idx, device_id in enumerate(ids)}
+        self.start = timestamp
+        header = {"format": self.FORMAT, "start": timestamp, "ids": ids, "devices": devices}
+        self._file.write(json.dumps(header, separators=(",", ":")) + "\n")
+    
+    def record(self, timestamp, values):
+        """
+        Egy változáscsomag (eszközazonosító -> új érték) rögzítése.
+        """
+        if not values:
+            return
+        with self._lock:
+            if self._closed:
+                return
+            if self._file is None:
+                self._open(timestamp)
+            # A kezdőponthoz mért ms-ból képzett különbség nem halmoz fel kerekítési hibát
+            offset = max(self._offset, round((timestamp - self.start) * 1000))
+            line = [offset - self._offset]
+            self._offset = offset
+            for device_id, value in values.items():
+                idx = self._indexes.get(device_id)
+                if idx is None:
+                    idx = self._indexes[device_id] = len(self._indexes)
+                    self._file.write(json.dumps(device_id) + "\n")
+                line.append(idx)
+                line.append(value)
+            self._file.write(json.dumps(line, separators=(",", ":")) + "\n")
+            self.count += 1
+    
+    def close(self):
+        """
+        A felvétel lezárása.
+        """
+        with self._lock:
+            self._closed = True
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+
+class SensorRecording:
+    """
+    Egy SensorRecorder által írt felvétel visszaolvasása. Az iterálás
+    időrendben adja a (időbélyeg, {eszközazonosító: érték}) párokat.
+    """
+    def __init__(self, path):
+        self.path = path
+        with self._open() as recording_file:
+            header = json.loads(recording_file.readline() or "{}")
+        if header.get("format") != SensorRecorder.FORMAT:
+            raise ValueError(f"Ismeretlen felvételformátum: {path}")
+        self.start = header["start"]
+        self.ids = header["ids"]
+        self.devices = header["devices"]
+    
+    def _open(self):
+        opener = gzip.open if self.path.endswith(".gz") else open
+        return opener(self.path, "rt", encoding="utf-8")
+    
+    def __iter__(self):
+        ids = list(self.ids)
+        offset = 0
+        with self._open() as recording_file:
+            recording_file.readline()
+            for line in recording_file:
+                item = json.loads(line)
+                if isinstance(item, str):
+                    ids.append(item)
+                    continue
+                offset += item[0]
+                yield self.start + offset / 1000, {ids[idx]: value for idx, value in zip(item[1::2], item[2::2])}
+
+# --------------------------
+# Mérőszámok
+# --------------------------
+class LatencyHistogram:
+    """
+    Rögzített vödörhatárú késleltetés-hisztogram (másodpercben). Egy
+    mérés rögzítése egy bináris keresés és két összeadás, így a forró
+    úton is elhanyagolható a költsége.
+    """
+    BOUNDS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+    
+    def __init__(self):
+        # Az utolsó vödör a BOUNDS legnagyobb eleménél lassabb méréseké
+        self.counts = [0] * (len(self.BOUNDS) + 1)
+        self.total = 0.0
+        self.count = 0
+    
+    def observe(self, seconds):
+        """
+        Egy mérés rögzítése.
+        """
+        self.counts[bisect.bisect_left(self.BOUNDS, seconds)] += 1
+        self.total += seconds
+        self.count += 1
+    
+    def quantile(self, fraction):
+        """
+        A kvantilis becslése a vödrök felső határával (None, ha nincs mérés,
+        vagy ha a kvantilis a legfelső, nyitott vödörbe esik).
+        """
+        if not self.count:
+            return None
+        rank = fraction * self.count
+        cumulative = 0
+        for bound, bucket_count in zip(self.BOUNDS, self.counts):
+            cumulative += bucket_count
+            if cumulative >= rank:
+                return bound
+        return None
+    
+    def merge_snapshot(self, snapshot):
+        """
+        Egy másik hisztogram snapshot() eredményének hozzáadása.
+        """
+        for idx, bucket_count in enumerate(snapshot["buckets"].values()):
+            self.counts[idx] += bucket_count
+        self.total += snapshot["sum"]
+        self.count += snapshot["count"]
+    
+    def snapshot(self):
+        """
+        A hisztogram másolata a lekérdező API-hoz.
+        """
+        return {
+            "count": self.count,
+            "sum": self.total,
+            "buckets": dict(zip(self.BOUNDS + (float("inf"),), self.counts)),
+            "p50": self.quantile(0.50),
+            "p99": self.quantile(0.99),
+        }
+
+
+class Metrics:
+    """
+    Egy otthon (gateway kapcsolat) mérőszámai: parancsonkénti darabszám,
+    hibaszám és késleltetés-hisztogram, automatizálásonkénti kiváltásszám,
+    a monitorozási ütem hossza, valamint a küldött és fogadott bájtok.
+    A labels állandó címkéi (pl. {"home": "lakas1"}) minden Prometheus
+    sorba bekerülnek. A számlálók zár nélkül nőnek: a szinkron interfész
+    parancsait a kérészár sorosítja, a ritka párhuzamos növelésből eredő
+    eltérés pedig a mérés szempontjából elhanyagolható.
+    """
+    PREFIX = "smarthome"
+    # A vödörhatárok Prometheus "le" címkéi
+    BOUND_LABELS = tuple(repr(bound) for bound in LatencyHistogram.BOUNDS) + ("+Inf",)
+    
+    def __init__(self, labels=None):
+        self.labels = dict(labels or {})
+        self.commands = {}
+        self.command_errors = {}
+        self.routine_fires = {}
+        self.tick = LatencyHistogram()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.server = None
+    
+    def observe_command(self, command, seconds, error=False):
+        """
+        Egy protokollparancs idejének (és esetleges hibájának) rögzítése.
+        """
+        histogram = self.commands.get(command)
+        if histogram is None:
+            histogram = self.commands[command] = LatencyHistogram()
+        histogram.observe(seconds)
+        if error:
+            self.command_errors[command] = self.command_errors.get(command, 0) + 1
+    
+    def routine_fired(self, name):
+        """
+        Egy automatizálás kiváltásának számlálása.
+        """
+        self.routine_fires[name] = self.routine_fires.get(name, 0) + 1
+    
+    def observe_tick(self, seconds):
+        """
+        Egy monitorozási ütem (lekérdezés és kiértékelés) idejének rögzítése.
+        """
+        self.tick.observe(seconds)
+    
+    def merge_snapshot(self, snapshot):
+        """
+        Egy (pl. másik folyamatból kapott) snapshot() eredmény hozzáadása a
+        mérőszámokhoz; több otthon összesítéséhez.
+        """
+        for command, histogram_snapshot in snapshot["commands"].items():
+            histogram = self.commands.get(command)
+            if histogram is None:
+                histogram = self.commands[command] = LatencyHistogram()
+            histogram.merge_snapshot(histogram_snapshot)
+        for command, count in snapshot["command_errors"].items():
+            self.command_errors[command] = self.command_errors.get(command, 0) + count
+        for name, count in snapshot["routine_fires"].items():
+            self.routine_fires[name] = self.routine_fires.get(name, 0) + count
+        self.tick.merge_snapshot(snapshot["tick"])
+        self.bytes_sent += snapshot["bytes_sent"]
+        self.bytes_received += snapshot["bytes_received"]
+    
+    def snapshot(self):
+        """
+        Az összes mérőszám szótárként (lekérdező API).
+        """
+        return {
+            "labels": dict(self.labels),
+            "commands": {command: histogram.snapshot() for command, histogram in list(self.commands.items())},
+            "command_errors": dict(self.command_errors),
+            "routine_fires": dict(self.routine_fires),
+            "tick": self.tick.snapshot(),
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+        }
+    
+    def _label_text(self, **labels):
+        """
+        Prometheus címkelista az állandó és a megadott címkékkel.
+        """
+        labels = dict(self.labels, **labels)
+        if not labels:
+            return ""
+        parts = []
+        for key, value in labels.items():
+            value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+            parts.append(f'{key}="{value}"')
+        return "{" + ",".join(parts) + "}"
+    
+    def _histogram_lines(self, name, histogram, **labels):
+        """
+        Egy hisztogram Prometheus sorai (kumulatív vödrök, összeg, darabszám).
+        """
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.BOUND_LABELS, histogram.counts):
+            cumulative += bucket_count
+            lines.append(f"{name}_bucket{self._label_text(le=bound, **labels)} {cumulative}")
+        lines.append(f"{name}_sum{self._label_text(**labels)} {histogram.total}")
+        lines.append(f"{name}_count{self._label_text(**labels)} {histogram.count}")
+        return lines
+    
+    def prometheus_text(self):
+        """
+        A mérőszámok Prometheus szöveges formátumban.
+        """
+        prefix = self.PREFIX
+        lines = [
+            f"# HELP {prefix}_command_duration_seconds Protokollparancsok válaszideje",
+            f"# TYPE {prefix}_command_duration_seconds histogram",
+        ]
+        for command, histogram in sorted(self.commands.items()):
+            lines.extend(self._histogram_lines(f"{prefix}_command_duration_seconds", histogram, command=command))
+        
+        lines.append(f"# HELP {prefix}_command_errors_total Hibával zárult protokollparancsok")
+        lines.append(f"# TYPE {prefix}_command_errors_total counter")
+        for command, count in sorted(self.command_errors.items()):
+            lines.append(f"{prefix}_command_errors_total{self._label_text(command=command)} {count}")
+        
+        lines.append(f"# HELP {prefix}_routine_fires_total Automatizálások kiváltásainak száma")
+        lines.append(f"# TYPE {prefix}_routine_fires_total counter")
+        for name, count in sorted(self.routine_fires.items()):
+            lines.append(f"{prefix}_routine_fires_total{self._label_text(routine=name)} {count}")
+        
+        lines.append(f"# HELP {prefix}_tick_duration_seconds Monitorozási ütemek hossza")
+        lines.append(f"# TYPE {prefix}_tick_duration_seconds histogram")
+        lines.extend(self._histogram_lines(f"{prefix}_tick_duration_seconds", self.tick))
+        
+        for direction, value in (("sent", self.bytes_sent), ("received", self.bytes_received)):
+            lines.append(f"# HELP {prefix}_bytes_{direction}_total A gateway-jel forgalmazott bájtok")
+            lines.append(f"# TYPE {prefix}_bytes_{direction}_total counter")
+            lines.append(f"{prefix}_bytes_{direction}_total{self._label_text()} {value}")
+        return "\n".join(lines) + "\n"
+    
+    def start_server(self, port=9108, host='127.0.0.1'):
+        """
+        Helyi HTTP végpont indítása háttérszálon, amely a /metrics útvonalon
+        Prometheus formátumban adja vissza a mérőszámokat. port=0 esetén
+        szabad portot választ. Visszaadja a tényleges portot, vagy None-t.
+        """
+        metrics = self
+        
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.prometheus_text().encode('utf-8')
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            
+            def log_message(self, format, *args):
+                # A lekérdezések nem szemetelik a konzolt
+                pass
+        
+        try:
+            self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        except OSError as e:
+            log.error("metrics_server_failed", "Hiba a mérőszám-végpont indítása során: {error}", error=e)
+            return None
+        self.server.daemon_threads = True
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        log.info("metrics_server_started", "Mérőszámok elérhetők: http://{host}:{port}/metrics",
+                 host=host, port=self.server.server_port)
+        return self.server.server_port
+    
+    def stop_server(self):
+        """
+        A HTTP végpont leállítása.
+        """
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+# --------------------------
+# Tömör eszköznyilvántartás
+# --------------------------
+# Hiányzó mező jelölése a DeviceRecord slotjaiban
+_MISSING = object()
+
+class DeviceRecord:
+    """
+    Egy eszköz állapota __slots__ alapú rekordként. A vezérlő által ismert
+    eszköztípusok mezői (name, type, value, status, speed, temp) slotokban
+    vannak, az egyéb mezők egy csak szükség esetén létrehozott szótárban. Szótárszerűen
+    olvasható és írható ([], get, in, keys, items), és egyenlőnek számít
+    az azonos tartalmú szótárral, így a meglévő kód változatlanul
+    használhatja. Egy rekord jóval kevesebb memóriát foglal egy szótárnál.
+    """
+    __slots__ = ("name", "type", "value", "status", "speed", "temp", "extra")
+    FIELDS = ("name", "type", "value", "status", "speed", "temp")
+    FIELD_SET = frozenset(FIELDS)
+    
+    def __init__(self, data=None):
+        self.name = self.type = self.value = self.status = self.speed = self.temp = _MISSING
+        self.extra = None
+        if data:
+            self.update(data)
+    
+    def __getitem__(self, key):
+        if key in self.FIELD_SET:
+            value = getattr(self, key)
+            if value is _MISSING:
+                raise KeyError(key)
+            return value
+        if self.extra is None:
+            raise KeyError(key)
+        return self.extra[key]
+    
+    def get(self, key, default=None):
+        if key in self.FIELD_SET:
+            value = getattr(self, key)
+            return default if value is _MISSING else value
+        if self.extra is None:
+            return default
+        return self.extra.get(key, default)
+    
+    def __setitem__(self, key, value):
+        if key in self.FIELD_SET:
+            if key == "type":
+                # Kevés különböző típus van, a példányok közösek lehetnek
+                value = sys.intern(value) if type(value) is str else value
+            setattr(self, key, value)
+        else:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[key] = value
+    
+    def __contains__(self, key):
+        if key in self.FIELD_SET:
+            return getattr(self, key) is not _MISSING
+        return self.extra is not None and key in self.extra
+    
+    def keys(self):
+        keys = [field for field in self.FIELDS if getattr(self, field) is not _MISSING]
+        if self.extra:
+            keys.extend(self.extra)
+        return keys
+    
+    def __iter__(self):
+        return iter(self.keys())
+    
+    def __len__(self):
+        return len(self.keys())
+    
+    def values(self):
+        return [self[key] for key in self.keys()]
+    
+    def items(self):
+        return [(key, self[key]) for key in self.keys()]
+    
+    def update(self, data):
+        """
+        Mezők felülírása egy szótárból (vagy másik rekordból).
+        """
+        for key, value in data.items():
+            self[key] = value
+    
+    def assign(self, data):
+        """
+        A rekord tartalmának teljes cseréje (helyben, az objektum marad).
+        """
+        self.name = self.type = self.value = self.status = self.speed = self.temp = _MISSING
+        self.extra = None
+        self.update(data)
+    
+    def to_dict(self):
+        """
+        A rekord szótárként (pl. JSON mentéshez).
+        """
+        return dict(self.items())
+    
+    def __eq__(self, other):
+        if isinstance(other, DeviceRecord):
+            return self.to_dict() == other.to_dict()
+        if isinstance(other, dict):
+            return self.to_dict() == other
+        return NotImplemented
+    
+    __hash__ = None
+    
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+class DeviceRegistry:
+    """
+    Eszközazonosító -> DeviceRecord nyilvántartás szótárszerű felülettel.
+    Az azonosítókat internálja, a beírt szótárakat rekorddá alakítja, és a
+    már ismert eszköz új állapotát a meglévő rekordba írja (nem cseréli
+    le), így a rekordra mutató hivatkozások érvényesek maradnak.
+    
+    A track_changes által bekapcsolt dirty halmaz a beírt, törölt és a
+    helyben módosított (mark_dirty) eszközök azonosítóit gyűjti, így az
+    állapotjelentésnek nem kell a teljes nyilvántartást végignéznie.
+    
+    Az eszközök felvétele és törlése a lock alatt történik, a bejárás
+    (keys, values, items, iter) pedig a lock alatt készült listán
+    halad, így egy másik szál (pl. a háttérben futó egyeztetés) nem
+    okozhat "changed size during iteration" hibát.
+    """
+    def __init__(self, devices=None):
+        self._records = {}
+        self.lock = threading.RLock()
+        # A forró úton leggyakoribb olvasás közvetlenül a belső szótár
+        # metódusa, Python szintű hívás nélkül
+        self.get = self._records.get
+        # A változások követése (track_changes kapcsolja be)
+        self.dirty = None
+        if devices:
+            self.update(devices)
+    
+    def track_changes(self):
+        """
+        A változások követésének (újra)indítása. Visszaadja az új dirty
+        halmazt, kezdetben az összes eszközzel; a fogyasztó set.pop()
+        hívásokkal üríti, ami más szálak beírásai mellett is biztonságos.
+        """
+        self.dirty = set(self._records)
+        return self.dirty
+    
+    def mark_dirty(self, device_ids):
+        """
+        Helyben módosított eszközök jelzése a változáskövetésnek.
+        """
+        if self.dirty is not None:
+            self.dirty.update(device_ids)
+    
+    def __getitem__(self, device_id):
+        return self._records[device_id]
+    
+    def __setitem__(self, device_id, device):
+        record = self._records.get(device_id)
+        if record is not None:
+            if record is not device:
+                record.assign(device)
+        else:
+            if not isinstance(device, DeviceRecord):
+                device = DeviceRecord(device)
+            with self.lock:
+                self._records[sys.intern(device_id)] = device
+        # A jelzés az írás után, hogy a megjelenítő már az új állapotot lássa
+        if self.dirty is not None:
+            self.dirty.add(device_id)
+    
+    def __delitem__(self, device_id):
+        with self.lock:
+            del self._records[device_id]
+        if self.dirty is not None:
+            self.dirty.add(device_id)
+    
+    def pop(self, device_id, *default):
+        with self.lock:
+            device = self._records.pop(device_id, *default)
+        if self.dirty is not None:
+            self.dirty.add(device_id)
+        return device
+    
+    def __contains__(self, device_id):
+        return device_id in self._records
+    
+    def __iter__(self):
+        return iter(self.keys())
+    
+    def __len__(self):
+        return len(self._records)
+    
+    def keys(self):
+        with self.lock:
+            return list(self._records)
+    
+    def values(self):
+        with self.lock:
+            return list(self._records.values())
+    
+    def items(self):
+        with self.lock:
+            return list(self._records.items())
+    
+    def clear(self):
+        with self.lock:
+            device_ids = list(self._records)
+            self._records.clear()
+        self.mark_dirty(device_ids)
+    
+    def update(self, devices):
+        with self.lock:
+            for device_id, device in devices.items():
+                self[device_id] = device
+    
+    def replace(self, devices):
+        """
+        A teljes tartalom cseréje egy lépésben (pl. teljes felderítés
+        után): a megmaradó eszközök rekordjai helyben frissülnek, a
+        hiányzók törlődnek. A lock miatt a többi szál sosem lát üres
+        vagy félig frissített nyilvántartást.
+        """
+        with self.lock:
+            for device_id in [device_id for device_id in self._records if device_id not in devices]:
+                self.pop(device_id)
+            self.update(devices)
+    
+    def to_dict(self):
+        """
+        A nyilvántartás egyszerű szótárakként (pl. JSON mentéshez).
+        """
+        return {device_id: record.to_dict() for device_id, record in self.items()}
+    
+    def __repr__(self):
+        return repr(self.to_dict())
+
+# --------------------------
+# Közös eszköznyilvántartás-kezelés
+# --------------------------
+class DeviceRegistryMixin:
+    """
+    A szinkron és az aszinkron interfész közös, helyi nyilvántartást
+    frissítő műveletei. A leszármazottnak device_registry (DeviceRegistry)
+    attribútummal kell rendelkeznie.
+    """
+    # Szenzor előzmények (enable_history kapcsolja be)
+    history = None
+    # Szenzorfolyam felvétele (enable_recording kapcsolja be)
+    recorder = None
+    # Az időbélyegek forrása; visszajátszáskor virtuális óra
+    clock = staticmethod(time.time)
+    # Növekményes szenzorlekérdezés: a gateway futásazonosítója és az
+    # utoljára látott változási sorszám (None: még nincs kiindulópont)
+    sensor_epoch = None
+    sensor_sequence = None
+    sensor_changes_supported = True
+    # Az eszközönként (device_ids szűrővel) lekérdezett szenzorok saját,
+    # sensor_sequence-nél újabb sorszáma; None, ha nincs ilyen
+    sensor_cursors = None
+    # Eszköztípusonkénti holtsáv (set_deadband); None, ha nincs
+    deadbands = None
+    # A gateway által (nem átviteli hiba miatt) elutasított parancsok
+    # eszközei; a vezérlő ezeket nem küldi újra
+    rejected_devices = frozenset()
+    # A nyilvántartás gateway által adott verziója (növekményes felderítéshez)
+    registry_version = None
+    # Bináris kódolásnál a gateway által kiosztott handle-ök
+    # (azonosító -> handle és vissza); None, ha még nincsenek lekérve
+    _device_handles = None
+    _handle_ids = None
+    
+    def enable_history(self, capacity=1024, directory=None):
+        """
+        Bekapcsolja a szenzorértékek rögzítését szenzoronkénti,
+        capacity méretű gyűrűpufferekbe. directory megadásakor az
+        előzmények mmap-elt fájlokban, újraindítás után is megmaradnak.
+        """
+        self.history = SensorHistoryStore(capacity, directory)
+        return self.history
+    
+    def enable_recording(self, path):
+        """
+        Bekapcsolja a szenzorváltozások rögzítését a path felvételfájlba
+        (SensorRecorder), amelyet a SmartHome_replay.py visszajátszik.
+        """
+        self.recorder = SensorRecorder(path, self.device_registry)
+        return self.recorder
+    
+    def set_deadband(self, device_type, threshold):
+        """
+        Holtsáv beállítása: a device_type típusú szenzorok threshold-nál
+        kisebb numerikus változásait (zaj) a nyilvántartás nem veszi át,
+        így automatizálást sem váltanak ki. A küszöb a legutóbb átvett
+        értékhez mér, ezért a lassú sodródás sem vész el. threshold=None
+        törli a holtsávot.
+        """
+        deadbands = dict(self.deadbands or {})
+        if threshold:
+            deadbands[device_type] = threshold
+        else:
+            deadbands.pop(device_type, None)
+        self.deadbands = deadbands or None
+    
+    def _apply_state(self, device_id, state):
+        """
+        Egy sikeresen beállított állapot átvezetése a helyi nyilvántartásba.
+        """
+        device = self.device_registry[device_id]
+        if isinstance(state, dict):
+            for key, value in state.items():
+                if key in device:
+                    device[key] = value
+        else:
+            device["status"] = state
+        self.device_registry.mark_dirty((device_id,))
+    
+    def save_snapshot(self, path):
+        """
+        A nyilvántartás mentése tömör JSON pillanatképbe. Az írás egy
+        ideiglenes fájlba történik, így félbeszakadt mentés nem rontja el
+        a korábbi pillanatképet.
+        """
+        snapshot = {"version": self.registry_version, "devices": self.device_registry.to_dict()}
+        temp_path = f"{path}.tmp"
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with open(temp_path, "w", encoding="utf-8") as snapshot_file:
+                json.dump(snapshot, snapshot_file, separators=(",", ":"))
+            os.replace(temp_path, path)
+            return True
+        except (OSError, TypeError, ValueError) as e:
+            log.error("snapshot_save_failed", "Hiba a pillanatkép mentése során: {error}", error=e)
+            return False
+    
+    def load_snapshot(self, path):
+        """
+        A nyilvántartás betöltése egy korábbi pillanatképből.
+        Visszaadja, hogy sikerült-e.
+        """
+        try:
+            with open(path, "r", encoding="utf-8") as snapshot_file:
+                snapshot = json.load(snapshot_file)
+        except FileNotFoundError:
+            return False
+        except (OSError, ValueError) as e:
+            log.error("snapshot_load_failed", "Hiba a pillanatkép betöltése során: {error}", error=e)
+            return False
+        
+        self.device_registry.replace(snapshot.get("devices", {}))
+        self.registry_version = snapshot.get("version")
+        log.info("snapshot_loaded", "{count} eszköz betöltve a pillanatképből", count=len(self.device_registry))
+        return True
+    
+    def _apply_device_changes(self, changes):
+        """
+        Egy GET_DEVICE_CHANGES válasz (version, changed, removed)
+        átvezetése a nyilvántartásba, helyben.
+        """
+        with self.device_registry.lock:
+            for device_id, device_info in changes.get("changed", {}).items():
+                self.device_registry[device_id] = device_info
+            for device_id in changes.get("removed", []):
+                self.device_registry.pop(device_id, None)
+        self.registry_version = changes.get("version")
+        # Új eszközökhöz a handle-öket is újra le kell kérni
+        if self._device_handles is not None and any(
+                device_id not in self._device_handles for device_id in changes.get("changed", {})):
+            self._device_handles = self._handle_ids = None
+    
+    def _state_matches(self, device_id, state):
+        """
+        Eldönti, hogy a helyi nyilvántartás szerint az eszköz már a kért
+        állapotban van-e (ilyenkor a parancsot nem kell elküldeni).
+        """
+        device = self.device_registry.get(device_id)
+        if device is None:
+            return False
+        if isinstance(state, dict):
+            return all(key in device and device[key] == value for key, value in state.items())
+        return device.get("status") == state
+    
+    def _apply_sensor_values(self, sensor_values):
+        """
+        A gateway-től kapott szenzorértékek átvezetése a helyi nyilvántartásba.
+        Visszaadja azoknak az eszközöknek a listáját, amelyek értéke megváltozott.
+        """
+        changed = []
+        now = self.clock()
+        deadbands = self.deadbands
+        for device_id, value in sensor_values.items():
+            device = self.device_registry.get(device_id)
+            if device is not None:
+                # A forró úton közvetlenül a rekord slotját használjuk
+                if device.value != value:
+                    if deadbands and self._within_deadband(deadbands.get(device.type), device.value, value):
+                        continue
+                    changed.append(device_id)
+                device.value = value
+                if self.history is not None:
+                    self.history.record(device_id, value, now)
+        if changed:
+            self.device_registry.mark_dirty(changed)
+            if self.recorder is not None:
+                self.recorder.record(now, {device_id: sensor_values[device_id] for device_id in changed})
+        return changed
+    
+    @staticmethod
+    def _within_deadband(threshold, old_value, value):
+        """
+        Igaz, ha a változás numerikus, és kisebb a holtsávnál.
+        """
+        if not threshold or isinstance(value, bool) or isinstance(old_value, bool):
+            return False
+        try:
+            return abs(value - old_value) < threshold
+        except TypeError:
+            return False
+    
+    def _sensor_changes_since(self, device_ids):
+        """
+        A GET_SENSOR_CHANGES kérés kiindulópontja. Szűrő nélkül a
+        globális sorszám; szűrővel a felsorolt szenzorok sorszámai közül
+        a legrégebbi, így egyik szenzor változása sem maradhat ki (a már
+        látott értékek ismételt átvétele nem számít változásnak).
+        """
+        if device_ids is None or not self.sensor_cursors:
+            return self.sensor_sequence
+        cursors = [self.sensor_cursors.get(device_id, self.sensor_sequence) for device_id in device_ids]
+        if None in cursors:
+            return None
+        return min(cursors, default=self.sensor_sequence)
+    
+    def _apply_sensor_changes(self, reply, device_ids=None):
+        """
+        Egy GET_SENSOR_CHANGES válasz (epoch, sequence, full, values)
+        átvezetése, és a sorszám megjegyzése a következő kéréshez:
+        szűrő nélkül globálisan, device_ids szűrővel csak a felsorolt
+        szenzorokra. Visszaadja a megváltozott eszközök listáját; None-t,
+        ha a gateway nem ismeri a parancsot.
+        """
+        if not isinstance(reply, dict) or "sequence" not in reply:
+            log.warning("sensor_changes_unsupported",
+                        "A gateway nem támogatja a növekményes szenzorlekérdezést, teljes lekérdezés")
+            self.sensor_changes_supported = False
+            return None
+        sequence = reply["sequence"]
+        if reply.get("epoch") != self.sensor_epoch:
+            # Újraindult gateway: a korábbi sorszámok érvénytelenek
+            self.sensor_epoch = reply.get("epoch")
+            self.sensor_sequence = None
+            self.sensor_cursors = None
+        if device_ids is None:
+            self.sensor_sequence = sequence
+            self.sensor_cursors = None
+        else:
+            cursors = self.sensor_cursors or {}
+            for device_id in device_ids:
+                cursors[device_id] = sequence
+            self.sensor_cursors = cursors
+        return self._apply_sensor_values(reply.get("values") or {})
+    
+    def _handle_event(self, message):
+        """
+        Egy gateway által küldött SENSOR_CHANGED esemény feldolgozása.
+        Az esemény vagy egyetlen értéket (device_id, value), vagy
+        több értéket (values) tartalmaz.
+        Visszaadja a megváltozott eszközök listáját. A nem objektum
+        (pl. lista vagy szám) JSON üzenetet naplózza és eldobja.
+        """
+        if not isinstance(message, dict):
+            log.warning("invalid_event", "Az esemény nem JSON objektum: {payload!r}", payload=message)
+            return []
+        if message.get("event") != "SENSOR_CHANGED":
+            return []
+        if "values" in message:
+            if not isinstance(message["values"], dict):
+                log.warning("invalid_event", "Hibás values mező az eseményben: {payload!r}", payload=message)
+                return []
+            return self._apply_sensor_values(message["values"])
+        return self._apply_sensor_values({message.get("device_id"): message.get("value")})
+
+# --------------------------
+# Keretezett adatfolyam olvasás
+# --------------------------
+class FrameDecoder:
+    """
+    Inkrementális keretdekóder. A beérkező bájtokat egy bytearray
+    pufferben gyűjti, és csak az új bájtokban keresi a határolót, így egy
+    nagy válasz feldolgozása lineáris idejű. Hosszelőtagos módban minden
+    keret egy 4 bájtos (big-endian) hossz mezővel kezdődik.
+    """
+    LENGTH_PREFIX = struct.Struct(">I")
+    
+    def __init__(self, delimiter=b"\n", length_prefixed=False):
+        self.delimiter = delimiter
+        self.length_prefixed = length_prefixed
+        self.buffer = bytearray()
+        # Eddig a pozícióig már kerestük a határolót
+        self._scan_pos = 0
+        self._scan_delimiter = delimiter
+    
+    def feed(self, data):
+        """
+        Új bájtok hozzáfűzése a pufferhez.
+        """
+        self.buffer += data
+    
+    def next_frame(self, delimiter=None):
+        """
+        Visszaadja a következő teljes keretet (határoló nélkül),
+        vagy None-t, ha még nem érkezett meg teljesen.
+        """
+        if self.length_prefixed:
+            return self._next_length_prefixed()
+        
+        delimiter = delimiter or self.delimiter
+        if delimiter != self._scan_delimiter:
+            self._scan_pos = 0
+            self._scan_delimiter = delimiter
+        
+        # A határoló átnyúlhat az előző és az új adat határán
+        start = max(0, self._scan_pos - len(delimiter) + 1)
+        index = self.buffer.find(delimiter, start)
+        if index < 0:
+            self._scan_pos = len(self.buffer)
+            return None
+        
+        frame = bytes(self.buffer[:index])
+        del self.buffer[:index + len(delimiter)]
+        self._scan_pos = 0
+        return frame
+    
+    def _next_length_prefixed(self):
+        """
+        Egy hosszelőtagos keret kiolvasása a pufferből.
+        """
+        header_size = self.LENGTH_PREFIX.size
+        if len(self.buffer) < header_size:
+            return None
+        (length,) = self.LENGTH_PREFIX.unpack_from(self.buffer)
+        if len(self.buffer) < header_size + length:
+            return None
+        
+        frame = bytes(self.buffer[header_size:header_size + length])
+        del self.buffer[:header_size + length]
+        return frame
+    
+    def frames(self, delimiter=None):
+        """
+        Az összes pufferben lévő teljes keret bejárása.
+        """
+        while True:
+            frame = self.next_frame(delimiter)
+            if frame is None:
+                return
+            yield frame
+    
+    def encode(self, payload):
+        """
+        Egy kimenő üzenet keretezése.
+        """
+        if self.length_prefixed:
+            return self.LENGTH_PREFIX.pack(len(payload)) + payload
+        return payload + b"\n"
+
+
+class FramedConnection:
+    """
+    Keretezett üzenetküldés és -fogadás egy socket fölött. A fogadás egy
+    előre lefoglalt pufferbe olvas (recv_into), így az adatot csak egyszer
+    kell a dekóder pufferébe másolni.
+    """
+    RECV_SIZE = 65536
+    
+    def __init__(self, sock, length_prefixed=False, metrics=None):
+        self.socket = sock
+        self.decoder = FrameDecoder(length_prefixed=length_prefixed)
+        # A forgalmazott bájtok számlálása (opcionális)
+        self.metrics = metrics
+        self._recv_buffer = bytearray(self.RECV_SIZE)
+        self._recv_view = memoryview(self._recv_buffer)
+    
+    def _apply_deadline(self, deadline):
+        """
+        A socket időkorlátját a határidőig hátralévő időre állítja
+        (time.monotonic() szerinti határidő). Lejárt határidőnél
+        socket.timeout kivételt dob.
+        """
+        if deadline is None:
+            return
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise socket.timeout("A kérés határideje lejárt")
+        self.socket.settimeout(remaining)
+    
+    def send_frame(self, payload, deadline=None):
+        """
+        Egy üzenet elküldése keretezve.
+        """
+        frame = self.decoder.encode(payload)
+        self._apply_deadline(deadline)
+        self.socket.sendall(frame)
+        if self.metrics is not None:
+            self.metrics.bytes_sent += len(frame)
+    
+    def read_frame(self, delimiter=None, deadline=None):
+        """
+        Beolvassa a következő teljes keretet. Ha a kapcsolat lezárul,
+        a pufferben maradt adatot adja vissza, üres puffer esetén
+        ConnectionError kivételt dob. Határidő megadásával a lassan
+        csordogáló válasz sem tarthat tovább annál.
+        """
+        while True:
+            frame = self.decoder.next_frame(delimiter)
+            if frame is not None:
+                return frame
+            
+            self._apply_deadline(deadline)
+            received = self.socket.recv_into(self._recv_view)
+            if not received:
+                if self.decoder.buffer:
+                    frame = bytes(self.decoder.buffer)
+                    self.decoder.buffer.clear()
+                    return frame
+                raise ConnectionError("A kapcsolat lezárult")
+            if self.metrics is not None:
+                self.metrics.bytes_received += received
+            self.decoder.feed(self._recv_view[:received])
+    
+    def read_message(self, delimiter=None, deadline=None):
+        """
+        A következő nem üres keret beolvasása szövegként.
+        """
+        while True:
+            frame = self.read_frame(delimiter, deadline)
+            if frame.strip():
+                return frame.decode('utf-8')
+
+
+# --------------------------
+# Bináris protokoll
+# --------------------------
+class BinaryProtocol:
+    """
+    Tömör bináris kódolás a leggyakoribb kérés-válasz párhoz
+    (GET_SENSOR_VALUES). Az eszközöket a gateway által kiosztott egész
+    azonosítók (handle) jelölik, így az értékek azonosító szövegek és JSON
+    nélkül, rögzített méretű struct rekordokként utaznak. A kódolást a
+    kapcsolat elején HELLO paranccsal egyeztetjük; utána a kapcsolat
+    hosszelőtagos keretezést használ, a többi parancs továbbra is JSON.
+    
+    Kérés:  "!BBI" típus (0x01), jelzők (1 = minden szenzor), request_id,
+            majd a lekérdezett handle-ök ("!I")
+    Válasz: "!BIIIII" típus (0x81), request_id, a hamis, igaz, egész és
+            valós értékek száma, majd sorban
+            hamis:  "!I"  handle
+            igaz:   "!I"  handle
+            egész:  "!Iq" handle, érték
+            valós:  "!Id" handle, érték
+            végül az egyéb értékek JSON objektumként (azonosító -> érték)
+    A szakaszokat egyben bontjuk ki, így a dekódolás nem Python ciklus.
+    """
+    NAME = "binary1"
+    SENSOR_REQUEST = 0x01
+    SENSOR_VALUES = 0x81
+    ALL_SENSORS = 0x01
+    REQUEST_HEADER = struct.Struct("!BBI")
+    VALUES_HEADER = struct.Struct("!BIIIII")
+    
+    @classmethod
+    def encode_sensor_request(cls, handles=None, request_id=0):
+        """
+        Szenzorérték-kérés kódolása; handles=None esetén minden szenzorra.
+        """
+        if handles is None:
+            return cls.REQUEST_HEADER.pack(cls.SENSOR_REQUEST, cls.ALL_SENSORS, request_id)
+        handles = list(handles)
+        return (cls.REQUEST_HEADER.pack(cls.SENSOR_REQUEST, 0, request_id)
+                + struct.pack(f"!{len(handles)}I", *handles))
+    
+    @classmethod
+    def decode_sensor_request(cls, frame):
+        """
+        Visszaadja a (request_id, handle-lista) párt; minden szenzor
+        lekérdezésekor a lista None.
+        """
+        _, flags, request_id = cls.REQUEST_HEADER.unpack_from(frame)
+        if flags & cls.ALL_SENSORS:
+            return request_id, None
+        count = (len(frame) - cls.REQUEST_HEADER.size) // 4
+        return request_id, list(struct.unpack_from(f"!{count}I", frame, cls.REQUEST_HEADER.size))
+    
+    @classmethod
+    def encode_sensor_values(cls, values, device_handles, request_id=0):
+        """
+        Szenzorértékek (azonosító -> érték) kódolása a device_handles
+        (azonosító -> handle) szerint. A handle nélküli eszközök és a nem
+        szám típusú értékek a JSON részbe kerülnek.
+        """
+        false, true, ints, floats, other = [], [], [], [], {}
+        for device_id, value in values.items():
+            handle = device_handles.get(device_id)
+            value_type = type(value)
+            if handle is None:
+                other[device_id] = value
+            elif value_type is bool:
+                (true if value else false).append(handle)
+            elif value_type is int and -2 ** 63 <= value < 2 ** 63:
+                ints += (handle, value)
+            elif value_type is float:
+                floats += (handle, value)
+            else:
+                other[device_id] = value
+        
+        int_count, float_count = len(ints) // 2, len(floats) // 2
+        parts = [
+            cls.VALUES_HEADER.pack(cls.SENSOR_VALUES, request_id, len(false), len(true), int_count, float_count),
+            struct.pack(f"!{len(false) + len(true)}I", *false, *true),
+            struct.pack("!" + "Iq" * int_count, *ints),
+            struct.pack("!" + "Id" * float_count, *floats),
+        ]
+        if other:
+            parts.append(json.dumps(other).encode('utf-8'))
+        return b"".join(parts)
+    
+    @classmethod
+    def decode_sensor_values(cls, frame, handle_ids):
+        """
+        Visszaadja a (request_id, azonosító -> érték szótár) párt. A
+        handle_ids (handle -> azonosító) által nem ismert handle-öket kihagyja.
+        """
+        _, request_id, false_count, true_count, int_count, float_count = cls.VALUES_HEADER.unpack_from(frame)
+        offset = cls.VALUES_HEADER.size
+        get_id = handle_ids.get
+        
+        handles = struct.unpack_from(f"!{false_count + true_count}I", frame, offset)
+        values = dict.fromkeys(map(get_id, handles[:false_count]), False)
+        values.update(dict.fromkeys(map(get_id, handles[false_count:]), True))
+        offset += 4 * len(handles)
+        
+        # Egész és valós rekordok: handle (4 bájt) + érték (8 bájt)
+        for code, count in (("q", int_count), ("d", float_count)):
+            records = struct.unpack_from("!" + ("I" + code) * count, frame, offset)
+            values.update(zip(map(get_id, records[0::2]), records[1::2]))
+            offset += 12 * count
+        # Az ismeretlen handle-ök a None kulcs alá kerültek
+        values.pop(None, None)
+        
+        if offset < len(frame):
+            values.update(json.loads(bytes(frame[offset:])))
+        return request_id, values
+
+
+class Backoff:
+    """
+    Véletlenített ("full jitter") exponenciális visszalépés az ismételt
+    kapcsolódási kísérletekhez. Nem altatja a hívót: csak azt tartja
+    nyilván, mikor szabad legközelebb próbálkozni, így egy elérhetetlen
+    gateway mellett a hívások azonnal, blokkolás nélkül térnek vissza.
+    """
+    
+    def __init__(self, base=0.2, maximum=10.0):
+        self.base = base
+        self.maximum = maximum
+        self.failures = 0
+        self.next_attempt = 0.0
+    
+    def ready(self):
+        """
+        Igaz, ha a várakozási idő letelt, és újra lehet próbálkozni.
+        """
+        return time.monotonic() >= self.next_attempt
+    
+    def failure(self):
+        """
+        Sikertelen kísérlet: a következő várakozás egyenletes eloszlású
+        véletlen érték 0 és base * 2^hibák (legfeljebb maximum) között.
+        Visszaadja a várakozás hosszát másodpercben.
+        """
+        delay = random.uniform(0, min(self.maximum, self.base * 2 ** self.failures))
+        self.failures += 1
+        self.next_attempt = time.monotonic() + delay
+        return delay
+    
+    def success(self):
+        """
+        Sikeres kísérlet: a visszalépés alaphelyzetbe áll.
+        """
+        self.failures = 0
+        self.next_attempt = 0.0
 
 # --------------------------
 # Packet Tracer valós interfész osztály
 # --------------------------
-class PacketTracerInterface:
-    def __init__(self, host='127.0.0.1', port=5000):
+class PacketTracerInterface(DeviceRegistryMixin):
+    # Mellékhatás nélküli lekérdezések, amelyek hiba esetén automatikusan
+    # megismételhetők (a SET parancsokat nem ismételjük)
+    IDEMPOTENT_COMMANDS = frozenset({
+        "GET_DEVICES", "GET_DEVICE_CHANGES", "GET_STATE", "GET_STATES", "GET_SENSOR_VALUES",
+        "GET_SENSOR_CHANGES", "GET_HANDLES"
+    })
+    
+    def __init__(self, host='127.0.0.1', port=5000, length_prefixed=False,
+                 connect_timeout=5.0, request_timeout=2.0, discovery_timeout=30.0, retries=2,
+                 encoding="auto", pool_size=2):
+        """
+        Inicializálja a Packet Tracer interfészt.
+        A Packet Tracer Registration Serverhez kapcsolódik.
+        length_prefixed=True esetén hosszelőtagos keretezést használ.
+        connect_timeout a kapcsolódás, request_timeout egy kérés teljes
+        (az ismétléseket is magában foglaló) határideje másodpercben; a
+        nagy eszközlistát visszaadó felderítés discovery_timeout ideig
+        tarthat. A lekérdezéseket hiba esetén legfeljebb retries
+        alkalommal ismétli meg. encoding="auto" esetén kapcsolódáskor
+        egyezteti a bináris kódolást (BinaryProtocol), "json" esetén nem.
+        pool_size > 0 esetén az állapotbeállítások külön kapcsolatokon
+        (sávokon) mennek: pool_size normál sávon párhuzamosan és egy
+        elsőbbségi sávon, amelyet más forgalom nem foglal (0: minden
+        kérés a fő kapcsolaton).
+        """
+        self.host = host
+        self.port = port
+        self.length_prefixed = length_prefixed
+        # Kapcsolódáskor egyeztetett kódolás ("json" vagy BinaryProtocol.NAME)
+        self.negotiate = encoding == "auto"
+        self.encoding = "json"
+        self.connect_timeout = connect_timeout
+        self.request_timeout = request_timeout
+        self.discovery_timeout = discovery_timeout
+        self.retries = retries
+        self.socket = None
+        self.connection = None
+        # A connect() és close() hívás között a megszakadt kapcsolatot
+        # automatikusan újraépítjük, visszalépéssel
+        self.auto_reconnect = False
+        self.reconnect_backoff = Backoff()
+        # Egy kérés-válasz pár egyszerre, hogy a szálak ne olvassák egymás válaszát
+        self.lock = threading.RLock()
+        # Külön kapcsolat a gateway által küldött szenzoreseményekhez
+        self.subscription = None
+        # Állapotbeállító sávok (connect() nyitja meg): az elsőbbségi sáv,
+        # majd a normál sávok; mindegyik egy-egy saját kapcsolatú interfész
+        self.pool_size = pool_size
+        self.priority_lane = None
+        self.lanes = []
+        self._lane_executor = None
+        self.connected = False
+        self.device_registry = DeviceRegistry()
+        self.rejected_devices = set()
+        # Parancsidők, hibák és forgalom mérőszámai
+        self.metrics = Metrics()
+        log.info("interface_created", "Packet Tracer interfész inicializálva: {host}:{port}", host=host, port=port)
+    
+    def connect(self):
+        """Kapcsolódás a Packet Tracer Registration Serverhez"""
+        self.auto_reconnect = True
+        with self.lock:
+            connected = self._open_connection(self.connect_timeout)
+        if connected and self.pool_size and self.priority_lane is None:
+            self._open_lanes()
+        return connected
+    
+    def _open_lanes(self):
+        """
+        Az állapotbeállító sávok megnyitása. A sávok a fő interfész
+        nyilvántartását és mérőszámait használják, és csak JSON
+        parancsokat küldenek, ezért nem egyeztetnek kódolást.
+        """
+        lanes = []
+        for _ in range(self.pool_size + 1):
+            lane = PacketTracerInterface(self.host, self.port, self.length_prefixed, self.connect_timeout,
+                                         self.request_timeout, retries=0, encoding="json", pool_size=0)
+            lane.device_registry = self.device_registry
+            lane.rejected_devices = self.rejected_devices
+            lane.metrics = self.metrics
+            lane.connect()
+            lanes.append(lane)
+        self.priority_lane, self.lanes = lanes[0], lanes[1:]
+        self._lane_executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="pt-lane")
+    
+    def _open_connection(self, timeout):
+        """
+        Felépíti a kérés-válasz kapcsolatot legfeljebb timeout másodperc
+        alatt. Sikertelen kísérlet után a visszalépés dönti el, mikor
+        lehet újra próbálkozni.
+        """
+        try:
+            self.socket = socket.create_connection((self.host, self.port), timeout=timeout)
+            self.connection = FramedConnection(self.socket, self.length_prefixed, self.metrics)
+            if self.negotiate and not self._negotiate(time.monotonic() + timeout):
+                # A HELLO-ra nem válaszoló gateway-hez egyeztetés nélkül kapcsolódunk újra
+                self.socket.close()
+                self.socket = socket.create_connection((self.host, self.port), timeout=timeout)
+                self.connection = FramedConnection(self.socket, self.length_prefixed, self.metrics)
+            self.connected = True
+            self.reconnect_backoff.success()
+            log.info("connected", "Sikeres kapcsolódás a Packet Tracer-hez")
+            return True
+        except Exception as e:
+            self.socket = None
+            self.connection = None
+            self.connected = False
+            delay = self.reconnect_backoff.failure()
+            log.error("connect_failed", "Hiba a kapcsolódás során: {error} (újrapróbálás {delay:.2f} s múlva)",
+                      error=e, delay=delay)
+            return False
+    
+    def _negotiate(self, deadline):
+        """
+        A kódolás egyeztetése HELLO paranccsal. A bináris kódolást nem ismerő
+        gateway hibát válaszol, ekkor JSON marad. Ha a gateway egyáltalán nem
+        válaszol, hamissal tér vissza, és a további kapcsolatokon nem egyeztet.
+        """
+        command = {"command": "HELLO", "encodings": [BinaryProtocol.NAME, "json"]}
+        self.connection.send_frame(json.dumps(command).encode('utf-8'), deadline)
+        try:
+            response = self.connection.read_message(deadline=deadline)
+        except socket.timeout:
+            log.warning("hello_unanswered", "A gateway nem válaszolt a HELLO parancsra, JSON kódolás")
+            self.negotiate = False
+            self.encoding = "json"
+            return False
+        
+        try:
+            reply = json.loads(response)
+        except json.JSONDecodeError:
+            reply = None
+        # Új kapcsolaton a handle-öket újra lekérjük
+        self._device_handles = self._handle_ids = None
+        if isinstance(reply, dict) and reply.get("encoding") == BinaryProtocol.NAME:
+            self.encoding = BinaryProtocol.NAME
+            self.connection.decoder.length_prefixed = True
+        else:
+            self.encoding = "json"
+        log.info("encoding_negotiated", "Egyeztetett kódolás: {encoding}", encoding=self.encoding)
+        return True
+    
+    def _load_handles(self):
+        """
+        A bináris kódoláshoz használt eszköz handle-ök lekérése (GET_HANDLES).
+        """
+        command = {"command": "GET_HANDLES"}
+        response = self._request(command["command"], json.dumps(command).encode('utf-8'))
+        handles = json.loads(response)
+        self._device_handles = handles
+        self._handle_ids = {handle: device_id for device_id, handle in handles.items()}
+    
+    def _ensure_connected(self, timeout=None):
+        """
+        Igaz, ha van élő kapcsolat. Megszakadt kapcsolatnál újrakapcsolódik,
+        ha a visszalépési idő már letelt; különben azonnal hamissal tér vissza.
+        """
+        if self.connected:
+            return True
+        if not self.auto_reconnect or not self.reconnect_backoff.ready():
+            return False
+        with self.lock:
+            if self.connected:
+                return True
+            log.info("reconnecting", "Újrakapcsolódás a Packet Tracer-hez ({host}:{port})",
+                     host=self.host, port=self.port)
+            return self._open_connection(timeout or self.connect_timeout)
+    
+    def _drop_connection(self, error):
+        """
+        Lezárja a hibás (megszakadt vagy időtúllépett) kapcsolatot. Egy félbe
+        maradt válasz maradéka a pufferben lehet, ezért a kapcsolatot nem
+        használjuk tovább, hanem újat építünk.
+        """
+        log.warning("connection_lost", "A kapcsolat megszakadt a Packet Tracer-rel: {error}", error=error)
+        self.connected = False
+        self.connection = None
+        if self.socket is not None:
+            try:
+                self.socket.close()
+            except OSError:
+                pass
+            self.socket = None
+    
+    def discover_devices(self):
+        """
+        Felderíti az elérhető eszközöket a Packet Tracer szimulációban.
+        Valós Packet Tracer API hívásokat használ.
+        """
+        if not self._ensure_connected():
+            log.warning("not_connected", "Nincs kapcsolat a Packet Tracer-rel!")
+            return {}
+        
+        try:
+            # Az egyszerűség kedvéért egy GET_DEVICES parancsot küldünk
+            # A valós implementáció a Packet Tracer API-jától függ
+            # Feltételezzük, hogy a válasz végét két újsor jelzi
+            response = self._request("GET_DEVICES", b"GET_DEVICES", delimiter=b"\n\n",
+                                     timeout=self.discovery_timeout)
+            
+            # A válasz feldolgozása - illeszkednie kell a PT API formátumához
+            # Ez csak egy példa, módosítani kell a tényleges API alapján
+            # Soronként "eszközazonosító: {json}" - az azonosító maga is
+            # tartalmazhat kettőspontot (pl. IoT:Sensor:Temp:1), ezért a
+            # JSON objektum kezdeténél vágunk
+            devices = {}
+            for line in response.split("\n"):
+                start = line.find("{")
+                if start <= 0:
+                    continue
+                device_id = line[:start].strip().rstrip(":").strip()
+                try:
+                    devices[device_id] = json.loads(line[start:])
+                except json.JSONDecodeError:
+                    log.warning("invalid_response", "Hibás JSON válasz: {payload}", payload=line[start:])
+            
+            # Helyben, egy lépésben cseréljük, hogy a vezérlő hivatkozása
+            # érvényes maradjon, és a többi szál ne lásson üres nyilvántartást
+            self.device_registry.replace(devices)
+            self.registry_version = None
+            self._device_handles = self._handle_ids = None
+            log.info("devices_discovered", "{count} eszköz felderítve a Packet Tracer szimulációban",
+                     count=len(self.device_registry))
+            return self.device_registry
+            
+        except Exception as e:
+            log.error("discover_failed", "Hiba az eszközfelderítés során: {error}", error=e)
+            return {}
+    
+    def fetch_device_changes(self):
+        """
+        Növekményes felderítés: csak a legutóbbi ismert verzió óta
+        megváltozott eszközöket kéri le (GET_DEVICE_CHANGES). Ha a gateway
+        nem támogatja, teljes felderítést végez.
+        """
+        if not self._ensure_connected():
+            return False
+        
+        try:
+            command = {
+                "command": "GET_DEVICE_CHANGES",
+                "since": self.registry_version
+            }
+            response = self._request(command["command"], json.dumps(command).encode('utf-8'))
+            
+            try:
+                changes = json.loads(response)
+            except json.JSONDecodeError:
+                changes = None
+            
+            if not isinstance(changes, dict) or "changed" not in changes:
+                log.warning("incremental_unsupported",
+                            "A gateway nem támogatja a növekményes felderítést, teljes felderítés")
+                return bool(self.discover_devices())
+            
+            self._apply_device_changes(changes)
+            log.info("registry_reconciled",
+                     "Nyilvántartás egyeztetve: {changed} változott, {removed} eltávolított eszköz",
+                     changed=len(changes['changed']), removed=len(changes.get('removed', [])))
+            return True
+        except Exception as e:
+            log.error("reconcile_failed", "Hiba a nyilvántartás egyeztetése során: {error}", error=e)
+            return False
+    
+    def set_device_state(self, device_id, state):
+        """
+        Beállítja egy eszköz állapotát a szimulációban.
+        Valós Packet Tracer API hívásokat használ.
+        Sávok használatakor az eszköz normál sávján küldi.
+        """
+        if self.priority_lane is not None:
+            return self.set_device_states({device_id: state})[device_id]
+        if device_id not in self.device_registry or not self._ensure_connected():
+            return False
+        if self._state_matches(device_id, state):
+            # Az eszköz már ebben az állapotban van
+            return True
+        
+        try:
+            # Parancs összeállítása
+            command = {
+                "command": "SET_STATE",
+                "device_id": device_id,
+                "state": state
+            }
+            
+            # Parancs küldése és a válasz fogadása
+            response = self._request(command["command"], json.dumps(command).encode('utf-8'))
+            
+            # Válasz feldolgozása
+            if "OK" in response:
+                log.info("device_state_set", "Eszköz állapot beállítva: {device_id} - {state}",
+                         device_id=device_id, state=state)
+                
+                # Frissítsük a helyi nyilvántartást is
+                self._apply_state(device_id, state)
+                
+                return True
+            else:
+                log.warning("device_state_rejected", "Hiba az eszköz állapotának beállításakor: {response}",
+                            response=response)
+                self.rejected_devices.add(device_id)
+                return False
+                
+        except Exception as e:
+            log.error("set_state_failed", "Hiba az eszköz vezérlése során: {error}", error=e)
+            return False
+    
+    def set_device_states(self, states, priority=False):
+        """
+        Több eszköz állapotának beállítása. A states szótár
+        eszközazonosító -> állapot párokat tartalmaz. Visszaadja az
+        eszközönkénti eredményt (eszközazonosító -> bool).
+        Sávok használatakor priority=True esetén a kérés az elsőbbségi
+        sávon megy, így nem vár más kérésekre. Egyébként az eszközök
+        azonosítójuk szerint oszlanak el a normál sávok között, és a
+        sávonkénti SET_STATES kérések párhuzamosan futnak; egy eszköz
+        mindig ugyanazon a sávon megy, így parancsai nem előzik meg egymást.
+        """
+        if self.priority_lane is None:
+            return self._send_states(states)
+        if priority:
+            return self._send_on_lane(self.priority_lane, states)
+        
+        chunks = {}
+        for device_id, state in states.items():
+            chunks.setdefault(hash(device_id) % len(self.lanes), {})[device_id] = state
+        if len(chunks) <= 1:
+            return self._send_on_lane(self.lanes[next(iter(chunks), 0)], states)
+        results = {}
+        futures = [self._lane_executor.submit(self._send_on_lane, self.lanes[idx], chunk)
+                   for idx, chunk in chunks.items()]
+        for future in futures:
+            results.update(future.result())
+        return results
+    
+    def _send_on_lane(self, lane, states):
+        """
+        Állapotbeállítás egy sávon. Ha a sáv kapcsolata a kérés közben
+        szakadt meg (pl. a gateway újraindult, és a sáv csak most
+        veszi észre), a visszaigazolatlan állapotokat egyszer újraküldi
+        egy újraépített sávkapcsolaton; az abszolút állapotok újraküldése
+        biztonságos. Ha a sáv nem építhető fel, a fő kapcsolaton küld.
+        """
+        results = {}
+        for attempt in range(2):
+            if not lane._ensure_connected():
+                break
+            results.update(lane._send_states(states))
+            if lane.connected:
+                return results
+            states = {device_id: state for device_id, state in states.items() if not results.get(device_id)}
+            if not states:
+                return results
+            log.warning("lane_lost", "A parancssáv kapcsolata megszakadt, {count} állapot újraküldése",
+                        count=len(states))
+        results.update(self._send_states(states))
+        return results
+    
+    def _send_states(self, states):
+        """
+        Több eszköz állapotát állítja be egyetlen SET_STATES kéréssel.
+        Ha a gateway nem ismeri a kötegelt parancsot, eszközönként küldi.
+        """
+        results = {device_id: False for device_id in states}
+        if not self._ensure_connected():
+            return results
+        
+        # Csak a nyilvántartott, és a kért állapottól eltérő eszközöknek küldünk parancsot
+        states = {device_id: state for device_id, state in states.items()
+                  if device_id in self.device_registry}
+        for device_id in [device_id for device_id, state in states.items()
+                          if self._state_matches(device_id, state)]:
+            results[device_id] = True
+            del states[device_id]
+        if not states:
+            return results
+        
+        try:
+            # Parancs összeállítása
+            command = {
+                "command": "SET_STATES",
+                "states": states
+            }
+            
+            # Parancs küldése és a válasz fogadása
+            response = self._request(command["command"], json.dumps(command).encode('utf-8'))
+            
+            # Válasz feldolgozása - eszközönként "OK" vagy hibaüzenet
+            try:
+                replies = json.loads(response)
+            except json.JSONDecodeError:
+                replies = None
+            
+            if not isinstance(replies, dict):
+                # A gateway nem ismeri a kötegelt parancsot, egyenként küldjük
+                log.warning("invalid_response", "Hibás JSON válasz: {response}", response=response)
+                for device_id, state in states.items():
+                    results[device_id] = self.set_device_state(device_id, state)
+                return results
+            
+            for device_id, state in states.items():
+                reply = replies.get(device_id)
+                if reply is not None and "OK" in str(reply):
+                    self._apply_state(device_id, state)
+                    results[device_id] = True
+                    log.info("device_state_set", "Eszköz állapot beállítva: {device_id} - {state}",
+                             device_id=device_id, state=state)
+                else:
+                    log.warning("device_state_rejected",
+                                "Hiba az eszköz állapotának beállításakor: {device_id} - {reply}",
+                                device_id=device_id, reply=reply)
+                    self.rejected_devices.add(device_id)
+            
+            return results
+            
+        except Exception as e:
+            log.error("set_state_failed", "Hiba az eszközök vezérlése során: {error}", error=e)
+            return results
+    
+    def get_device_state(self, device_id):
+        """
+        Lekérdezi egy eszköz állapotát a szimulációból.
+        """
+        if device_id not in self.device_registry or not self._ensure_connected():
+            return None
+        
+        try:
+            # Parancs összeállítása
+            command = {
+                "command": "GET_STATE",
+                "device_id": device_id
+            }
+            
+            # Parancs küldése és a válasz fogadása
+            response = self._request(command["command"], json.dumps(command).encode('utf-8'))
+            
+            # Válasz feldolgozása
+            try:
+                state = json.loads(response)
+                # Frissítsük a helyi nyilvántartást
+                self.device_registry[device_id] = state
+                return state
+            except json.JSONDecodeError:
+                log.warning("invalid_response", "Hibás JSON válasz: {response}", response=response)
+                return self.device_registry[device_id]
+                
+        except Exception as e:
+            log.error("get_state_failed", "Hiba az eszköz állapotának lekérdezése során: {error}", error=e)
+            return self.device_registry[device_id]
+    
+    def get_device_states(self, device_ids):
+        """
+        Több eszköz állapotát kérdezi le egyetlen GET_STATES kéréssel.
+        Visszaadja az eszközazonosító -> állapot szótárt.
+        """
+        device_ids = [device_id for device_id in device_ids if device_id in self.device_registry]
+        if not device_ids or not self._ensure_connected():
+            return {device_id: self.device_registry[device_id] for device_id in device_ids}
+        
+        try:
+            # Parancs összeállítása
+            command = {
+                "command": "GET_STATES",
+                "device_ids": device_ids
+            }
+            
+            # Parancs küldése és a válasz fogadása
+            response = self._request(command["command"], json.dumps(command).encode('utf-8'))
+            
+            # Válasz feldolgozása
+            try:
+                states = json.loads(response)
+            except json.JSONDecodeError:
+                states = None
+            
+            if not isinstance(states, dict):
+                # A gateway nem ismeri a kötegelt parancsot, egyenként kérdezzük le
+                log.warning("invalid_response", "Hibás JSON válasz: {response}", response=response)
+                return {device_id: self.get_device_state(device_id) for device_id in device_ids}
+            
+            # Frissítsük a helyi nyilvántartást
+            for device_id in device_ids:
+                state = states.get(device_id)
+                if isinstance(state, dict):
+                    self.device_registry[device_id] = state
+            
+            return {device_id: self.device_registry[device_id] for device_id in device_ids}
+            
+        except Exception as e:
+            log.error("get_state_failed", "Hiba az eszközök állapotának lekérdezése során: {error}", error=e)
+            return {device_id: self.device_registry[device_id] for device_id in device_ids}
+    
+    def _request(self, name, payload, delimiter=b"\n", timeout=None, raw=False, idempotent=None):
+        """
+        Elküld egy parancsot, és beolvassa a teljes, keretezett választ.
+        Hosszelőtagos módban a határolót figyelmen kívül hagyja. A válaszidőt
+        a parancs neve (name) szerint rögzíti a mérőszámok között.
+        
+        A kérésnek határideje van (timeout, alapértelmezés szerint
+        request_timeout), amely az újrakapcsolódást és az ismétléseket is
+        magában foglalja, így a hívó legfeljebb ennyi ideig várakozik.
+        Megszakadt vagy időtúllépett kapcsolatnál a kapcsolatot eldobja;
+        a mellékhatás nélküli lekérdezéseket új kapcsolaton megismétli.
+        raw=True esetén a választ bájtként adja vissza (bináris keret).
+        """
+        deadline = time.monotonic() + (timeout or self.request_timeout)
+        if idempotent is None:
+            idempotent = name in self.IDEMPOTENT_COMMANDS
+        attempts = self.retries + 1 if idempotent else 1
+        error = None
+        with self.lock:
+            for attempt in range(attempts):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                if not self._ensure_connected(min(self.connect_timeout, remaining)):
+                    break
+                if attempt:
+                    log.info("request_retry", "{command} ismétlése ({attempt}. próbálkozás)",
+                             command=name, attempt=attempt + 1)
+                
+                start = time.perf_counter()
+                try:
+                    self.connection.send_frame(payload, deadline)
+                    if raw:
+                        response = self.connection.read_frame(delimiter, deadline)
+                    else:
+                        response = self.connection.read_message(delimiter, deadline)
+                except OSError as e:
+                    # socket.timeout és ConnectionError is OSError
+                    self.metrics.observe_command(name, time.perf_counter() - start, error=True)
+                    self._drop_connection(e)
+                    error = e
+                    continue
+                self.metrics.observe_command(name, time.perf_counter() - start)
+                return response
+        
+        if error is None:
+            error = ConnectionError("Nincs kapcsolat a Packet Tracer-rel")
+        raise error
+    
+    def update_sensor_values(self, device_ids=None):
+        """
+        Frissíti a szenzorok értékeit a szimulációban.
+        Valós Packet Tracer API hívásokat használ.
+        device_ids megadásával csak a felsorolt szenzorokat kérdezi le.
+        """
+        if not self._ensure_connected():
+            return {}
+        if self.encoding == BinaryProtocol.NAME:
+            return self._update_sensor_values_binary(device_ids)
+        
+        try:
+            # Parancs összeállítása
+            command = {
+                "command": "GET_SENSOR_VALUES"
+            }
+            if device_ids is not None:
+                command["device_ids"] = list(device_ids)
+            
+            # Parancs küldése és a válasz fogadása
+            response = self._request(command["command"], json.dumps(command).encode('utf-8'), delimiter=b"\n\n")
+            
+            # Válasz feldolgozása
+            try:
+                sensor_values = json.loads(response)
+                # Frissítsük a helyi nyilvántartást
+                self._apply_sensor_values(sensor_values)
+                
+                return self.device_registry
+            except json.JSONDecodeError:
+                log.warning("invalid_response", "Hibás JSON válasz: {response}", response=response)
+                return self.device_registry
+                
+        except Exception as e:
+            log.error("sensor_update_failed", "Hiba a szenzorértékek frissítése során: {error}", error=e)
+            return self.device_registry
+    
+    def _update_sensor_values_binary(self, device_ids=None):
+        """
+        Szenzorértékek lekérdezése bináris kódolással. A kérés a felépült
+        kapcsolat handle-eire hivatkozik, ezért új kapcsolaton nem
+        ismételjük meg; a következő ütem úgyis újra lekérdez.
+        """
+        try:
+            if self._handle_ids is None:
+                self._load_handles()
+            device_handles, handle_ids = self._device_handles, self._handle_ids
+            handles = None
+            if device_ids is not None:
+                handles = [device_handles[device_id] for device_id in device_ids if device_id in device_handles]
+            
+            frame = self._request("GET_SENSOR_VALUES", BinaryProtocol.encode_sensor_request(handles),
+                                  raw=True, idempotent=False)
+            if frame[:1] != bytes((BinaryProtocol.SENSOR_VALUES,)):
+                log.warning("invalid_response", "Hibás bináris válasz: {response!r}", response=frame[:64])
+                return self.device_registry
+            
+            _, sensor_values = BinaryProtocol.decode_sensor_values(frame, handle_ids)
+            self._apply_sensor_values(sensor_values)
+        except Exception as e:
+            log.error("sensor_update_failed", "Hiba a szenzorértékek frissítése során: {error}", error=e)
+        return self.device_registry
+    
+    def update_sensor_changes(self, device_ids=None):
+        """
+        Növekményes szenzorfrissítés (GET_SENSOR_CHANGES): csak a legutóbb
+        látott sorszám óta megváltozott értékeket kéri le, így a forgalom és
+        a feldolgozás a változások számával arányos. Az első kérésre, vagy
+        ha a gateway közben újraindult, a gateway a teljes listát küldi.
+        device_ids megadásakor csak ezeknek a szenzoroknak a változásait
+        kéri (a lekérdezési ütemező szerint esedékeseket).
+        Visszaadja a megváltozott eszközök azonosítóit; None-t, ha a gateway
+        nem támogatja (ilyenkor az update_sensor_values használandó).
+        """
+        if not self.sensor_changes_supported:
+            return None
+        if not self._ensure_connected():
+            return []
+        
+        try:
+            command = {
+                "command": "GET_SENSOR_CHANGES",
+                "since": self._sensor_changes_since(device_ids),
+                "epoch": self.sensor_epoch
+            }
+            if device_ids is not None:
+                command["device_ids"] = list(device_ids)
+            response = self._request(command["command"], json.dumps(command).encode('utf-8'))
+            try:
+                reply = json.loads(response)
+            except json.JSONDecodeError:
+                reply = None
+            return self._apply_sensor_changes(reply, device_ids)
+        except Exception as e:
+            log.error("sensor_update_failed", "Hiba a szenzorértékek frissítése során: {error}", error=e)
+            return []
+    
+    def subscribe(self, device_ids=None):
+        """
+        Feliratkozik a szenzorok változásaira (SUBSCRIBE). Az eseményeket a
+        gateway egy külön kapcsolaton küldi, így azok nem keveredhetnek a
+        kérések válaszaival. device_ids=None esetén minden szenzorra.
+        Visszaadja, hogy a feliratkozás sikeres volt-e.
+        """
+        if not self._ensure_connected():
+            return False
+        
+        self.unsubscribe()
+        try:
+            sock = socket.create_connection((self.host, self.port), timeout=self.connect_timeout)
+            # A tétlen eseménykapcsolaton a félig nyitott kapcsolatot a TCP keepalive fedi fel
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            connection = FramedConnection(sock, self.length_prefixed, self.metrics)
+            
+            command = {"command": "SUBSCRIBE"}
+            if device_ids is not None:
+                command["device_ids"] = list(device_ids)
+            deadline = time.monotonic() + self.request_timeout
+            connection.send_frame(json.dumps(command).encode('utf-8'), deadline)
+            response = connection.read_message(deadline=deadline)
+            
+            if "OK" not in response:
+                log.warning("subscribe_unsupported", "A gateway nem támogatja a feliratkozást: {response}",
+                            response=response)
+                sock.close()
+                return False
+            
+            self.subscription = connection
+            log.info("subscribed", "Feliratkozás a szenzoreseményekre sikeres")
+            return True
+        except Exception as e:
+            log.error("subscribe_failed", "Hiba a feliratkozás során: {error}", error=e)
+            return False
+    
+    def wait_for_events(self, timeout):
+        """
+        Legfeljebb timeout másodpercig vár a szenzoreseményekre, és átvezeti
+        őket a helyi nyilvántartásba. Visszaadja a megváltozott eszközök
+        listáját, vagy None-t, ha a feliratkozás megszakadt.
+        """
+        connection = self.subscription
+        if connection is None:
+            return None
+        
+        changed = []
+        try:
+            connection.socket.settimeout(timeout)
+            messages = [connection.read_message()]
+            # A már beérkezett további eseményeket is feldolgozzuk
+            messages.extend(frame.decode('utf-8') for frame in connection.decoder.frames())
+        except socket.timeout:
+            return changed
+        except Exception as e:
+            log.error("event_receive_failed", "Hiba a szenzoresemények fogadása során: {error}", error=e)
+            self.unsubscribe()
+            return None
+        
+        for message in messages:
+            if not message.strip():
+                continue
+            try:
+                changed.extend(self._handle_event(json.loads(message)))
+            except json.JSONDecodeError:
+                log.warning("invalid_event", "Hibás JSON esemény: {payload}", payload=message)
+        return changed
+    
+    def unsubscribe(self):
+        """
+        Lezárja a feliratkozási kapcsolatot.
+        """
+        if self.subscription is not None:
+            try:
+                self.subscription.socket.close()
+            except Exception as e:
+                log.warning("unsubscribe_failed", "Hiba a feliratkozás lezárása során: {error}", error=e)
+            self.subscription = None
+    
+    def close(self):
+        """Bezárja a kapcsolatot"""
+        self.auto_reconnect = False
+        self.unsubscribe()
+        if self._lane_executor is not None:
+            self._lane_executor.shutdown()
+            self._lane_executor = None
+        if self.priority_lane is not None:
+            for lane in [self.priority_lane] + self.lanes:
+                lane.close()
+            self.priority_lane, self.lanes = None, []
+        if self.history is not None:
+            self.history.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self.connected and self.socket:
+            try:
+                self.socket.close()
+            except Exception as e:
+                log.warning("close_failed", "Hiba a kapcsolat lezárása során: {error}", error=e)
+            finally:
+                self.connected = False
+                log.info("disconnected", "Kapcsolat lezárva a Packet Tracer-rel")
+# --------------------------
+# Aszinkron Packet Tracer interfész
+# --------------------------
+class AsyncPacketTracerInterface(DeviceRegistryMixin):
+    """
+    asyncio alapú Packet Tracer interfész. Minden parancs egyedi
+    request_id azonosítót kap, így egy kapcsolaton egyszerre több kérés
+    is úton lehet. A válaszokat egy háttérben futó olvasó task rendeli
+    hozzá a kérésekhez a request_id alapján (a gateway visszaküldi).
+    """
+    # Egy válaszsor maximális mérete (nagy eszközlistákhoz)
+    STREAM_LIMIT = 16 * 1024 * 1024
+    IDEMPOTENT_COMMANDS = PacketTracerInterface.IDEMPOTENT_COMMANDS
+    
+    def __init__(self, host='127.0.0.1', port=5000,
+                 connect_timeout=5.0, request_timeout=2.0, discovery_timeout=30.0, retries=2,
+                 encoding="auto", pool_size=2):
         """
-        Inicializálja a Packet Tracer interfészt.
-        A Packet Tracer Registration Serverhez kapcsolódik.
+        Inicializálja az aszinkron Packet Tracer interfészt. Az időkorlátok,
+        az ismétlések, a kódolás és az állapotbeállító sávok (pool_size)
+        jelentése a szinkron interfészével egyezik.
         """
         self.host = host
         self.port = port
-        self.socket = None
+        self.negotiate = encoding == "auto"
+        self.encoding = "json"
+        self.connect_timeout = connect_timeout
+        self.request_timeout = request_timeout
+        self.discovery_timeout = discovery_timeout
+        self.retries = retries
+        self.reader = None
+        self.writer = None
+        self.connected = False
+        self.auto_reconnect = False
+        self.reconnect_backoff = Backoff()
+        self._connect_lock = asyncio.Lock()
+        # Az utolsó beérkezett üzenet ideje (loop.time()): ha egy kérés
+        # időtúllépésekor azóta semmi nem jött, a kapcsolatot halottnak tekintjük
+        self._last_receive = 0.0
+        self.device_registry = DeviceRegistry()
+        self.rejected_devices = set()
+        self._request_ids = itertools.count(1)
+        self._pending = {}
+        self._reader_task = None
+        # A gateway által küldött szenzoresemények (megváltozott eszközök listái)
+        self.events = asyncio.Queue()
+        # Állapotbeállító sávok (connect() nyitja meg), mint a szinkron interfésznél
+        self.pool_size = pool_size
+        self.priority_lane = None
+        self.lanes = []
+        # Parancsidők, hibák és forgalom mérőszámai
+        self.metrics = Metrics()
+        log.info("interface_created", "Aszinkron Packet Tracer interfész inicializálva: {host}:{port}",
+                 host=host, port=port)
+    
+    async def connect(self):
+        """Kapcsolódás a Packet Tracer Registration Serverhez"""
+        self.auto_reconnect = True
+        async with self._connect_lock:
+            connected = await self._open_connection(self.connect_timeout)
+        if connected and self.pool_size and self.priority_lane is None:
+            await self._open_lanes()
+        return connected
+    
+    async def _open_lanes(self):
+        """
+        Az állapotbeállító sávok megnyitása (közös nyilvántartással és
+        mérőszámokkal, kódolásegyeztetés nélkül).
+        """
+        lanes = []
+        for _ in range(self.pool_size + 1):
+            lane = AsyncPacketTracerInterface(self.host, self.port, self.connect_timeout, self.request_timeout,
+                                              retries=0, encoding="json", pool_size=0)
+            lane.device_registry = self.device_registry
+            lane.rejected_devices = self.rejected_devices
+            lane.metrics = self.metrics
+            lanes.append(lane)
+        await asyncio.gather(*(lane.connect() for lane in lanes))
+        self.priority_lane, self.lanes = lanes[0], lanes[1:]
+    
+    async def _open_connection(self, timeout):
+        """
+        Felépíti a kapcsolatot legfeljebb timeout másodperc alatt, és
+        elindítja az olvasó taskot.
+        """
+        try:
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.host, self.port, limit=self.STREAM_LIMIT), timeout)
+            if self.negotiate and not await self._negotiate(timeout):
+                # A HELLO-ra nem válaszoló gateway-hez egyeztetés nélkül kapcsolódunk újra
+                self.writer.close()
+                self.reader, self.writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.host, self.port, limit=self.STREAM_LIMIT), timeout)
+            self.connected = True
+            self._last_receive = asyncio.get_running_loop().time()
+            self._reader_task = asyncio.create_task(self._read_loop(self.reader))
+            self.reconnect_backoff.success()
+            log.info("connected", "Sikeres kapcsolódás a Packet Tracer-hez")
+            return True
+        except Exception as e:
+            self.connected = False
+            delay = self.reconnect_backoff.failure()
+            log.error("connect_failed", "Hiba a kapcsolódás során: {error} (újrapróbálás {delay:.2f} s múlva)",
+                      error=e, delay=delay)
+            return False
+    
+    async def _negotiate(self, timeout):
+        """
+        A kódolás egyeztetése HELLO paranccsal, még az olvasó task indítása
+        előtt. A bináris kódolást nem ismerő gateway hibát válaszol, ekkor
+        JSON marad. Ha a gateway nem válaszol, hamissal tér vissza.
+        """
+        command = {"command": "HELLO", "request_id": 0, "encodings": [BinaryProtocol.NAME, "json"]}
+        payload = json.dumps(command).encode('utf-8') + b"\n"
+        self.writer.write(payload)
+        self.metrics.bytes_sent += len(payload)
+        try:
+            line = await asyncio.wait_for(self.reader.readline(), timeout)
+        except asyncio.TimeoutError:
+            log.warning("hello_unanswered", "A gateway nem válaszolt a HELLO parancsra, JSON kódolás")
+            self.negotiate = False
+            self.encoding = "json"
+            return False
+        self.metrics.bytes_received += len(line)
+        
+        try:
+            reply = json.loads(line)
+        except json.JSONDecodeError:
+            reply = None
+        result = reply.get("result") if isinstance(reply, dict) else None
+        self._device_handles = self._handle_ids = None
+        if isinstance(result, dict) and result.get("encoding") == BinaryProtocol.NAME:
+            self.encoding = BinaryProtocol.NAME
+        else:
+            self.encoding = "json"
+        log.info("encoding_negotiated", "Egyeztetett kódolás: {encoding}", encoding=self.encoding)
+        return True
+    
+    async def _load_handles(self):
+        """
+        A bináris kódoláshoz használt eszköz handle-ök lekérése (GET_HANDLES).
+        """
+        handles = await self._request("GET_HANDLES")
+        self._device_handles = handles
+        self._handle_ids = {handle: device_id for device_id, handle in handles.items()}
+    
+    async def _ensure_connected(self, timeout=None):
+        """
+        Igaz, ha van élő kapcsolat. Megszakadt kapcsolatnál újrakapcsolódik,
+        ha a visszalépési idő már letelt; különben azonnal hamissal tér vissza.
+        """
+        if self.connected:
+            return True
+        if not self.auto_reconnect or not self.reconnect_backoff.ready():
+            return False
+        async with self._connect_lock:
+            if self.connected:
+                return True
+            log.info("reconnecting", "Újrakapcsolódás a Packet Tracer-hez ({host}:{port})",
+                     host=self.host, port=self.port)
+            return await self._open_connection(timeout or self.connect_timeout)
+    
+    def _drop_connection(self, error):
+        """
+        Lezárja a halottnak tekintett kapcsolatot. Az olvasó task a
+        lezárás után kilép, és hibával zárja a még várakozó kéréseket.
+        """
+        log.warning("connection_lost", "A kapcsolat megszakadt a Packet Tracer-rel: {error}", error=error)
         self.connected = False
-        self.device_registry = {}
-        print(f"Packet Tracer interfész inicializálva: {host}:{port}")
+        if self.writer is not None:
+            self.writer.close()
+    
+    async def _read_loop(self, reader):
+        """
+        A válaszok olvasása és továbbítása a várakozó kérésekhez.
+        """
+        binary = self.encoding == BinaryProtocol.NAME
+        try:
+            while True:
+                frame = await self._read_frame(reader, binary)
+                if not frame:
+                    break
+                self._last_receive = asyncio.get_running_loop().time()
+                if binary and frame[0] == BinaryProtocol.SENSOR_VALUES:
+                    request_id, values = BinaryProtocol.decode_sensor_values(frame, self._handle_ids or {})
+                    future = self._pending.pop(request_id, None)
+                    if future is not None and not future.done():
+                        future.set_result(values)
+                    continue
+                if not frame.strip():
+                    continue
+                
+                try:
+                    message = json.loads(frame)
+                except json.JSONDecodeError:
+                    log.warning("invalid_response", "Hibás JSON válasz: {frame!r}", frame=frame)
+                    continue
+                if not isinstance(message, dict):
+                    log.warning("invalid_response", "A válasz nem JSON objektum: {frame!r}", frame=frame)
+                    continue
+                
+                if "event" in message and "request_id" not in message:
+                    changed = self._handle_event(message)
+                    if changed:
+                        self.events.put_nowait(changed)
+                    continue
+                
+                future = self._pending.pop(message.get("request_id"), None)
+                if future is not None and not future.done():
+                    future.set_result(message.get("result"))
+        except Exception as e:
+            log.error("read_loop_failed", "Hiba a válaszok olvasása során: {error}", error=e)
+        finally:
+            # Egy már lecserélt kapcsolat olvasója nem érinti az újat
+            if self.reader is reader:
+                self.connected = False
+                # A még várakozó kérések hibával zárulnak
+                for future in self._pending.values():
+                    if not future.done():
+                        future.set_exception(ConnectionError("A kapcsolat megszakadt"))
+                self._pending.clear()
+    
+    async def _read_frame(self, reader, binary):
+        """
+        A következő keret olvasása: bináris kódolásnál hosszelőtagos keret,
+        egyébként egy sor. A kapcsolat lezárulásakor üres bájtsort ad.
+        """
+        if not binary:
+            line = await reader.readline()
+            self.metrics.bytes_received += len(line)
+            return line
+        try:
+            header = await reader.readexactly(FrameDecoder.LENGTH_PREFIX.size)
+            frame = await reader.readexactly(FrameDecoder.LENGTH_PREFIX.unpack(header)[0])
+        except asyncio.IncompleteReadError:
+            return b""
+        self.metrics.bytes_received += len(header) + len(frame)
+        return frame
+    
+    def _encode_request(self, command, request_id, fields):
+        """
+        Egy kérés kódolása és keretezése az egyeztetett kódolás szerint. A
+        szenzorérték-lekérdezés bináris, ha a handle-ök már ismertek.
+        """
+        if self.encoding != BinaryProtocol.NAME:
+            return json.dumps(dict(fields, command=command, request_id=request_id)).encode('utf-8') + b"\n"
+        
+        if command == "GET_SENSOR_VALUES" and self._device_handles is not None:
+            device_ids = fields.get("device_ids")
+            handles = None
+            if device_ids is not None:
+                handles = [self._device_handles[device_id] for device_id in device_ids
+                           if device_id in self._device_handles]
+            payload = BinaryProtocol.encode_sensor_request(handles, request_id)
+        else:
+            payload = json.dumps(dict(fields, command=command, request_id=request_id)).encode('utf-8')
+        return FrameDecoder.LENGTH_PREFIX.pack(len(payload)) + payload
+    
+    async def _request(self, command, *, timeout=None, **fields):
+        """
+        Elküld egy parancsot request_id azonosítóval, és megvárja a hozzá
+        tartozó választ. Más kérések közben szabadon futhatnak.
+        
+        A kérés határideje (timeout, alapértelmezés szerint request_timeout)
+        az újrakapcsolódást és az ismétléseket is magában foglalja. A késve
+        érkező választ az olvasó task eldobja; ha a határidő alatt semmilyen
+        üzenet nem jött, a kapcsolatot halottnak tekintjük és újraépítjük.
+        A mellékhatás nélküli lekérdezéseket hiba esetén megismétli.
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (timeout or self.request_timeout)
+        attempts = self.retries + 1 if command in self.IDEMPOTENT_COMMANDS else 1
+        error = None
+        for attempt in range(attempts):
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            if not await self._ensure_connected(min(self.connect_timeout, remaining)):
+                break
+            if attempt:
+                log.info("request_retry", "{command} ismétlése ({attempt}. próbálkozás)",
+                         command=command, attempt=attempt + 1)
+            
+            request_id = next(self._request_ids)
+            future = loop.create_future()
+            self._pending[request_id] = future
+            
+            payload = self._encode_request(command, request_id, fields)
+            sent_at = loop.time()
+            start = time.perf_counter()
+            try:
+                self.writer.write(payload)
+                self.metrics.bytes_sent += len(payload)
+                await asyncio.wait_for(self.writer.drain(), deadline - loop.time())
+                result = await asyncio.wait_for(future, deadline - loop.time())
+            except asyncio.TimeoutError:
+                error = asyncio.TimeoutError("A kérés határideje lejárt")
+            except OSError as e:
+                error = e
+            else:
+                self.metrics.observe_command(command, time.perf_counter() - start)
+                return result
+            finally:
+                self._pending.pop(request_id, None)
+            
+            self.metrics.observe_command(command, time.perf_counter() - start, error=True)
+            if self.connected and self._last_receive < sent_at:
+                self._drop_connection(error)
+        
+        if error is None:
+            error = ConnectionError("Nincs kapcsolat a Packet Tracer-rel")
+        raise error
+    
+    async def discover_devices(self):
+        """
+        Felderíti az elérhető eszközöket a Packet Tracer szimulációban.
+        """
+        if not await self._ensure_connected():
+            log.warning("not_connected", "Nincs kapcsolat a Packet Tracer-rel!")
+            return {}
+        
+        try:
+            devices = await self._request("GET_DEVICES", timeout=self.discovery_timeout)
+            if not isinstance(devices, dict):
+                log.warning("invalid_response", "Hibás válasz az eszközfelderítés során: {devices}",
+                            devices=devices)
+                return {}
+            
+            self.device_registry.replace(devices)
+            self.registry_version = None
+            self._device_handles = self._handle_ids = None
+            log.info("devices_discovered", "{count} eszköz felderítve a Packet Tracer szimulációban",
+                     count=len(self.device_registry))
+            return self.device_registry
+        except Exception as e:
+            log.error("discover_failed", "Hiba az eszközfelderítés során: {error}", error=e)
+            return {}
+    
+    async def fetch_device_changes(self):
+        """
+        Növekményes felderítés a legutóbbi ismert verzió óta; ha a gateway
+        nem támogatja, teljes felderítést végez.
+        """
+        if not await self._ensure_connected():
+            return False
+        
+        try:
+            changes = await self._request("GET_DEVICE_CHANGES", since=self.registry_version)
+            if not isinstance(changes, dict) or "changed" not in changes:
+                log.warning("incremental_unsupported",
+                            "A gateway nem támogatja a növekményes felderítést, teljes felderítés")
+                return bool(await self.discover_devices())
+            
+            self._apply_device_changes(changes)
+            log.info("registry_reconciled",
+                     "Nyilvántartás egyeztetve: {changed} változott, {removed} eltávolított eszköz",
+                     changed=len(changes['changed']), removed=len(changes.get('removed', [])))
+            return True
+        except Exception as e:
+            log.error("reconcile_failed", "Hiba a nyilvántartás egyeztetése során: {error}", error=e)
+            return False
+    
+    async def set_device_state(self, device_id, state):
+        """
+        Beállítja egy eszköz állapotát a szimulációban.
+        Sávok használatakor az eszköz normál sávján küldi.
+        """
+        if self.priority_lane is not None:
+            return (await self.set_device_states({device_id: state}))[device_id]
+        if device_id not in self.device_registry or not await self._ensure_connected():
+            return False
+        if self._state_matches(device_id, state):
+            return True
+        
+        try:
+            response = await self._request("SET_STATE", device_id=device_id, state=state)
+            if "OK" in str(response):
+                log.info("device_state_set", "Eszköz állapot beállítva: {device_id} - {state}",
+                         device_id=device_id, state=state)
+                self._apply_state(device_id, state)
+                return True
+            log.warning("device_state_rejected", "Hiba az eszköz állapotának beállításakor: {response}",
+                        response=response)
+            self.rejected_devices.add(device_id)
+            return False
+        except Exception as e:
+            log.error("set_state_failed", "Hiba az eszköz vezérlése során: {error}", error=e)
+            return False
+    
+    async def set_device_states(self, states, priority=False):
+        """
+        Több eszköz állapotának beállítása. Visszaadja az eszközönkénti
+        eredményt (eszközazonosító -> bool). Sávok használatakor
+        priority=True esetén az elsőbbségi sávon, egyébként a normál
+        sávok között eszközönként elosztva, párhuzamosan küldi.
+        """
+        if self.priority_lane is None:
+            return await self._send_states(states)
+        if priority:
+            return await self._send_on_lane(self.priority_lane, states)
+        
+        chunks = {}
+        for device_id, state in states.items():
+            chunks.setdefault(hash(device_id) % len(self.lanes), {})[device_id] = state
+        results = {}
+        for chunk_results in await asyncio.gather(
+                *(self._send_on_lane(self.lanes[idx], chunk) for idx, chunk in chunks.items())):
+            results.update(chunk_results)
+        return results
+    
+    async def _send_on_lane(self, lane, states):
+        """
+        Állapotbeállítás egy sávon, a szinkron interfészhez hasonlóan: a
+        kérés közben megszakadt sávon a visszaigazolatlan állapotokat
+        egyszer újraküldi, a fel nem építhető sáv helyett a fő kapcsolaton küld.
+        """
+        results = {}
+        for attempt in range(2):
+            if not await lane._ensure_connected():
+                break
+            results.update(await lane._send_states(states))
+            if lane.connected:
+                return results
+            states = {device_id: state for device_id, state in states.items() if not results.get(device_id)}
+            if not states:
+                return results
+            log.warning("lane_lost", "A parancssáv kapcsolata megszakadt, {count} állapot újraküldése",
+                        count=len(states))
+        results.update(await self._send_states(states))
+        return results
+    
+    async def _send_states(self, states):
+        """
+        Több eszköz állapotát állítja be egyetlen SET_STATES kéréssel.
+        """
+        results = {device_id: False for device_id in states}
+        if not await self._ensure_connected():
+            return results
+        
+        states = {device_id: state for device_id, state in states.items()
+                  if device_id in self.device_registry}
+        for device_id in [device_id for device_id, state in states.items()
+                          if self._state_matches(device_id, state)]:
+            results[device_id] = True
+            del states[device_id]
+        if not states:
+            return results
+        
+        try:
+            replies = await self._request("SET_STATES", states=states)
+            if not isinstance(replies, dict):
+                log.warning("invalid_response", "Hibás válasz: {replies}", replies=replies)
+                return results
+            
+            for device_id, state in states.items():
+                reply = replies.get(device_id)
+                if reply is not None and "OK" in str(reply):
+                    self._apply_state(device_id, state)
+                    results[device_id] = True
+                    log.info("device_state_set", "Eszköz állapot beállítva: {device_id} - {state}",
+                             device_id=device_id, state=state)
+                else:
+                    log.warning("device_state_rejected",
+                                "Hiba az eszköz állapotának beállításakor: {device_id} - {reply}",
+                                device_id=device_id, reply=reply)
+                    self.rejected_devices.add(device_id)
+            return results
+        except Exception as e:
+            log.error("set_state_failed", "Hiba az eszközök vezérlése során: {error}", error=e)
+            return results
+    
+    async def get_device_state(self, device_id):
+        """
+        Lekérdezi egy eszköz állapotát a szimulációból.
+        """
+        if device_id not in self.device_registry or not await self._ensure_connected():
+            return None
+        
+        try:
+            state = await self._request("GET_STATE", device_id=device_id)
+            if isinstance(state, dict):
+                self.device_registry[device_id] = state
+            return self.device_registry[device_id]
+        except Exception as e:
+            log.error("get_state_failed", "Hiba az eszköz állapotának lekérdezése során: {error}", error=e)
+            return self.device_registry[device_id]
+    
+    async def get_device_states(self, device_ids):
+        """
+        Több eszköz állapotát kérdezi le egyetlen GET_STATES kéréssel.
+        """
+        device_ids = [device_id for device_id in device_ids if device_id in self.device_registry]
+        if device_ids and await self._ensure_connected():
+            try:
+                states = await self._request("GET_STATES", device_ids=device_ids)
+                if isinstance(states, dict):
+                    for device_id in device_ids:
+                        state = states.get(device_id)
+                        if isinstance(state, dict):
+                            self.device_registry[device_id] = state
+            except Exception as e:
+                log.error("get_state_failed", "Hiba az eszközök állapotának lekérdezése során: {error}", error=e)
+        return {device_id: self.device_registry[device_id] for device_id in device_ids}
     
-    def connect(self):
-        """Kapcsolódás a Packet Tracer Registration Serverhez"""
+    async def update_sensor_values(self, device_ids=None):
+        """
+        Frissíti a szenzorok értékeit a szimulációban.
+        device_ids megadásával csak a felsorolt szenzorokat kérdezi le.
+        """
+        if not await self._ensure_connected():
+            return {}
+        
+        fields = {}
+        if device_ids is not None:
+            fields["device_ids"] = list(device_ids)
         try:
-            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            self.socket.connect((self.host, self.port))
-            self.connected = True
-            print("Sikeres kapcsolódás a Packet Tracer-hez")
-            return True
+            if self.encoding == BinaryProtocol.NAME and self._handle_ids is None:
+                await self._load_handles()
+            sensor_values = await self._request("GET_SENSOR_VALUES", **fields)
+            if isinstance(sensor_values, dict):
+                self._apply_sensor_values(sensor_values)
+            else:
+                log.warning("invalid_response", "Hibás válasz: {sensor_values}", sensor_values=sensor_values)
         except Exception as e:
-            print(f"Hiba a kapcsolódás során: {e}")
-            self.connected = False
-            return False
+            log.error("sensor_update_failed", "Hiba a szenzorértékek frissítése során: {error}", error=e)
+        return self.device_registry
     
-    def discover_devices(self):
+    async def update_sensor_changes(self, device_ids=None):
         """
-        Felderíti az elérhető eszközöket a Packet Tracer szimulációban.
-        Valós Packet Tracer API hívásokat használ.
+        Növekményes szenzorfrissítés a legutóbb látott sorszám óta (lásd
+        PacketTracerInterface.update_sensor_changes).
         """
-        if not self.connected:
-            print("Nincs kapcsolat a Packet Tracer-rel!")
-            return {}
+        if not self.sensor_changes_supported:
+            return None
+        if not await self._ensure_connected():
+            return []
         
         try:
-            # Az egyszerűség kedvéért egy GET_DEVICES parancsot küldünk
-            # A valós implementáció a Packet Tracer API-jától függ
-            self.socket.sendall(b"GET_DEVICES\n")
-            
-            # Válasz fogadása
-            data = b""
-            while True:
-                chunk = self.socket.recv(4096)
-                if not chunk:
-                    break
-                data += chunk
-                if b"\n\n" in data:  # Feltételezzük, hogy a válasz végét két újsor jelzi
-                    break
-            
-            response = data.decode('utf-8')
-            
-            # A válasz feldolgozása - illeszkednie kell a PT API formátumához
-            # Ez csak egy példa, módosítani kell a tényleges API alapján
-            devices = {}
-            lines = response.strip().split("\n")
-            for line in lines:
-                if ":" in line:
-                    parts = line.split(":", 1)
-                    if len(parts) == 2:
-                        device_id = parts[0].strip()
-                        try:
-                            device_info = json.loads(parts[1])
-                            devices[device_id] = device_info
-                        except json.JSONDecodeError:
-                            print(f"Hibás JSON válasz: {parts[1]}")
-            
-            self.device_registry = devices
-            print(f"{len(self.device_registry)} eszköz felderítve a Packet Tracer szimulációban")
-            return self.device_registry
-            
+            params = {"since": self._sensor_changes_since(device_ids), "epoch": self.sensor_epoch}
+            if device_ids is not None:
+                params["device_ids"] = list(device_ids)
+            reply = await self._request("GET_SENSOR_CHANGES", **params)
+            return self._apply_sensor_changes(reply, device_ids)
         except Exception as e:
-            print(f"Hiba az eszközfelderítés során: {e}")
-            return {}
+            log.error("sensor_update_failed", "Hiba a szenzorértékek frissítése során: {error}", error=e)
+            return []
     
-    def set_device_state(self, device_id, state):
+    async def subscribe(self, device_ids=None):
         """
-        Beállítja egy eszköz állapotát a szimulációban.
-        Valós Packet Tracer API hívásokat használ.
+        Feliratkozik a szenzorok változásaira (SUBSCRIBE). Az események
+        ugyanazon a kapcsolaton érkeznek, request_id nélkül.
         """
-        if not self.connected or device_id not in self.device_registry:
+        if not await self._ensure_connected():
             return False
         
+        fields = {}
+        if device_ids is not None:
+            fields["device_ids"] = list(device_ids)
         try:
-            # Parancs összeállítása
-            command = {
-                "command": "SET_STATE",
-                "device_id": device_id,
-                "state": state
-            }
-            
-            # Parancs küldése
-            self.socket.sendall(json.dumps(command).encode('utf-8') + b"\n")
-            
-            # Válasz fogadása
-            response = self.socket.recv(1024).decode('utf-8')
-            
-            # Válasz feldolgozása
-            if "OK" in response:
-                print(f"Eszköz állapot beállítva: {device_id} - {state}")
-                
-                # Frissítsük a helyi nyilvántartást is
-                device = self.device_registry[device_id]
-                if isinstance(state, dict):
-                    for key, value in state.items():
-                        if key in device:
-                            device[key] = value
-                else:
-                    device["status"] = state
-                
+            response = await self._request("SUBSCRIBE", **fields)
+            if "OK" in str(response):
+                log.info("subscribed", "Feliratkozás a szenzoreseményekre sikeres")
                 return True
-            else:
-                print(f"Hiba az eszköz állapotának beállításakor: {response}")
-                return False
-                
+            log.warning("subscribe_unsupported", "A gateway nem támogatja a feliratkozást: {response}",
+                        response=response)
         except Exception as e:
-            print(f"Hiba az eszköz vezérlése során: {e}")
-            return False
+            log.error("subscribe_failed", "Hiba a feliratkozás során: {error}", error=e)
+        return False
     
-    def get_device_state(self, device_id):
+    async def wait_for_events(self, timeout):
         """
-        Lekérdezi egy eszköz állapotát a szimulációból.
+        Legfeljebb timeout másodpercig vár a szenzoreseményekre. Visszaadja a
+        megváltozott eszközök listáját, vagy None-t, ha a kapcsolat megszakadt.
         """
-        if not self.connected or device_id not in self.device_registry:
+        if not self.connected:
             return None
+        try:
+            changed = list(await asyncio.wait_for(self.events.get(), timeout))
+        except asyncio.TimeoutError:
+            return []
+        while not self.events.empty():
+            changed.extend(self.events.get_nowait())
+        return changed
+    
+    async def close(self):
+        """Bezárja a kapcsolatot"""
+        self.auto_reconnect = False
+        if self.priority_lane is not None:
+            await asyncio.gather(*(lane.close() for lane in [self.priority_lane] + self.lanes))
+            self.priority_lane, self.lanes = None, []
+        if self.history is not None:
+            self.history.close()
+        if self.recorder is not None:
+            self.recorder.close()
+        if self._reader_task:
+            self._reader_task.cancel()
+            try:
+                await self._reader_task
+            except asyncio.CancelledError:
+                pass
+            self._reader_task = None
+        if self.writer:
+            try:
+                self.writer.close()
+                await self.writer.wait_closed()
+            except Exception as e:
+                log.warning("close_failed", "Hiba a kapcsolat lezárása során: {error}", error=e)
+            finally:
+                self.writer = None
+                self.connected = False
+                log.info("disconnected", "Kapcsolat lezárva a Packet Tracer-rel")
+
+# --------------------------
+# Szenzorlekérdezés ütemező
+# --------------------------
+class SensorPollScheduler:
+    """
+    Szenzoronkénti, adaptív lekérdezési ütemező (kupac alapú). Minden
+    szenzor saját lekérdezési időközzel rendelkezik, amelyet a prioritási
+    osztálya korlátoz: ha az érték változik, az időköz felére csökken,
+    ha nem, másfélszeresére nő.
+    """
+    # Prioritási osztályok: (minimális, maximális) időköz másodpercben
+    PRIORITY_CLASSES = {
+        "safety": (0.25, 0.5),
+        "normal": (0.5, 5.0),
+        "slow": (2.0, 30.0),
+    }
+    # Eszköztípus -> prioritási osztály
+    DEVICE_CLASSES = {
+        "smoke_sensor": "safety",
+        "motion_sensor": "normal",
+        "temp_sensor": "slow",
+    }
+    
+    def __init__(self, base_interval=2.0):
+        self.base_interval = base_interval
+        self.heap = []
+        # Eszközazonosító -> ütemezési adatok
+        self.entries = {}
+    
+    def add(self, device_id, device_type=None, priority=None, now=None):
+        """
+        Szenzor felvétele az ütemezőbe; azonnal (now időpontban) esedékes lesz.
+        """
+        priority = priority or self.DEVICE_CLASSES.get(device_type, "normal")
+        min_interval, max_interval = self.PRIORITY_CLASSES[priority]
+        entry = {
+            "priority": priority,
+            "min": min_interval,
+            "max": max_interval,
+            "interval": max(min_interval, min(max_interval, self.base_interval)),
+            "generation": 0,
+        }
+        self.entries[device_id] = entry
+        heapq.heappush(self.heap, (time.time() if now is None else now, entry["generation"], device_id))
+    
+    def remove(self, device_id):
+        """
+        Szenzor eltávolítása (a kupacból lustán törlődik).
+        """
+        self.entries.pop(device_id, None)
+    
+    def next_due(self):
+        """
+        A legközelebbi esedékes lekérdezés időpontja, vagy None.
+        """
+        while self.heap:
+            due, generation, device_id = self.heap[0]
+            entry = self.entries.get(device_id)
+            if entry is not None and entry["generation"] == generation:
+                return due
+            heapq.heappop(self.heap)
+        return None
+    
+    def pop_due(self, now):
+        """
+        Kiveszi és visszaadja az adott időpontig esedékes szenzorokat.
+        Ezeket a lekérdezés után a reschedule hívással kell visszatenni.
+        """
+        due_ids = []
+        while self.heap and self.heap[0][0] <= now:
+            _, generation, device_id = heapq.heappop(self.heap)
+            entry = self.entries.get(device_id)
+            if entry is not None and entry["generation"] == generation:
+                due_ids.append(device_id)
+        return due_ids
+    
+    def reschedule(self, device_ids, changed_ids, now):
+        """
+        A lekérdezett szenzorok újraütemezése; a változott értékűek
+        időköze csökken, a változatlanoké nő.
+        """
+        changed_ids = set(changed_ids)
+        for device_id in device_ids:
+            entry = self.entries.get(device_id)
+            if entry is None:
+                continue
+            if device_id in changed_ids:
+                entry["interval"] = max(entry["min"], entry["interval"] / 2)
+            else:
+                entry["interval"] = min(entry["max"], entry["interval"] * 1.5)
+            entry["generation"] += 1
+            heapq.heappush(self.heap, (now + entry["interval"], entry["generation"], device_id))
+
+# --------------------------
+# Küszöbérték-indexelt kiváltók
+# --------------------------
+class SensorTriggerIndex:
+    """
+    Egy szenzorhoz tartozó automatizálások indexe. A numerikus "above" és
+    "below" feltételeket küszöbérték szerint rendezett listákban tartja,
+    így egy új mérésnél bináris kereséssel (O(log n + k)) található meg,
+    mely automatizálások feltétele válthat állapotot. Az "equal" feltételek
+    érték szerinti szótárban vannak, a többi feltétel lineárisan értékelődik.
+    """
+    def __init__(self):
+        self.routines = []
+        # Feltétel -> (rendezett küszöbök, automatizálások) a teljesüléshez és a feloldáshoz
+        self.activation = {"above": ([], []), "below": ([], [])}
+        self.release = {"above": ([], []), "below": ([], [])}
+        # "equal" feltételek: érték -> automatizálások
+        self.equal = {}
+        # Nem indexelhető feltételek (pl. nem hashelhető érték)
+        self.other = []
+    
+    def __len__(self):
+        return len(self.routines)
+    
+    @staticmethod
+    def _is_number(value):
+        """
+        Numerikus érték-e (a bool is, mert összehasonlítható számokkal).
+        """
+        return isinstance(value, (int, float))
+    
+    @staticmethod
+    def _insert(index, threshold, routine):
+        """
+        Automatizálás beszúrása egy rendezett küszöblistába.
+        """
+        thresholds, routines = index
+        position = bisect.bisect_right(thresholds, threshold)
+        thresholds.insert(position, threshold)
+        routines.insert(position, routine)
+    
+    def add(self, routine):
+        """
+        Automatizálás felvétele az indexbe.
+        """
+        self.routines.append(routine)
+        trigger = routine["trigger"]
+        condition = trigger.get("condition")
+        threshold = trigger.get("value")
         
+        if condition in self.activation and self._is_number(threshold):
+            hysteresis = trigger.get("hysteresis", 0)
+            release = threshold - hysteresis if condition == "above" else threshold + hysteresis
+            self._insert(self.activation[condition], threshold, routine)
+            self._insert(self.release[condition], release, routine)
+        elif condition == "equal":
+            try:
+                self.equal.setdefault(threshold, []).append(routine)
+            except TypeError:
+                self.other.append(routine)
+        else:
+            self.other.append(routine)
+    
+    def satisfied(self, value):
+        """
+        Visszaadja azokat az automatizálásokat, amelyek feltétele az adott
+        értékre teljesül (O(log n + k)).
+        """
+        result = list(self.other_satisfied(value))
+        if self._is_number(value):
+            thresholds, routines = self.activation["above"]
+            result.extend(routines[:bisect.bisect_left(thresholds, value)])
+            thresholds, routines = self.activation["below"]
+            result.extend(routines[bisect.bisect_right(thresholds, value):])
         try:
-            # Parancs összeállítása
-            command = {
-                "command": "GET_STATE",
-                "device_id": device_id
-            }
-            
-            # Parancs küldése
-            self.socket.sendall(json.dumps(command).encode('utf-8') + b"\n")
-            
-            # Válasz fogadása
-            response = self.socket.recv(1024).decode('utf-8')
-            
-            # Válasz feldolgozása
+            result.extend(self.equal.get(value, ()))
+        except TypeError:
+            pass
+        return result
+    
+    def other_satisfied(self, value):
+        """
+        A nem indexelt feltételek közül a teljesülők (lineáris kiértékelés).
+        """
+        return [routine for routine in self.other
+                if SmartHomeController._condition_met(routine["trigger"], value)]
+    
+    def candidates(self, old_value, new_value, initial=False):
+        """
+        Visszaadja azokat az automatizálásokat, amelyek feltétele az
+        old_value -> new_value változás hatására állapotot válthat.
+        Ismeretlen előző érték esetén az összes automatizálást.
+        """
+        if initial or not (self._is_number(old_value) and self._is_number(new_value)):
+            return self.routines
+        
+        result = list(self.other)
+        low, high = min(old_value, new_value), max(old_value, new_value)
+        if new_value > old_value:
+            # Emelkedés: "above" teljesülhet (old <= küszöb < new),
+            # "below" feloldódhat (old < feloldási küszöb <= new)
+            result.extend(self._range(self.activation["above"], low, high, bisect.bisect_left))
+            result.extend(self._range(self.release["below"], low, high, bisect.bisect_right))
+        elif new_value < old_value:
+            # Csökkenés: "below" teljesülhet (new < küszöb <= old),
+            # "above" feloldódhat (new <= feloldási küszöb < old)
+            result.extend(self._range(self.activation["below"], low, high, bisect.bisect_right))
+            result.extend(self._range(self.release["above"], low, high, bisect.bisect_left))
+        
+        for value in (old_value, new_value):
             try:
-                state = json.loads(response)
-                # Frissítsük a helyi nyilvántartást
-                self.device_registry[device_id] = state
-                return state
-            except json.JSONDecodeError:
-                print(f"Hibás JSON válasz: {response}")
-                return self.device_registry[device_id]
-                
-        except Exception as e:
-            print(f"Hiba az eszköz állapotának lekérdezése során: {e}")
-            return self.device_registry[device_id]
+                result.extend(self.equal.get(value, ()))
+            except TypeError:
+                pass
+        return result
+    
+    @staticmethod
+    def _range(index, low, high, bisect_func):
+        """
+        A [low, high] tartományba eső küszöbökhöz tartozó automatizálások;
+        a határok nyitottságát a bisect_func választása adja meg.
+        """
+        thresholds, routines = index
+        return routines[bisect_func(thresholds, low):bisect_func(thresholds, high)]
+
+# --------------------------
+# Időzített kiváltók
+# --------------------------
+class CronSchedule:
+    """
+    Egy cron kifejezés ("perc óra nap hónap hét_napja") következő
+    időpontjainak számítása helyi idő szerint. Mezőnként támogatja a "*",
+    "*/n", "a-b", "a-b/n" és a vesszővel elválasztott listák formáját; a
+    hét napja 0-7 (0 és 7 is vasárnap). Ha a nap és a hét napja is meg van
+    kötve, bármelyik egyezése elég (mint a cronban).
+    """
+    # Mezőnként a megengedett értékek tartománya
+    FIELD_RANGES = ((0, 59), (0, 23), (1, 31), (1, 12), (0, 7))
+    # Legfeljebb ennyi napot keresünk előre (pl. február 29. miatt)
+    SEARCH_DAYS = 366 * 8
+    
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f"Érvénytelen cron kifejezés: {expression}")
+        self.expression = expression
+        parsed = [self._parse_field(field, low, high) for field, (low, high) in zip(fields, self.FIELD_RANGES)]
+        self.minutes, self.hours, self.days, self.months, weekdays = parsed
+        self.weekdays = {weekday % 7 for weekday in weekdays}
+        self.days_restricted = fields[2] != "*"
+        self.weekdays_restricted = fields[4] != "*"
+        self.times = sorted(hour * 60 + minute for hour in self.hours for minute in self.minutes)
+    
+    @staticmethod
+    def _parse_field(field, low, high):
+        """
+        Egy cron mező értékeinek halmaza.
+        """
+        values = set()
+        for part in field.split(","):
+            step = 1
+            if "/" in part:
+                part, step_text = part.split("/", 1)
+                step = int(step_text)
+            if part == "*":
+                start, end = low, high
+            elif "-" in part:
+                start, end = (int(value) for value in part.split("-", 1))
+            else:
+                start = end = int(part)
+            if step < 1 or start < low or end > high or start > end:
+                raise ValueError(f"Érvénytelen cron mező: {field}")
+            values.update(range(start, end + 1, step))
+        return values
+    
+    def _day_matches(self, day):
+        """
+        Megfelel-e a nap a nap, hónap és hét napja mezőknek.
+        """
+        if day.month not in self.months:
+            return False
+        day_match = day.day in self.days
+        # A cronban a vasárnap 0, a Pythonban a hétfő
+        weekday_match = (day.weekday() + 1) % 7 in self.weekdays
+        if self.days_restricted and self.weekdays_restricted:
+            return day_match or weekday_match
+        return day_match and weekday_match
+    
+    def next_after(self, timestamp):
+        """
+        Az adott időpont utáni első egyező perc kezdete (Unix idő), vagy
+        None, ha nincs ilyen (pl. február 30.).
+        """
+        start = datetime.fromtimestamp(timestamp).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start.date()
+        first_minute = start.hour * 60 + start.minute
+        for _ in range(self.SEARCH_DAYS):
+            if self._day_matches(day):
+                index = bisect.bisect_left(self.times, first_minute)
+                if index < len(self.times):
+                    hour, minute = divmod(self.times[index], 60)
+                    return datetime(day.year, day.month, day.day, hour, minute).timestamp()
+            day += timedelta(days=1)
+            first_minute = 0
+        return None
+
+
+class TimeSchedule:
+    """
+    Egy "time" típusú kiváltó időpontjai. A kiváltó kulcsai:
+    - at: "ÓÓ:PP" vagy ilyenek listája, opcionálisan days: a hét napjai
+      cron számozással (0 = vasárnap)
+    - cron: cron kifejezés
+    - every: ismétlődés másodpercben
+    """
+    def __init__(self, trigger):
+        self.every = trigger.get("every")
+        self.crons = []
+        if "cron" in trigger:
+            self.crons.append(CronSchedule(trigger["cron"]))
+        if "at" in trigger:
+            times = trigger["at"] if isinstance(trigger["at"], list) else [trigger["at"]]
+            days = ",".join(str(day) for day in trigger["days"]) if trigger.get("days") else "*"
+            for text in times:
+                hour, minute = (int(value) for value in text.split(":"))
+                self.crons.append(CronSchedule(f"{minute} {hour} * * {days}"))
+        if not self.crons and not self.every:
+            raise ValueError("Az időzített kiváltóhoz at, cron vagy every kulcs szükséges")
+    
+    def next_after(self, timestamp):
+        """
+        A következő kiváltási időpont (Unix idő), vagy None.
+        """
+        candidates = [cron.next_after(timestamp) for cron in self.crons]
+        if self.every:
+            candidates.append(timestamp + self.every)
+        candidates = [candidate for candidate in candidates if candidate is not None]
+        return min(candidates) if candidates else None
+
+
+class DeadlineScheduler:
+    """
+    Határidők kupaca az időzített automatizálásokhoz és a késleltetett
+    műveletekhez. Minden bejegyzésnek kulcsa van; ugyanazzal a kulccsal
+    újraütemezve a korábbi határidő érvénytelenné válik (a kupacból lustán
+    törlődik). A következő határidő lekérdezése O(1), így a monitorozás
+    pontosan addig alhat, és a várakozó ütemezések száma nem jár
+    processzoridővel.
+    """
+    def __init__(self):
+        self.heap = []
+        # Kulcs -> (sorszám, tartalom); csak az aktuális sorszámú elem érvényes
+        self.entries = {}
+        self._sequence = itertools.count()
+        # A felhasználói felület szála is ütemezhet
+        self.lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self.entries)
+    
+    def schedule(self, key, deadline, payload):
+        """
+        Bejegyzés ütemezése (vagy átütemezése) a megadott időpontra.
+        """
+        with self.lock:
+            sequence = next(self._sequence)
+            self.entries[key] = (sequence, payload)
+            heapq.heappush(self.heap, (deadline, sequence, key))
+    
+    def cancel(self, key):
+        """
+        Bejegyzés törlése.
+        """
+        with self.lock:
+            self.entries.pop(key, None)
+    
+    def next_deadline(self):
+        """
+        A legközelebbi érvényes határidő, vagy None.
+        """
+        with self.lock:
+            while self.heap:
+                deadline, sequence, key = self.heap[0]
+                entry = self.entries.get(key)
+                if entry is not None and entry[0] == sequence:
+                    return deadline
+                heapq.heappop(self.heap)
+            return None
+    
+    def pop_due(self, now):
+        """
+        Kiveszi és határidő szerinti sorrendben visszaadja a lejárt
+        bejegyzéseket (kulcs, tartalom) párokként.
+        """
+        due = []
+        with self.lock:
+            while self.heap and self.heap[0][0] <= now:
+                _, sequence, key = heapq.heappop(self.heap)
+                entry = self.entries.get(key)
+                if entry is not None and entry[0] == sequence:
+                    del self.entries[key]
+                    due.append((key, entry[1]))
+        return due
+
+# --------------------------
+# Összetett kiváltók
+# --------------------------
+class ConditionNetwork:
+    """
+    Összetett (ÉS/VAGY) és időtartamos kiváltók közös, Rete-szerű
+    feltételhálózata. A kiváltók csomópontokra fordulnak, és az azonos
+    részfeltételek (kanonikus kulcs szerint) egyetlen, minden
+    automatizálás által megosztott csomópontot alkotnak. Egy szenzor
+    változásakor csak az állapotot váltható levelek értékelődnek ki (a
+    szenzoronkénti SensorTriggerIndex alapján), és csak azok a szülők,
+    amelyeknek egy gyermeke állapotot váltott: az ÉS/VAGY csomópontok a
+    teljesülő gyermekeik számát tartják nyilván, így a költség a változás
+    méretével arányos, nem a szabálykészletével.
+    
+    Kiváltótípusok (bármelyik kaphat "for" kulcsot: a feltételnek ennyi
+    másodpercig folyamatosan teljesülnie kell):
+    - {"type": "sensor", "device_id", "condition", "value", "hysteresis"}
+    - {"type": "all", "conditions": [...]}: minden feltétel teljesül
+    - {"type": "any", "conditions": [...]}: legalább egy feltétel teljesül
+    - {"type": "between", "start": "ÓÓ:PP", "end": "ÓÓ:PP"}: időablak
+      (éjfélen átnyúló is lehet, pl. 19:00-06:00)
+    Az időtartamok és az időablak-határok a vezérlő DeadlineScheduler-ében
+    ("condition", csomópont) kulccsal várakoznak.
+    """
+    COMPOUND_TYPES = ("all", "any", "between")
+    
+    def __init__(self, timers):
+        self.timers = timers
+        # Kanonikus kulcs -> csomópont
+        self.nodes = {}
+        # Szenzor -> a rá vonatkozó levelek indexe
+        self.sensor_index = {}
+        # Felvételkor már teljesülő feltételű automatizálások
+        self.pending = []
+    
+    def __len__(self):
+        return len(self.nodes)
+    
+    @classmethod
+    def handles(cls, trigger):
+        """
+        Igaz, ha a kiváltót a hálózat értékeli ki (összetett vagy időtartamos).
+        """
+        return trigger.get("type") in cls.COMPOUND_TYPES or "for" in trigger
+    
+    @classmethod
+    def validate(cls, trigger):
+        """
+        A kiváltó szerkezetének ellenőrzése; hibánál ValueError.
+        """
+        if not isinstance(trigger, dict):
+            raise ValueError(f"A feltétel nem szótár: {trigger!r}")
+        duration = trigger.get("for", 0)
+        if not isinstance(duration, (int, float)) or duration < 0:
+            raise ValueError(f"Érvénytelen időtartam: {duration!r}")
+        
+        kind = trigger.get("type")
+        if kind == "sensor":
+            for key in ("device_id", "condition", "value"):
+                if key not in trigger:
+                    raise ValueError(f"A szenzoros feltételből hiányzik: {key}")
+            if trigger["condition"] not in ("above", "below", "equal"):
+                raise ValueError(f"Ismeretlen feltétel: {trigger['condition']}")
+            try:
+                hash(trigger["value"])
+            except TypeError:
+                raise ValueError(f"Nem összehasonlítható érték: {trigger['value']!r}")
+        elif kind in ("all", "any"):
+            conditions = trigger.get("conditions")
+            if not isinstance(conditions, list) or not conditions:
+                raise ValueError(f"A(z) {kind} feltételhez nem üres conditions lista szükséges")
+            for condition in conditions:
+                cls.validate(condition)
+        elif kind == "between":
+            for key in ("start", "end"):
+                cls._parse_clock(trigger.get(key))
+        else:
+            raise ValueError(f"Ismeretlen kiváltótípus: {kind}")
+    
+    @staticmethod
+    def _parse_clock(text):
+        """
+        "ÓÓ:PP" -> (óra, perc).
+        """
+        try:
+            hour, minute = (int(value) for value in str(text).split(":"))
+        except ValueError:
+            raise ValueError(f"Érvénytelen időpont: {text!r}")
+        if not (0 <= hour < 24 and 0 <= minute < 60):
+            raise ValueError(f"Érvénytelen időpont: {text!r}")
+        return hour, minute
+    
+    @classmethod
+    def describe(cls, trigger):
+        """
+        Egy kiváltó rövid szöveges leírása (a menühöz).
+        """
+        kind = trigger.get("type")
+        if kind in ("all", "any"):
+            joiner = " és " if kind == "all" else " vagy "
+            text = "(" + joiner.join(cls.describe(condition) for condition in trigger["conditions"]) + ")"
+        elif kind == "between":
+            text = f"{trigger['start']}-{trigger['end']} között"
+        else:
+            text = f"{trigger['device_id']} {trigger['condition']} {trigger['value']}"
+        if trigger.get("for"):
+            text += f" {trigger['for']} s-ig"
+        return text
+    
+    def add_routine(self, routine, registry, now):
+        """
+        Egy automatizálás kiváltójának lefordítása és a gyökércsomóponthoz
+        kötése. Az új levelek a nyilvántartás jelenlegi értékével
+        indulnak; ha a feltétel már most teljesül, az automatizálás a
+        következő ellenőrzéskor fut le.
+        """
+        root = self._compile(routine["trigger"], registry, now)
+        root["routines"].append(routine)
+        if root["active"]:
+            self.pending.append(routine)
+        return root
+    
+    def take_pending(self):
+        """
+        A felvételkor már teljesülő automatizálások kivétele.
+        """
+        pending, self.pending = self.pending, []
+        return [routine for routine in pending if routine["enabled"]]
+    
+    def _compile(self, trigger, registry, now):
+        """
+        A kiváltó csomóponttá fordítása; a már létező részfeltételeket
+        újrahasznosítja.
+        """
+        kind = trigger["type"]
+        if kind == "sensor":
+            leaf = {key: trigger[key] for key in ("device_id", "condition", "value")}
+            leaf["hysteresis"] = trigger.get("hysteresis", 0)
+            node = self._node(("sensor", leaf["device_id"], leaf["condition"], leaf["value"], leaf["hysteresis"]),
+                              "sensor", trigger=leaf)
+            if node["new"]:
+                self.sensor_index.setdefault(leaf["device_id"], SensorTriggerIndex()).add(node)
+                device = registry.get(leaf["device_id"])
+                if device is not None:
+                    node["active"] = SmartHomeController._condition_met(leaf, device.get("value"))
+        elif kind in ("all", "any"):
+            children = {}
+            for condition in trigger["conditions"]:
+                child = self._compile(condition, registry, now)
+                children[child["key"]] = child
+            node = self._node((kind, frozenset(children)), kind, children=list(children.values()))
+            if node["new"]:
+                for child in node["children"]:
+                    child["parents"].append(node)
+                node["true_count"] = sum(child["active"] for child in node["children"])
+                node["active"] = self._combine(node)
+        else:
+            start, end = self._parse_clock(trigger["start"]), self._parse_clock(trigger["end"])
+            node = self._node(("between", start, end), "between", start=start, end=end,
+                              boundaries=[CronSchedule(f"{minute} {hour} * * *") for hour, minute in (start, end)])
+            if node["new"]:
+                node["active"] = self._in_window(node, now)
+                self._schedule_window(node, now)
+        node["new"] = False
+        
+        if trigger.get("for"):
+            child = node
+            node = self._node(("for", child["key"], trigger["for"]), "for", children=[child], seconds=trigger["for"])
+            if node["new"]:
+                child["parents"].append(node)
+                if child["active"]:
+                    self.timers.schedule(("condition", id(node)), now + node["seconds"], node)
+                node["new"] = False
+        return node
+    
+    def _node(self, key, kind, **fields):
+        """
+        A kulcshoz tartozó csomópont; ha még nincs, létrehozza ("new" jelzi).
+        """
+        node = self.nodes.get(key)
+        if node is None:
+            node = {"key": key, "kind": kind, "active": False, "parents": [], "routines": [], "new": True}
+            node.update(fields)
+            self.nodes[key] = node
+        return node
+    
+    @staticmethod
+    def _combine(node):
+        """
+        Egy ÉS/VAGY csomópont állapota a teljesülő gyermekei száma alapján.
+        """
+        if node["kind"] == "all":
+            return node["true_count"] == len(node["children"])
+        return node["true_count"] > 0
+    
+    def _set(self, node, state, now, fired):
+        """
+        Egy csomópont állapotának beállítása és a váltás továbbterjesztése a
+        szülők felé. A teljesülővé váló gyökerek automatizálásai a fired
+        listába kerülnek.
+        """
+        if node["active"] == state:
+            return
+        node["active"] = state
+        if state:
+            fired.extend(routine for routine in node["routines"] if routine["enabled"])
+        for parent in node["parents"]:
+            if parent["kind"] == "for":
+                key = ("condition", id(parent))
+                if state:
+                    self.timers.schedule(key, now + parent["seconds"], parent)
+                else:
+                    self.timers.cancel(key)
+                    self._set(parent, False, now, fired)
+            else:
+                parent["true_count"] += 1 if state else -1
+                self._set(parent, self._combine(parent), now, fired)
+    
+    def sensor_changed(self, device_id, old_value, value, initial, now):
+        """
+        Egy szenzor értékváltozásának átvezetése a hálózaton. Visszaadja a
+        most kiváltott automatizálásokat.
+        """
+        index = self.sensor_index.get(device_id)
+        if index is None:
+            return []
+        fired = []
+        for leaf in index.candidates(old_value, value, initial):
+            if leaf["active"]:
+                state = not SmartHomeController._condition_released(leaf["trigger"], value)
+            else:
+                state = SmartHomeController._condition_met(leaf["trigger"], value)
+            self._set(leaf, state, now, fired)
+        return fired
+    
+    def timer_fired(self, node, now):
+        """
+        Egy lejárt időtartam vagy időablak-határ feldolgozása. Visszaadja a
+        kiváltott automatizálásokat.
+        """
+        fired = []
+        if node["kind"] == "for":
+            if node["children"][0]["active"]:
+                self._set(node, True, now, fired)
+        else:
+            self._set(node, self._in_window(node, now), now, fired)
+            self._schedule_window(node, now)
+        return fired
+    
+    @staticmethod
+    def _in_window(node, now):
+        """
+        Igaz, ha a helyi idő az időablakon belül van.
+        """
+        local = time.localtime(now)
+        minutes = local.tm_hour * 60 + local.tm_min
+        start = node["start"][0] * 60 + node["start"][1]
+        end = node["end"][0] * 60 + node["end"][1]
+        if start <= end:
+            return start <= minutes < end
+        return minutes >= start or minutes < end
+    
+    def _schedule_window(self, node, now):
+        """
+        Az időablak következő határának ütemezése.
+        """
+        deadline = min(boundary.next_after(now) for boundary in node["boundaries"])
+        self.timers.schedule(("condition", id(node)), deadline, node)
+
+# --------------------------
+# Állapotjelentés megjelenítő
+# --------------------------
+class StatusRenderer:
+    """
+    Saját szálon futó, ritkított állapotjelentés. Csak a legutóbbi
+    megjelenítés óta megváltozott eszközöket írja ki, legfeljebb
+    min_interval másodpercenként, így a lassú konzol nem lassítja a
+    monitorozó szálat. Tömör módban egyetlen összesítő sort ír.
+    DeviceRegistry esetén csak a nyilvántartás által jelzett (dirty)
+    eszközöket vizsgálja, egyszerű szótárnál az összeset.
+    """
+    def __init__(self, devices, min_interval=2.0, compact=False):
+        self.devices = devices
+        self.min_interval = min_interval
+        self.compact = compact
+        # Eszközazonosító -> a legutóbb megjelenített állapot másolata
+        self.rendered = {}
+        # A legutóbbi megjelenítés óta módosított eszközök azonosítói
+        self.dirty = devices.track_changes() if isinstance(devices, DeviceRegistry) else None
+        self.running = False
+        self.thread = None
+        self._dirty = threading.Event()
+    
+    @staticmethod
+    def format_device(device):
+        """
+        Egy eszköz állapotának szöveges formája.
+        """
+        if "sensor" in device["type"]:
+            return f"{device['name']}: {device.get('value')}"
+        status_text = "BE" if device.get("status", False) else "KI"
+        extra_info = ""
+        if device["type"] == "ac":
+            extra_info = f", {device.get('temp', 22)}°C"
+        elif device["type"] == "fan":
+            extra_info = f", Sebesség: {device.get('speed', 0)}"
+        return f"{device['name']}: {status_text}{extra_info}"
     
-    def update_sensor_values(self):
+    def notify(self):
         """
-        Frissíti a szenzorok értékeit a szimulációban.
-        Valós Packet Tracer API hívásokat használ.
+        Jelzi, hogy az állapot változhatott; a megjelenítés a saját szálon történik.
         """
-        if not self.connected:
-            return {}
-        
-        try:
-            # Parancs összeállítása
-            command = {
-                "command": "GET_SENSOR_VALUES"
-            }
-            
-            # Parancs küldése
-            self.socket.sendall(json.dumps(command).encode('utf-8') + b"\n")
-            
-            # Válasz fogadása
-            data = b""
-            while True:
-                chunk = self.socket.recv(4096)
-                if not chunk:
-                    break
-                data += chunk
-                if b"\n\n" in data:
+        self._dirty.set()
+    
+    def start(self):
+        """
+        A megjelenítő szál indítása.
+        """
+        if self.running:
+            return
+        self.running = True
+        self.thread = threading.Thread(target=self._render_loop)
+        self.thread.daemon = True
+        self.thread.start()
+    
+    def stop(self):
+        """
+        A megjelenítő szál leállítása.
+        """
+        self.running = False
+        self._dirty.set()
+        if self.thread:
+            self.thread.join(timeout=1.0)
+            self.thread = None
+    
+    def _render_loop(self):
+        """
+        A megjelenítés háttérfolyamata.
+        """
+        while self.running:
+            self._dirty.wait()
+            if not self.running:
+                break
+            self._dirty.clear()
+            started = time.time()
+            self.render_changes()
+            # A frissítési gyakoriság korlátozása
+            time.sleep(max(0.0, self.min_interval - (time.time() - started)))
+    
+    def changed_devices(self):
+        """
+        A legutóbbi megjelenítés óta megváltozott eszközök listája; a
+        nyilvántartott másolatokat frissíti.
+        """
+        if self.dirty is None:
+            candidates = list(self.devices)
+        else:
+            candidates = []
+            # A set.pop() atomi: a közben jelzett eszköz a halmazban marad
+            while self.dirty:
+                try:
+                    candidates.append(self.dirty.pop())
+                except KeyError:
                     break
-            
-            response = data.decode('utf-8')
-            
-            # Válasz feldolgozása
-            try:
-                sensor_values = json.loads(response)
-                # Frissítsük a helyi nyilvántartást
-                for device_id, value in sensor_values.items():
-                    if device_id in self.device_registry:
-                        self.device_registry[device_id]["value"] = value
-                
-                return self.device_registry
-            except json.JSONDecodeError:
-                print(f"Hibás JSON válasz: {response}")
-                return self.device_registry
-                
-        except Exception as e:
-            print(f"Hiba a szenzorértékek frissítése során: {e}")
-            return self.device_registry
+            candidates.sort()
+        
+        changed = []
+        for device_id in candidates:
+            device = self.devices.get(device_id)
+            if device is None:
+                self.rendered.pop(device_id, None)
+            elif self.rendered.get(device_id) != device:
+                self.rendered[device_id] = dict(device)
+                changed.append((device_id, device))
+        return changed
     
-    def close(self):
-        """Bezárja a kapcsolatot"""
-        if self.connected and self.socket:
-            try:
-                self.socket.close()
-            except Exception as e:
-                print(f"Hiba a kapcsolat lezárása során: {e}")
-            finally:
-                self.connected = False
-                print("Kapcsolat lezárva a Packet Tracer-rel")
+    def render_changes(self):
+        """
+        A megváltozott eszközök megjelenítése.
+        """
+        changed = self.changed_devices()
+        if not changed:
+            return
+        
+        timestamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        if self.compact:
+            devices = list(self.devices.values())
+            active = sum(1 for device in devices if "sensor" not in device["type"] and device.get("status", False))
+            sensors = sum(1 for device in devices if "sensor" in device["type"])
+            print(f"[{timestamp}] {sensors} szenzor, {active} bekapcsolt eszköz, {len(changed)} változás")
+            return
+        
+        lines = [f"\n--- Smart Home Állapotváltozások ({timestamp}) ---"]
+        for _, device in changed:
+            lines.append(f"  - {self.format_device(device)}")
+        lines.append("-----------------------------------")
+        print("\n".join(lines))
+
 # --------------------------
 # Okos Otthon Vezérlő
 # --------------------------
 class SmartHomeController:
-    def __init__(self, pt_interface):
+    # Esemény-várakozás leghosszabb szelete, hogy a leállítás gyors legyen
+    EVENT_WAIT_SLICE = 0.5
+    # Ekkora vagy nagyobb prioritású automatizálások (pl. smoke_emergency)
+    # parancsai az interfész elsőbbségi sávján, a többiek előtt mennek ki
+    SAFETY_PRIORITY = 10
+    # Az átviteli hiba miatt sikertelen eszközparancsok újraküldése:
+    # az első ennyi másodperc múlva, a továbbiak kétszeres várakozással,
+    # legfeljebb ACTUATION_RETRIES alkalommal
+    ACTUATION_RETRY_DELAY = 1.0
+    ACTUATION_RETRIES = 5
+    
+    def __init__(self, pt_interface, poll_interval=2.0, use_push=True,
+                 report_interval=2.0, compact_report=False, clock=None):
         """
         Az Okos Otthon vezérlő inicializálása.
+        use_push=True esetén a monitorozás a gateway által küldött
+        szenzoreseményekre reagál, és csak akkor kérdez le poll_interval
+        másodpercenként, ha a feliratkozás nem lehetséges.
+        Az állapotváltozásokat legfeljebb report_interval másodpercenként
+        jeleníti meg (compact_report=True esetén egy összesítő sorban);
+        report_interval=None esetén nincs állapotmegjelenítés.
+        A clock az aktuális időt adó függvény (alapértelmezés: time.time);
+        visszajátszáskor egy virtuális óra, amelyet a lejátszó léptet.
         """
         self.pt_interface = pt_interface
+        self.clock = clock or time.time
+        self.poll_interval = poll_interval
+        self.use_push = use_push
+        self.report_interval = report_interval
+        self.compact_report = compact_report
+        self.status_renderer = None
         self.devices = {}
         self.routines = []
+        # Automatizálások indexe a kiváltó szenzor azonosítója szerint
+        self.routine_index = {}
+        # A legutóbb kiértékelt szenzorértékek (változásfigyeléshez)
+        self.last_sensor_values = {}
+        # Újraértékelésre váró automatizálások (pl. a minimális tartási idő
+        # miatt visszatartott állapotváltások vagy az újonnan felvettek)
+        self.pending_routines = {}
+        # Lekérdezéses módban a szenzoronkénti ütemező
+        self.poll_scheduler = None
+        # Időzített automatizálások és késleltetett műveletek határidői
+        self.timers = DeadlineScheduler()
+        # Eszközazonosító -> egymást követő sikertelen parancsküldések száma
+        self.actuation_failures = {}
+        # Összetett és időtartamos kiváltók közös feltételhálózata
+        self.conditions = ConditionNetwork(self.timers)
+        # Megszakadt feliratkozás újrapróbálása push módban
+        self.subscribe_backoff = Backoff(base=1.0, maximum=60.0)
+        # Pillanatképből indulva a háttérben futó egyeztetés
+        self.reconcile_thread = None
+        # Az interfésszel közös mérőszámok (kiváltások, ütemidő)
+        self.metrics = getattr(pt_interface, "metrics", None) or Metrics()
         self.running = False
         self.update_thread = None
         
-    def initialize(self):
+    def initialize(self, snapshot_path=None):
         """
         Inicializálja a vezérlőt és felfedezi az eszközöket.
+        snapshot_path megadásakor a nyilvántartást azonnal betölti a
+        pillanatképből, a kapcsolódást és a növekményes egyeztetést pedig
+        a háttérben végzi el.
         """
+        if snapshot_path and self.pt_interface.load_snapshot(snapshot_path):
+            self.devices = self.pt_interface.device_registry
+            self.setup_routines()
+            
+            self.reconcile_thread = threading.Thread(
+                target=self._reconcile_registry, args=(snapshot_path,))
+            self.reconcile_thread.daemon = True
+            self.reconcile_thread.start()
+            return len(self.devices) > 0
+        
         # Kapcsolódás a Packet Tracer-hez
         if not self.pt_interface.connected:
             self.pt_interface.connect()
         
         # Eszközök felderítése
         self.devices = self.pt_interface.discover_devices()
+        if snapshot_path and self.devices:
+            self.pt_interface.save_snapshot(snapshot_path)
         
         # Automatizálások beállítása
         self.setup_routines()
         
         return len(self.devices) > 0
     
+    def _reconcile_registry(self, snapshot_path):
+        """
+        Kapcsolódás és a pillanatkép egyeztetése a gateway-jel a háttérben.
+        """
+        if not self.pt_interface.connected and not self.pt_interface.connect():
+            return
+        if self.pt_interface.fetch_device_changes():
+            self.pt_interface.save_snapshot(snapshot_path)
+    
     def setup_routines(self):
         """
         Beállítja az alapértelmezett automatizálásokat.
@@ -253,14 +3762,16 @@ class SmartHomeController:
         # 1. Ha a hőmérséklet 25°C fölé megy, kapcsolja be a ventilátort
         self.add_routine(
             name="cooling_routine",
-            trigger={"type": "sensor", "device_id": "IoT:Sensor:Temp:1", "condition": "above", "value": 25.0},
+            trigger={"type": "sensor", "device_id": "IoT:Sensor:Temp:1", "condition": "above", "value": 25.0,
+                     "hysteresis": 0.5, "min_hold": 10.0},
             actions=[{"device_id": "IoT:Fan:1", "command": {"status": True, "speed": 2}}]
         )
         
         # 2. Ha a hőmérséklet 20°C alá megy, kapcsolja be a klímát fűtési módban
         self.add_routine(
             name="heating_routine",
-            trigger={"type": "sensor", "device_id": "IoT:Sensor:Temp:1", "condition": "below", "value": 20.0},
+            trigger={"type": "sensor", "device_id": "IoT:Sensor:Temp:1", "condition": "below", "value": 20.0,
+                     "hysteresis": 0.5, "min_hold": 10.0},
             actions=[{"device_id": "IoT:AC:1", "command": {"status": True, "temp": 22}}]
         )
         
@@ -275,6 +3786,7 @@ class SmartHomeController:
         )
         
         # 4. Ha füstöt érzékel, kapcsolja be a ventilátort maximumon és kapcsolja fel az összes lámpát
+        #    (ütközés esetén ez az automatizálás élvez elsőbbséget)
         self.add_routine(
             name="smoke_emergency",
             trigger={"type": "sensor", "device_id": "IoT:Sensor:Smoke:1", "condition": "equal", "value": True},
@@ -283,66 +3795,410 @@ class SmartHomeController:
                 {"device_id": "IoT:Light:1", "command": {"status": True}},
                 {"device_id": "IoT:Light:2", "command": {"status": True}},
                 {"device_id": "IoT:Light:3", "command": {"status": True}}
-            ]
+            ],
+            priority=self.SAFETY_PRIORITY
         )
         
-        print(f"{len(self.routines)} automatizálás beállítva")
+        log.info("routines_configured", "{count} automatizálás beállítva", count=len(self.routines))
     
-    def add_routine(self, name, trigger, actions):
+    def add_routine(self, name, trigger, actions, priority=0):
         """
         Új automatizálás hozzáadása.
+        Ha egy ütemben több automatizálás ugyanazt az eszközt vezérli, a
+        nagyobb prioritású parancs kulcsai felülírják a kisebbekét (azonos
+        prioritásnál a később felvett automatizálásé érvényes).
+        Az automatizálás akkor fut le, amikor a feltétele teljesülővé válik
+        (felfutó él). A szenzoros kiváltó opcionális kulcsai:
+        - hysteresis: ennyivel kell visszalépnie az értéknek a küszöb
+          túloldalára, hogy a feltétel újra hamissá váljon
+        - min_hold: ennyi másodpercig tartja meg az állapotát a feltétel
+          minden váltás után
+        Időzített ("type": "time") kiváltónál az automatizálás a TimeSchedule
+        szerinti időpontokban fut le (at, cron vagy every kulccsal).
+        Az összetett ("all", "any", "between") és a "for" kulcsú
+        (időtartamos) kiváltókat a közös ConditionNetwork értékeli ki.
+        A delay kulcsú műveletek a kiváltás után ennyi másodperccel, a
+        monitorozást nem blokkolva futnak le; újabb kiváltás újraindítja
+        az időzítésüket.
         """
+        compound = ConditionNetwork.handles(trigger)
+        if compound:
+            try:
+                ConditionNetwork.validate(trigger)
+            except ValueError as e:
+                log.error("invalid_trigger", "Hibás kiváltó ({name}): {error}", name=name, error=e)
+                return False
+        elif trigger.get("type") == "time":
+            try:
+                schedule = TimeSchedule(trigger)
+            except ValueError as e:
+                log.error("invalid_schedule", "Hibás időzítés ({name}): {error}", name=name, error=e)
+                return False
+        
         routine = {
             "name": name,
             "trigger": trigger,
             "actions": actions,
-            "enabled": True
+            "enabled": True,
+            "priority": priority,
+            "order": len(self.routines),
+            # A feltétel jelenlegi állapota és utolsó váltásának ideje
+            "active": False,
+            "changed_at": 0.0
         }
         self.routines.append(routine)
-        print(f"Automatizálás hozzáadva: {name}")
+        if compound:
+            self.conditions.add_routine(routine, self.pt_interface.device_registry, self.clock())
+        elif trigger.get("type") == "sensor":
+            self.routine_index.setdefault(trigger["device_id"], SensorTriggerIndex()).add(routine)
+            self.pending_routines[id(routine)] = routine
+        elif trigger.get("type") == "time":
+            routine["schedule"] = schedule
+            self._schedule_routine(routine, self.clock())
+        log.info("routine_added", "Automatizálás hozzáadva: {name}", name=name)
         return True
     
-    def check_routines(self):
+    def check_routines(self, changed_ids=None, refresh=False):
         """
         Ellenőrzi az automatizálásokat a szenzor értékek alapján.
+        Csak azokat az automatizálásokat értékeli ki, amelyek kiváltó
+        szenzorának értéke megváltozott a legutóbbi ellenőrzés óta.
+        A szenzorértékeket a helyi nyilvántartásból olvassa, hálózati
+        hívás nélkül (azokat az update_sensor_values frissíti).
+        Ha refresh=True, előbb egyetlen kötegelt kéréssel frissíti a
+        kiváltó szenzorok állapotát.
+        """
+        if refresh:
+            self.pt_interface.get_device_states(self._trigger_sensor_ids())
+        
+        routines = self._triggered_routines(changed_ids)
+        if routines:
+            self.execute_routines(routines)
+    
+    def _triggered_routines(self, changed_ids=None):
         """
-        for routine in self.routines:
+        Visszaadja a végrehajtandó automatizálásokat a megváltozott
+        kiváltó szenzorok alapján. Csak azok futnak le, amelyek feltétele
+        most vált teljesülővé.
+        """
+        registry = self.pt_interface.device_registry
+        if changed_ids is None:
+            changed_ids = self._changed_trigger_sensors()
+        
+        now = self.clock()
+        triggered = []
+        for device_id in changed_ids:
+            index = self.routine_index.get(device_id)
+            device = registry.get(device_id)
+            if not device or not (index or device_id in self.conditions.sensor_index):
+                continue
+            
+            value = device.get("value")
+            initial = device_id not in self.last_sensor_values
+            old_value = self.last_sensor_values.get(device_id)
+            self.last_sensor_values[device_id] = value
+            
+            # Csak azokat értékeljük ki, amelyek feltétele állapotot válthat
+            if index:
+                for routine in index.candidates(old_value, value, initial):
+                    if routine["enabled"] and self._update_routine_state(routine, value, now):
+                        triggered.append(routine)
+            triggered.extend(self.conditions.sensor_changed(device_id, old_value, value, initial, now))
+        triggered.extend(self.conditions.take_pending())
+        
+        # A várakozó automatizálásokat a szenzor változásától függetlenül újraértékeljük
+        for routine in list(self.pending_routines.values()):
+            device = registry.get(routine["trigger"]["device_id"])
+            if not device:
+                # Ismeretlen szenzor: az első értékénél úgyis kiértékelődik
+                del self.pending_routines[id(routine)]
+                continue
             if not routine["enabled"]:
                 continue
+            if self._update_routine_state(routine, device.get("value"), now):
+                triggered.append(routine)
+        return triggered
+    
+    def _update_routine_state(self, routine, value, now):
+        """
+        Frissíti egy automatizálás feltételének állapotát a hiszterézis és a
+        minimális tartási idő figyelembevételével. True-t ad vissza, ha a
+        feltétel most vált teljesülővé (az automatizálást végre kell hajtani).
+        """
+        trigger = routine["trigger"]
+        if routine["active"]:
+            new_state = not self._condition_released(trigger, value)
+        else:
+            new_state = self._condition_met(trigger, value)
+        
+        if new_state == routine["active"]:
+            self.pending_routines.pop(id(routine), None)
+            return False
+        
+        if now - routine["changed_at"] < trigger.get("min_hold", 0):
+            # Még nem telt le a tartási idő, később újraértékeljük
+            self.pending_routines[id(routine)] = routine
+            return False
+        
+        self.pending_routines.pop(id(routine), None)
+        routine["active"] = new_state
+        routine["changed_at"] = now
+        return new_state
+    
+    def _changed_trigger_sensors(self, device_ids=None):
+        """
+        Visszaadja azoknak a kiváltó szenzoroknak az azonosítóit, amelyek
+        értéke eltér a legutóbb kiértékelt értéktől. device_ids megadásával
+        csak a felsorolt szenzorokat vizsgálja.
+        """
+        registry = self.pt_interface.device_registry
+        if device_ids is None:
+            device_ids = self._trigger_sensor_ids()
+        changed = []
+        for device_id in device_ids:
+            if device_id not in self.routine_index and device_id not in self.conditions.sensor_index:
+                continue
+            device = registry.get(device_id)
+            if not device:
+                continue
+            value = device.get("value")
+            if device_id not in self.last_sensor_values or self.last_sensor_values[device_id] != value:
+                changed.append(device_id)
+        return changed
+    
+    def _trigger_sensor_ids(self):
+        """
+        Az egyszerű és az összetett kiváltókban szereplő szenzorok azonosítói.
+        """
+        return list(self.routine_index.keys() | self.conditions.sensor_index.keys())
+    
+    @staticmethod
+    def _condition_released(trigger, value):
+        """
+        Eldönti, hogy egy teljesült feltétel hamissá vált-e, a hiszterézis-
+        sávot is figyelembe véve.
+        """
+        hysteresis = trigger.get("hysteresis", 0)
+        try:
+            if trigger["condition"] == "above":
+                return value <= trigger["value"] - hysteresis
+            elif trigger["condition"] == "below":
+                return value >= trigger["value"] + hysteresis
+            elif trigger["condition"] == "equal":
+                return value != trigger["value"]
+        except TypeError:
+            # Hiányzó vagy nem összehasonlítható érték
+            return True
+        return True
+    
+    @staticmethod
+    def _condition_met(trigger, value):
+        """
+        Kiértékeli egy szenzoros kiváltó feltételét az adott értékre.
+        """
+        try:
+            if trigger["condition"] == "above":
+                return value > trigger["value"]
+            elif trigger["condition"] == "below":
+                return value < trigger["value"]
+            elif trigger["condition"] == "equal":
+                return value == trigger["value"]
+        except TypeError:
+            # Hiányzó vagy nem összehasonlítható érték
+            return False
+        return False
+    
+    def _schedule_routine(self, routine, now):
+        """
+        Egy időzített automatizálás következő kiváltásának ütemezése.
+        """
+        deadline = routine["schedule"].next_after(now)
+        if deadline is not None:
+            self.timers.schedule(("routine", id(routine)), deadline, routine)
+    
+    def _schedule_follow_ups(self, routines, now):
+        """
+        A kiváltott automatizálások késleltetett (delay kulcsú) műveleteinek
+        ütemezése.
+        """
+        for routine in routines:
+            for idx, action in enumerate(routine["actions"]):
+                if action.get("delay"):
+                    self.timers.schedule(("action", id(routine), idx), now + action["delay"], action)
+    
+    def _due_timers(self, now):
+        """
+        Kiveszi a lejárt határidőket. Visszaadja a kiváltandó időzített
+        automatizálásokat, az esedékes késleltetett műveletek és
+        újraküldések összevont állapotait, valamint az elsőbbségi sávon
+        újraküldendő állapotokat; az automatizálásokat a következő
+        időpontjukra ütemezi.
+        """
+        routines = []
+        states = {}
+        urgent = {}
+        for key, payload in self.timers.pop_due(now):
+            if key[0] == "routine":
+                self._schedule_routine(payload, now)
+                if payload["enabled"]:
+                    routines.append(payload)
+            elif key[0] == "condition":
+                routines.extend(self.conditions.timer_fired(payload, now))
+            elif key[0] == "retry" and payload["priority"]:
+                urgent[payload["device_id"]] = payload["command"]
+            else:
+                command = payload["command"]
+                if not isinstance(command, dict):
+                    command = {"status": command}
+                states.setdefault(payload["device_id"], {}).update(command)
+        return routines, states, urgent
+    
+    def _track_results(self, states, results, priority=False):
+        """
+        A set_device_states eredményeinek feldolgozása. Az átviteli hiba
+        (pl. megszakadt kapcsolat) miatt sikertelen eszközparancsot
+        újraküldi (az él alapú kiváltó nem adna rá újabb alkalmat),
+        eszközönként kétszeresére növekvő várakozással, legfeljebb
+        ACTUATION_RETRIES alkalommal. A gateway által elutasított
+        parancsot (pl. ismeretlen eszköz) és a nyilvántartásban nem
+        szereplő eszközt nem küldi újra. A sikeres - újabb - parancs
+        törli az eszköz függő újraküldését, így elavult állapot nem írja felül.
+        """
+        now = self.clock()
+        rejected = self.pt_interface.rejected_devices
+        for device_id, state in states.items():
+            key = ("retry", device_id)
+            if results.get(device_id):
+                self.timers.cancel(key)
+                self.actuation_failures.pop(device_id, None)
+                continue
+            if device_id not in self.pt_interface.device_registry:
+                continue
+            if device_id in rejected:
+                self.timers.cancel(key)
+                self.actuation_failures.pop(device_id, None)
+                log.error("actuation_rejected", "A gateway elutasította a parancsot, nincs újraküldés: {device_id}",
+                          device_id=device_id)
+                continue
             
-            trigger = routine["trigger"]
-            if trigger["type"] == "sensor":
-                device_id = trigger["device_id"]
-                device = self.pt_interface.get_device_state(device_id)
-                
-                if not device:
-                    continue
-                
-                value = device.get("value")
-                
-                # Feltétel ellenőrzése
-                condition_met = False
-                if trigger["condition"] == "above" and value > trigger["value"]:
-                    condition_met = True
-                elif trigger["condition"] == "below" and value < trigger["value"]:
-                    condition_met = True
-                elif trigger["condition"] == "equal" and value == trigger["value"]:
-                    condition_met = True
-                
-                # Automatizálás végrehajtása, ha a feltétel teljesül
-                if condition_met:
-                    self.execute_routine(routine)
+            failures = self.actuation_failures.get(device_id, 0) + 1
+            if failures > self.ACTUATION_RETRIES:
+                self.timers.cancel(key)
+                self.actuation_failures.pop(device_id, None)
+                log.error("actuation_abandoned", "Sikertelen parancs: {device_id}, {count} újraküldés után feladva",
+                          device_id=device_id, count=self.ACTUATION_RETRIES)
+                continue
+            self.actuation_failures[device_id] = failures
+            delay = self.ACTUATION_RETRY_DELAY * 2 ** (failures - 1)
+            if failures == 1:
+                log.warning("actuation_failed", "Sikertelen parancs: {device_id}, újraküldés {delay} s múlva",
+                            device_id=device_id, delay=delay)
+            self.timers.schedule(key, now + delay, {"device_id": device_id, "command": state, "priority": priority})
+    
+    def _forget_rejections(self, states):
+        """
+        A küldendő eszközök korábbi elutasításainak törlése, hogy a
+        _track_results csak az aktuális kérés elutasításait lássa.
+        """
+        rejected = self.pt_interface.rejected_devices
+        if rejected:
+            rejected.difference_update(states)
+    
+    def _actuate(self, states, priority=False):
+        """
+        Állapotok kiküldése az eredmények nyomon követésével.
+        """
+        self._forget_rejections(states)
+        if priority:
+            results = self.pt_interface.set_device_states(states, priority=True)
+        else:
+            results = self.pt_interface.set_device_states(states)
+        self._track_results(states, results, priority)
+        return results
+    
+    def run_timers(self):
+        """
+        A lejárt időzített automatizálások, késleltetett műveletek és
+        újraküldések végrehajtása.
+        """
+        routines, states, urgent = self._due_timers(self.clock())
+        if urgent:
+            self._actuate(urgent, priority=True)
+        if routines:
+            self.execute_routines(routines)
+        if states:
+            self._actuate(states)
+    
+    def _wait_timeout(self):
+        """
+        Az eseményekre várakozás ideje: legfeljebb a következő időzített
+        határidőig (és a leállítás érdekében legfeljebb EVENT_WAIT_SLICE).
+        """
+        timeout = min(self.poll_interval, self.EVENT_WAIT_SLICE)
+        deadline = self.timers.next_deadline()
+        if deadline is not None:
+            # A 0 időtúllépés nem blokkoló módba kapcsolná a socketet
+            timeout = max(0.001, min(timeout, deadline - self.clock()))
+        return timeout
     
     def execute_routine(self, routine):
         """
         Automatizálás végrehajtása.
         """
-        print(f"Automatizálás végrehajtása: {routine['name']}")
+        self.execute_routines([routine])
+    
+    def execute_routines(self, routines):
+        """
+        Egy ütemben kiváltott automatizálások végrehajtása. A műveleteket
+        eszközönként összevonja; a biztonsági automatizálások eszközeit
+        elsőbbségi kéréssel elsőként, a többit egy kötegben küldi el.
+        """
+        for routine in routines:
+            log.info("routine_executed", "Automatizálás végrehajtása: {routine}", routine=routine['name'])
+            self.metrics.routine_fired(routine["name"])
         
-        for action in routine["actions"]:
-            device_id = action["device_id"]
-            command = action["command"]
-            self.pt_interface.set_device_state(device_id, command)
+        self._schedule_follow_ups(routines, self.clock())
+        states = self._merge_actions(routines)
+        urgent = self._split_urgent(routines, states)
+        if urgent:
+            self._actuate(urgent, priority=True)
+        if states:
+            self._actuate(states)
+    
+    @staticmethod
+    def _merge_actions(routines):
+        """
+        Az automatizálások azonnali műveleteit eszközönként egyetlen
+        állapottá vonja össze. A routine-ok prioritás, majd felvételi
+        sorrend szerint rendezve íródnak egymásra, így az eredmény
+        determinisztikus. A késleltetett műveleteket kihagyja.
+        """
+        states = {}
+        for routine in sorted(routines, key=lambda routine: (routine["priority"], routine["order"])):
+            for action in routine["actions"]:
+                if action.get("delay"):
+                    continue
+                command = action["command"]
+                if not isinstance(command, dict):
+                    command = {"status": command}
+                states.setdefault(action["device_id"], {}).update(command)
+        return states
+    
+    def _split_urgent(self, routines, states):
+        """
+        Kiveszi az összevont állapotokból a biztonsági (SAFETY_PRIORITY
+        prioritású) automatizálások által vezérelt eszközöket, és
+        visszaadja őket. Az eszköz teljes összevont állapota megy az
+        elsőbbségi sávon, így a két kérés nem írja felül egymást.
+        """
+        urgent = {}
+        for routine in routines:
+            if routine["priority"] < self.SAFETY_PRIORITY:
+                continue
+            for action in routine["actions"]:
+                if not action.get("delay") and action["device_id"] in states:
+                    urgent[action["device_id"]] = states.pop(action["device_id"])
+        return urgent
     
     def control_device(self, device_id, command):
         """
@@ -355,14 +4211,15 @@ class SmartHomeController:
         Elindítja a rendszer monitorozását.
         """
         if self.running:
-            print("A monitorozás már fut!")
+            log.warning("monitoring_already_running", "A monitorozás már fut!")
             return
         
         self.running = True
+        self._start_renderer()
         self.update_thread = threading.Thread(target=self._monitoring_loop)
         self.update_thread.daemon = True
         self.update_thread.start()
-        print("Rendszermonitorozás elindítva")
+        log.info("monitoring_started", "Rendszermonitorozás elindítva")
     
     def stop_monitoring(self):
         """
@@ -371,24 +4228,135 @@ class SmartHomeController:
         self.running = False
         if self.update_thread:
             self.update_thread.join(timeout=1.0)
-        print("Rendszermonitorozás leállítva")
+        self._stop_renderer()
+        log.info("monitoring_stopped", "Rendszermonitorozás leállítva")
+    
+    def _start_renderer(self):
+        """
+        Az állapotjelentés megjelenítőjének indítása.
+        """
+        if self.report_interval is None:
+            return
+        self.status_renderer = StatusRenderer(
+            self.devices, min_interval=self.report_interval, compact=self.compact_report)
+        self.status_renderer.start()
+    
+    def _stop_renderer(self):
+        """
+        Az állapotjelentés megjelenítőjének leállítása.
+        """
+        if self.status_renderer:
+            self.status_renderer.stop()
+            self.status_renderer = None
     
     def _monitoring_loop(self):
         """
         A monitorozás háttérfolyamata.
         """
-        while self.running:
-            # Szenzorértékek frissítése
+        # Pillanatképből indulva megvárjuk a kapcsolódást és az egyeztetést
+        if self.reconcile_thread is not None:
+            self.reconcile_thread.join()
+        
+        subscribed = self.use_push and self.pt_interface.subscribe()
+        if self.use_push and not subscribed:
+            self.subscribe_backoff.failure()
+        self.poll_scheduler = self._create_poll_scheduler()
+        
+        if subscribed:
+            # Kiinduló állapot: egyszeri teljes lekérdezés a feliratkozás után
             self.pt_interface.update_sensor_values()
-            
-            # Automatizálások ellenőrzése
             self.check_routines()
+        
+        while self.running:
+            if subscribed:
+                # Eseményvezérelt mód: azonnal reagálunk a változásokra
+                changed = self.pt_interface.wait_for_events(timeout=self._wait_timeout())
+                if changed is None:
+                    log.warning("subscription_lost", "A feliratkozás megszakadt, lekérdezéses módra váltunk")
+                    subscribed = False
+                    continue
+                if changed or self.pending_routines:
+                    tick_start = time.perf_counter()
+                    self.check_routines(changed)
+                    self.metrics.observe_tick(time.perf_counter() - tick_start)
+            else:
+                # Push módban visszalépéssel újra megpróbálunk feliratkozni
+                if self.use_push and self.subscribe_backoff.ready():
+                    if self.pt_interface.subscribe():
+                        self.subscribe_backoff.success()
+                        subscribed = True
+                        # A kiesés alatt elmaradt változások pótlása
+                        self.pt_interface.update_sensor_values()
+                        self.check_routines()
+                        continue
+                    self.subscribe_backoff.failure()
+                
+                # Csak az esedékes szenzorokat kérdezzük le
+                due_ids = self.poll_scheduler.pop_due(self.clock())
+                if due_ids:
+                    tick_start = time.perf_counter()
+                    # Az esedékes szenzorok változásai egyetlen növekményes kérésben;
+                    # ha a gateway nem támogatja, az esedékesek teljes lekérdezése
+                    changed = self.pt_interface.update_sensor_changes(due_ids)
+                    if changed is None:
+                        self.pt_interface.update_sensor_values(due_ids)
+                        changed = due_ids
+                    self._reschedule_polled(due_ids)
+                    
+                    # Automatizálások ellenőrzése
+                    self.check_routines(self._changed_trigger_sensors(changed))
+                    self.metrics.observe_tick(time.perf_counter() - tick_start)
+            
+            # Lejárt időzítések
+            self.run_timers()
             
-            # Állapot megjelenítése
-            self.status_report()
+            # Állapot megjelenítése a megjelenítő szálon
+            if self.status_renderer:
+                self.status_renderer.notify()
             
-            # Várunk egy kicsit a következő frissítésig
-            time.sleep(2)
+            # Lekérdezéses módban várunk a következő esedékes szenzorig
+            if not subscribed:
+                time.sleep(self._poll_delay())
+        
+        if subscribed:
+            self.pt_interface.unsubscribe()
+    
+    def _create_poll_scheduler(self):
+        """
+        Létrehozza a lekérdezési ütemezőt a felderített szenzorokkal.
+        """
+        scheduler = SensorPollScheduler(base_interval=self.poll_interval)
+        for device_id, device in self.pt_interface.device_registry.items():
+            if "sensor" in device.get("type", ""):
+                scheduler.add(device_id, device["type"], now=self.clock())
+        # A szenzorértékek utolsó lekérdezéskori állapota (az adaptív időközhöz)
+        self.polled_values = {}
+        return scheduler
+    
+    def _reschedule_polled(self, device_ids):
+        """
+        Újraütemezi a lekérdezett szenzorokat aszerint, hogy változott-e az értékük.
+        """
+        registry = self.pt_interface.device_registry
+        changed = []
+        for device_id in device_ids:
+            device = registry.get(device_id)
+            value = device.get("value") if device else None
+            if self.polled_values.get(device_id) != value:
+                changed.append(device_id)
+            self.polled_values[device_id] = value
+        self.poll_scheduler.reschedule(device_ids, changed, self.clock())
+    
+    def _poll_delay(self):
+        """
+        A következő esedékes lekérdezésig vagy időzített határidőig
+        hátralévő idő (a leállítás érdekében legfeljebb EVENT_WAIT_SLICE).
+        """
+        deadlines = [deadline for deadline in (self.poll_scheduler.next_due(), self.timers.next_deadline())
+                     if deadline is not None]
+        if not deadlines:
+            return self.EVENT_WAIT_SLICE
+        return max(0.0, min(min(deadlines) - self.clock(), self.EVENT_WAIT_SLICE))
     
     def status_report(self):
         """
@@ -400,21 +4368,200 @@ class SmartHomeController:
         print("\nSzenzorok:")
         for device_id, device in self.devices.items():
             if "sensor" in device["type"]:
-                print(f"  - {device['name']}: {device['value']}")
+                print(f"  - {StatusRenderer.format_device(device)}")
         
         print("\nEszközök:")
         for device_id, device in self.devices.items():
             if "sensor" not in device["type"]:
-                status_text = "BE" if device.get("status", False) else "KI"
-                extra_info = ""
-                if device["type"] == "ac":
-                    extra_info = f", {device.get('temp', 22)}°C"
-                elif device["type"] == "fan":
-                    extra_info = f", Sebesség: {device.get('speed', 0)}"
-                print(f"  - {device['name']}: {status_text}{extra_info}")
+                print(f"  - {StatusRenderer.format_device(device)}")
         
         print("-----------------------------------")
 
+class AsyncSmartHomeController(SmartHomeController):
+    """
+    Eseményhurkon futó okos otthon vezérlő az AsyncPacketTracerInterface
+    fölött. Az egy ütemben kiváltott automatizálások kérései párhuzamosan,
+    egyetlen kapcsolaton futnak.
+    """
+    def __init__(self, pt_interface, poll_interval=2.0, use_push=True,
+                 report_interval=2.0, compact_report=False, clock=None):
+        super().__init__(pt_interface, poll_interval, use_push, report_interval, compact_report, clock)
+        self.update_task = None
+        self.reconcile_task = None
+    
+    async def initialize(self, snapshot_path=None):
+        """
+        Inicializálja a vezérlőt és felfedezi az eszközöket; pillanatképből
+        indulva az egyeztetés háttér taskként fut.
+        """
+        if snapshot_path and self.pt_interface.load_snapshot(snapshot_path):
+            self.devices = self.pt_interface.device_registry
+            self.setup_routines()
+            self.reconcile_task = asyncio.create_task(self._reconcile_registry(snapshot_path))
+            return len(self.devices) > 0
+        
+        if not self.pt_interface.connected:
+            await self.pt_interface.connect()
+        
+        self.devices = await self.pt_interface.discover_devices()
+        if snapshot_path and self.devices:
+            self.pt_interface.save_snapshot(snapshot_path)
+        self.setup_routines()
+        return len(self.devices) > 0
+    
+    async def _reconcile_registry(self, snapshot_path):
+        """
+        Kapcsolódás és a pillanatkép egyeztetése a gateway-jel a háttérben.
+        """
+        if not self.pt_interface.connected and not await self.pt_interface.connect():
+            return
+        if await self.pt_interface.fetch_device_changes():
+            self.pt_interface.save_snapshot(snapshot_path)
+    
+    async def check_routines(self, changed_ids=None, refresh=False):
+        """
+        Ellenőrzi az automatizálásokat, és a kiváltottakat összevonva hajtja végre.
+        """
+        if refresh:
+            await self.pt_interface.get_device_states(self._trigger_sensor_ids())
+        
+        routines = self._triggered_routines(changed_ids)
+        if routines:
+            await self.execute_routines(routines)
+    
+    async def execute_routine(self, routine):
+        """
+        Automatizálás végrehajtása.
+        """
+        await self.execute_routines([routine])
+    
+    async def execute_routines(self, routines):
+        """
+        Egy ütemben kiváltott automatizálások összevont végrehajtása.
+        """
+        for routine in routines:
+            log.info("routine_executed", "Automatizálás végrehajtása: {routine}", routine=routine['name'])
+            self.metrics.routine_fired(routine["name"])
+        self._schedule_follow_ups(routines, self.clock())
+        states = self._merge_actions(routines)
+        urgent = self._split_urgent(routines, states)
+        # A biztonsági parancsok kiküldése nem várja meg a többiekét
+        requests = [self._actuate(states)] if states else []
+        if urgent:
+            requests.insert(0, self._actuate(urgent, priority=True))
+        await asyncio.gather(*requests)
+    
+    async def _actuate(self, states, priority=False):
+        """
+        Állapotok kiküldése az eredmények nyomon követésével.
+        """
+        self._forget_rejections(states)
+        if priority:
+            results = await self.pt_interface.set_device_states(states, priority=True)
+        else:
+            results = await self.pt_interface.set_device_states(states)
+        self._track_results(states, results, priority)
+        return results
+    
+    async def run_timers(self):
+        """
+        A lejárt időzített automatizálások, késleltetett műveletek és
+        újraküldések végrehajtása.
+        """
+        routines, states, urgent = self._due_timers(self.clock())
+        if urgent:
+            await self._actuate(urgent, priority=True)
+        if routines:
+            await self.execute_routines(routines)
+        if states:
+            await self._actuate(states)
+    
+    async def control_device(self, device_id, command):
+        """
+        Eszköz vezérlése.
+        """
+        return await self.pt_interface.set_device_state(device_id, command)
+    
+    def start_monitoring(self):
+        """
+        Elindítja a rendszer monitorozását a futó eseményhurkon.
+        """
+        if self.running:
+            log.warning("monitoring_already_running", "A monitorozás már fut!")
+            return
+        
+        self.running = True
+        self._start_renderer()
+        self.update_task = asyncio.get_running_loop().create_task(self._monitoring_loop())
+        log.info("monitoring_started", "Rendszermonitorozás elindítva")
+    
+    def stop_monitoring(self):
+        """
+        Leállítja a rendszer monitorozását.
+        """
+        self.running = False
+        if self.update_task:
+            self.update_task.cancel()
+            self.update_task = None
+        self._stop_renderer()
+        log.info("monitoring_stopped", "Rendszermonitorozás leállítva")
+    
+    async def _monitoring_loop(self):
+        """
+        A monitorozás háttérfolyamata.
+        """
+        if self.reconcile_task is not None:
+            await self.reconcile_task
+        
+        subscribed = self.use_push and await self.pt_interface.subscribe()
+        if self.use_push and not subscribed:
+            self.subscribe_backoff.failure()
+        self.poll_scheduler = self._create_poll_scheduler()
+        
+        if subscribed:
+            await self.pt_interface.update_sensor_values()
+            await self.check_routines()
+        
+        while self.running:
+            if subscribed:
+                changed = await self.pt_interface.wait_for_events(timeout=self._wait_timeout())
+                if changed is None:
+                    log.warning("subscription_lost", "A feliratkozás megszakadt, lekérdezéses módra váltunk")
+                    subscribed = False
+                    continue
+                if changed or self.pending_routines:
+                    tick_start = time.perf_counter()
+                    await self.check_routines(changed)
+                    self.metrics.observe_tick(time.perf_counter() - tick_start)
+            else:
+                if self.use_push and self.subscribe_backoff.ready():
+                    if await self.pt_interface.subscribe():
+                        self.subscribe_backoff.success()
+                        subscribed = True
+                        await self.pt_interface.update_sensor_values()
+                        await self.check_routines()
+                        continue
+                    self.subscribe_backoff.failure()
+                
+                due_ids = self.poll_scheduler.pop_due(self.clock())
+                if due_ids:
+                    tick_start = time.perf_counter()
+                    changed = await self.pt_interface.update_sensor_changes(due_ids)
+                    if changed is None:
+                        await self.pt_interface.update_sensor_values(due_ids)
+                        changed = due_ids
+                    self._reschedule_polled(due_ids)
+                    await self.check_routines(self._changed_trigger_sensors(changed))
+                    self.metrics.observe_tick(time.perf_counter() - tick_start)
+            
+            await self.run_timers()
+            
+            if self.status_renderer:
+                self.status_renderer.notify()
+            
+            if not subscribed:
+                await asyncio.sleep(self._poll_delay())
+
 # --------------------------
 # Felhasználói Interfész
 # --------------------------
@@ -423,6 +4570,8 @@ def interactive_menu(controller):
     Interaktív parancssori menü a rendszer vezérléséhez.
     """
     while True:
+        # A háttérben naplózott üzenetek a menü előtt jelenjenek meg
+        log.flush(timeout=0.2)
         print("\n===== Okos Otthon Vezérlő =====")
         print("1. Eszközök listázása")
         print("2. Eszköz vezérlése")
@@ -481,7 +4630,13 @@ def interactive_menu(controller):
             print("\nBeállított automatizálások:")
             for idx, routine in enumerate(controller.routines, 1):
                 trigger = routine["trigger"]
-                trigger_text = f"{trigger['device_id']} {trigger['condition']} {trigger['value']}"
+                if ConditionNetwork.handles(trigger):
+                    trigger_text = ConditionNetwork.describe(trigger)
+                elif trigger.get("type") == "time":
+                    trigger_text = "időzítés: " + ", ".join(
+                        f"{key}={trigger[key]}" for key in ("at", "days", "cron", "every") if key in trigger)
+                else:
+                    trigger_text = f"{trigger['device_id']} {trigger['condition']} {trigger['value']}"
                 action_count = len(routine["actions"])
                 print(f"{idx}. {routine['name']} - Ha {trigger_text}, akkor {action_count} művelet")
         
@@ -628,6 +4783,13 @@ def simulation_test(controller):
 # --------------------------
 # Főprogram
 # --------------------------
+# Az eszköznyilvántartás pillanatképe a gyors újraindításhoz (a script
+# melletti data könyvtárban, nem az aktuális könyvtárban)
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+REGISTRY_SNAPSHOT = os.path.join(DATA_DIR, "device_registry_snapshot.json")
+# A Prometheus formátumú mérőszám-végpont portja
+METRICS_PORT = 9108
+
 def main():
     print("=== Okos Otthon Vezérlő Python Program ===")
     print("Ez a program a Cisco Packet Tracer-rel együttműködve")
@@ -636,12 +4798,16 @@ def main():
     
     # Packet Tracer interfész létrehozása
     pt_interface = PacketTracerInterface()
+    # Szenzor előzmények rögzítése (trendekhez, átlagokhoz)
+    pt_interface.enable_history()
+    # Mérőszámok lekérdezhetősége (http://127.0.0.1:9108/metrics)
+    pt_interface.metrics.start_server(METRICS_PORT)
     
     # Smart Home vezérlő létrehozása
     controller = SmartHomeController(pt_interface)
     
-    # Rendszer inicializálása
-    if controller.initialize():
+    # Rendszer inicializálása (pillanatképből, ha van korábbi)
+    if controller.initialize(snapshot_path=REGISTRY_SNAPSHOT):
         print(f"Rendszer inicializálva, {len(controller.devices)} eszköz felderítve")
         
         # Interaktív menü indítása
@@ -650,6 +4816,7 @@ def main():
         print("Nem sikerült inicializálni a rendszert!")
     
     # Kapcsolat lezárása
+    pt_interface.metrics.stop_server()
     pt_interface.close()
 
 if __name__ == "__main__":
@@ -0,0 +1,505 @@
+import argparse
+import heapq
+import json
+import random
+import socket
+import socketserver
+import threading
+import time
+
+from SmartHome_script import BinaryProtocol, FrameDecoder
+
+# --------------------------
+# Szintetikus eszközök
+# --------------------------
+# Eszköztípus -> (azonosító előtag, megjelenítendő név, kezdeti állapot)
+DEVICE_TYPES = {
+    "temp_sensor": ("IoT:Sensor:Temp", "Hőmérséklet szenzor", {"value": 22.0}),
+    "motion_sensor": ("IoT:Sensor:Motion", "Mozgásérzékelő", {"value": False}),
+    "smoke_sensor": ("IoT:Sensor:Smoke", "Füstérzékelő", {"value": False}),
+    "light": ("IoT:Light", "Lámpa", {"status": False}),
+    "fan": ("IoT:Fan", "Ventilátor", {"status": False, "speed": 0}),
+    "ac": ("IoT:AC", "Klíma", {"status": False, "temp": 22}),
+}
+
+def generate_devices(count):
+    """
+    count darab szintetikus eszköz létrehozása a vezérlő által ismert
+    típusokból, körbeforgó sorrendben. Az azonosítók 1-től számozódnak,
+    így az alapértelmezett automatizálások eszközei is léteznek.
+    """
+    devices = {}
+    type_names = list(DEVICE_TYPES)
+    for idx in range(count):
+        device_type = type_names[idx % len(type_names)]
+        number = idx // len(type_names) + 1
+        prefix, name, initial_state = DEVICE_TYPES[device_type]
+        device = {"type": device_type, "name": f"{name} {number}"}
+        device.update(initial_state)
+        devices[f"{prefix}:{number}"] = device
+    return devices
+
+# --------------------------
+# Késleltetett válaszküldés
+# --------------------------
+class DelayedSender:
+    """
+    Kapcsolatonkénti küldő szál. Minden üzenet a beállított késleltetés
+    (és véletlen ingadozás) leteltével megy ki, így az egymás után
+    érkező kérések válaszai egymással párhuzamosan "utaznak". A küldési
+    sorrend megegyezik a beérkezési sorrenddel.
+    """
+    def __init__(self, sock, latency=0.0, jitter=0.0, split_size=0, rng=None, length_prefixed=False):
+        self.socket = sock
+        # A kapcsolat keretezése és kódolása (HELLO után változhat)
+        self.length_prefixed = length_prefixed
+        self.binary = False
+        self.latency = latency
+        self.jitter = jitter
+        self.split_size = split_size
+        self.rng = rng or random.Random()
+        self.queue = []
+        self.sequence = 0
+        self.last_due = 0.0
+        self.closed = False
+        self.bytes_sent = 0
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self._send_loop)
+        self.thread.daemon = True
+        self.thread.start()
+
+    def send(self, data):
+        """
+        Üzenet ütemezése küldésre.
+        """
+        delay = self.latency
+        if self.jitter:
+            delay = max(0.0, delay + self.rng.uniform(-self.jitter, self.jitter))
+        with self.condition:
+            due = max(time.time() + delay, self.last_due)
+            self.last_due = due
+            self.sequence += 1
+            heapq.heappush(self.queue, (due, self.sequence, data))
+            self.condition.notify()
+
+    def close(self):
+        """
+        A küldő szál leállítása.
+        """
+        with self.condition:
+            self.closed = True
+            self.condition.notify()
+
+    def _send_loop(self):
+        """
+        Az esedékes üzenetek kiküldése.
+        """
+        while True:
+            with self.condition:
+                while not self.closed and (not self.queue or self.queue[0][0] > time.time()):
+                    timeout = self.queue[0][0] - time.time() if self.queue else None
+                    self.condition.wait(timeout)
+                if self.closed:
+                    return
+                _, _, data = heapq.heappop(self.queue)
+            try:
+                self._write(data)
+            except OSError:
+                return
+
+    def _write(self, data):
+        """
+        Az üzenet kiírása, split_size megadásakor több darabban.
+        """
+        if not self.split_size:
+            self.socket.sendall(data)
+        else:
+            for start in range(0, len(data), self.split_size):
+                self.socket.sendall(data[start:start + self.split_size])
+        self.bytes_sent += len(data)
+
+# --------------------------
+# Gateway szimulátor
+# --------------------------
+class GatewaySimulator:
+    """
+    A Packet Tracer Registration Server helyettesítője. Ugyanazt a
+    protokollt beszéli, mint amit a PacketTracerInterface és az
+    AsyncPacketTracerInterface használ (GET_DEVICES, GET_STATE(S),
+    SET_STATE(S), GET_SENSOR_VALUES, SUBSCRIBE, GET_DEVICE_CHANGES,
+    request_id-s aszinkron kérések, HELLO-val egyeztetett bináris
+    kódolás), állítható késleltetéssel, ingadozással, darabolással és
+    szenzorváltozási gyakorisággal. binary=False esetén a régi, csak JSON-t
+    ismerő gateway-t utánozza, delta=False esetén pedig a növekményes
+    szenzorlekérdezést (GET_SENSOR_CHANGES) nem ismerő gateway-t.
+    """
+    def __init__(self, device_count=30, host='127.0.0.1', port=5000, latency=0.0,
+                 jitter=0.0, split_size=0, change_rate=0.0, length_prefixed=False, seed=None,
+                 binary=True, delta=True):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.split_size = split_size
+        self.change_rate = change_rate
+        self.length_prefixed = length_prefixed
+        self.binary = binary
+        self.delta = delta
+        self.rng = random.Random(seed)
+
+        self.devices = generate_devices(device_count)
+        # Bináris kódoláshoz: eszközönként egy állandó egész handle
+        self.handle_ids = list(self.devices)
+        self.handles = {device_id: handle for handle, device_id in enumerate(self.handle_ids)}
+        self.lock = threading.RLock()
+        # Nyilvántartás verziója és eszközönként az utolsó változás verziója
+        self.version = 0
+        self.device_versions = {device_id: 0 for device_id in self.devices}
+        # Szenzorváltozások a változás sorrendjében (azonosító -> verzió),
+        # szenzoronként csak a legutolsó; a futásazonosító újraindításkor változik
+        self.sensor_changes = {}
+        self.epoch = f"{time.time_ns():x}"
+        self.subscribers = []
+        # Megfigyelők: callback(device_id, state, timestamp) minden beállított állapotra
+        self.state_listeners = []
+        self.command_counts = {}
+        self.bytes_received = 0
+        self.senders = []
+
+        self.server = None
+        self.server_thread = None
+        self.change_thread = None
+        self.running = False
+
+    def start(self):
+        """
+        A szimulátor indítása háttérszálakon. Visszaadja a tényleges portot
+        (port=0 esetén az operációs rendszer választ).
+        """
+        simulator = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                simulator._handle_connection(self.request)
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer((self.host, self.port), Handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.running = True
+
+        self.server_thread = threading.Thread(target=self.server.serve_forever)
+        self.server_thread.daemon = True
+        self.server_thread.start()
+
+        if self.change_rate > 0:
+            self.change_thread = threading.Thread(target=self._change_loop)
+            self.change_thread.daemon = True
+            self.change_thread.start()
+
+        print(f"Gateway szimulátor elindítva: {self.host}:{self.port}, {len(self.devices)} eszköz")
+        return self.port
+
+    def stop(self):
+        """
+        A szimulátor leállítása.
+        """
+        self.running = False
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+        for sender in list(self.senders):
+            sender.close()
+            # A kliensek is érzékeljék a leállást, mint egy valódi gateway kiesésekor
+            try:
+                sender.socket.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+        print("Gateway szimulátor leállítva")
+
+    def set_sensor_value(self, device_id, value):
+        """
+        Egy szenzor értékének beállítása; a feliratkozottak eseményt kapnak.
+        """
+        with self.lock:
+            self.devices[device_id]["value"] = value
+            self._bump_version(device_id)
+            self.sensor_changes.pop(device_id, None)
+            self.sensor_changes[device_id] = self.version
+            subscribers = list(self.subscribers)
+        event = {"event": "SENSOR_CHANGED", "device_id": device_id, "value": value}
+        for sender, request_id in subscribers:
+            self._send_message(sender, event)
+
+    def random_sensor_change(self):
+        """
+        Egy véletlenszerű szenzor értékének megváltoztatása a típusának
+        megfelelően (hőmérséklet: véletlen bolyongás, a többi: átbillenés).
+        """
+        with self.lock:
+            sensors = [device_id for device_id, device in self.devices.items()
+                       if "sensor" in device["type"]]
+            if not sensors:
+                return None
+            device_id = self.rng.choice(sensors)
+            device = self.devices[device_id]
+            if device["type"] == "temp_sensor":
+                value = round(device["value"] + self.rng.uniform(-1.0, 1.0), 1)
+            else:
+                value = not device["value"]
+        self.set_sensor_value(device_id, value)
+        return device_id
+
+    def _change_loop(self):
+        """
+        Szenzorváltozások generálása change_rate/másodperc átlagos gyakorisággal.
+        """
+        while self.running:
+            time.sleep(self.rng.expovariate(self.change_rate))
+            if self.running:
+                self.random_sensor_change()
+
+    def _bump_version(self, device_id):
+        """
+        A nyilvántartás verziójának növelése egy eszköz változásakor.
+        """
+        self.version += 1
+        self.device_versions[device_id] = self.version
+
+    def _handle_connection(self, sock):
+        """
+        Egy kliens kapcsolat kiszolgálása a lezárásig.
+        """
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        sender = DelayedSender(sock, self.latency, self.jitter, self.split_size, self.rng, self.length_prefixed)
+        self.senders.append(sender)
+        decoder = FrameDecoder(length_prefixed=self.length_prefixed)
+        try:
+            while self.running:
+                data = sock.recv(65536)
+                if not data:
+                    break
+                self.bytes_received += len(data)
+                decoder.feed(data)
+                for frame in decoder.frames():
+                    # A bináris keretekből nem szabad "szóközt" levágni
+                    if not decoder.length_prefixed:
+                        frame = frame.strip()
+                    if frame:
+                        self._handle_frame(frame, sender)
+                    # Egy HELLO után a kapcsolat keretezése megváltozhat
+                    decoder.length_prefixed = sender.length_prefixed
+        except OSError:
+            pass
+        finally:
+            with self.lock:
+                self.subscribers = [(subscriber, request_id) for subscriber, request_id in self.subscribers
+                                    if subscriber is not sender]
+            sender.close()
+            self.senders.remove(sender)
+
+    def _handle_frame(self, frame, sender):
+        """
+        Egy beérkezett parancs feldolgozása és a válasz ütemezése.
+        """
+        if sender.binary and frame[0] == BinaryProtocol.SENSOR_REQUEST:
+            self._count("GET_SENSOR_VALUES")
+            request_id, handles = BinaryProtocol.decode_sensor_request(frame)
+            device_ids = None
+            if handles is not None:
+                device_ids = [self.handle_ids[handle] for handle in handles if handle < len(self.handle_ids)]
+            values = self._sensor_values(device_ids)
+            self._send_frame(sender, BinaryProtocol.encode_sensor_values(values, self.handles, request_id))
+            return
+
+        if frame == b"GET_DEVICES":
+            self._count("GET_DEVICES")
+            with self.lock:
+                lines = [f"{device_id}:{json.dumps(device)}" for device_id, device in self.devices.items()]
+            self._send_raw(sender, ("\n".join(lines) + "\n\n").encode('utf-8'))
+            return
+
+        try:
+            command = json.loads(frame)
+        except json.JSONDecodeError:
+            self._send_raw(sender, b"ERROR invalid command\n")
+            return
+
+        name = command.get("command")
+        self._count(name)
+        request_id = command.get("request_id")
+        handler = getattr(self, f"_command_{str(name).lower()}", None)
+        if handler is None:
+            result, terminator = "ERROR unknown command", b"\n"
+        else:
+            result, terminator = handler(command, sender, request_id)
+
+        if request_id is not None:
+            self._send_message(sender, {"request_id": request_id, "result": result})
+        elif isinstance(result, str):
+            self._send_raw(sender, result.encode('utf-8') + terminator)
+        else:
+            self._send_raw(sender, json.dumps(result).encode('utf-8') + terminator)
+
+        # A HELLO válasz még a régi keretezéssel ment ki, innentől bináris
+        if name == "HELLO" and isinstance(result, dict) and result.get("encoding") == BinaryProtocol.NAME:
+            sender.binary = True
+            sender.length_prefixed = True
+
+    def _send_message(self, sender, message):
+        """
+        Egy JSON üzenet küldése egy sorban.
+        """
+        self._send_raw(sender, json.dumps(message).encode('utf-8') + b"\n")
+
+    def _send_raw(self, sender, data):
+        """
+        Nyers válasz küldése, hosszelőtagos módban keretezve.
+        """
+        if sender.length_prefixed:
+            data = FrameDecoder(length_prefixed=True).encode(data.rstrip(b"\n"))
+        sender.send(data)
+
+    def _send_frame(self, sender, frame):
+        """
+        Bináris keret küldése hosszelőtaggal (a tartalmához nem nyúl).
+        """
+        sender.send(FrameDecoder.LENGTH_PREFIX.pack(len(frame)) + frame)
+
+    def _count(self, name):
+        """
+        Parancsszámláló növelése.
+        """
+        with self.lock:
+            self.command_counts[name] = self.command_counts.get(name, 0) + 1
+
+    def _command_get_devices(self, command, sender, request_id):
+        with self.lock:
+            return json.loads(json.dumps(self.devices)), b"\n"
+
+    def _command_get_state(self, command, sender, request_id):
+        with self.lock:
+            device = self.devices.get(command.get("device_id"))
+            return (dict(device) if device else "ERROR unknown device"), b"\n"
+
+    def _command_get_states(self, command, sender, request_id):
+        with self.lock:
+            return {device_id: dict(self.devices[device_id])
+                    for device_id in command.get("device_ids", []) if device_id in self.devices}, b"\n"
+
+    def _command_set_state(self, command, sender, request_id):
+        ok = self._set_state(command.get("device_id"), command.get("state"))
+        return ("OK" if ok else "ERROR unknown device"), b"\n"
+
+    def _command_set_states(self, command, sender, request_id):
+        results = {}
+        for device_id, state in command.get("states", {}).items():
+            results[device_id] = "OK" if self._set_state(device_id, state) else "ERROR unknown device"
+        return results, b"\n"
+
+    def _command_get_sensor_values(self, command, sender, request_id):
+        return self._sensor_values(command.get("device_ids")), b"\n\n"
+
+    def _command_get_sensor_changes(self, command, sender, request_id):
+        if not self.delta:
+            return "ERROR unknown command", b"\n"
+        since = command.get("since")
+        # Opcionális szűrő: csak a felsorolt szenzorok változásai
+        device_ids = command.get("device_ids")
+        wanted = None if device_ids is None else set(device_ids)
+        with self.lock:
+            # Ismeretlen kiindulópont (első kérés, újraindult gateway): teljes lista
+            if since is None or command.get("epoch") != self.epoch or since > self.version:
+                return {"epoch": self.epoch, "sequence": self.version, "full": True,
+                        "values": self._sensor_values(device_ids)}, b"\n"
+            # A legutóbbi változásoktól visszafelé, az első régebbiig
+            values = {}
+            for device_id in reversed(self.sensor_changes):
+                if self.sensor_changes[device_id] <= since:
+                    break
+                if wanted is None or device_id in wanted:
+                    values[device_id] = self.devices[device_id]["value"]
+            return {"epoch": self.epoch, "sequence": self.version, "full": False, "values": values}, b"\n"
+
+    def _command_hello(self, command, sender, request_id):
+        if not self.binary:
+            return "ERROR unknown command", b"\n"
+        encoding = BinaryProtocol.NAME if BinaryProtocol.NAME in command.get("encodings", []) else "json"
+        return {"encoding": encoding}, b"\n"
+
+    def _command_get_handles(self, command, sender, request_id):
+        return dict(self.handles), b"\n"
+
+    def _sensor_values(self, device_ids=None):
+        """
+        A felsorolt (None esetén az összes) szenzor aktuális értéke.
+        """
+        with self.lock:
+            if device_ids is None:
+                device_ids = self.devices
+            return {device_id: self.devices[device_id]["value"] for device_id in device_ids
+                    if device_id in self.devices and "value" in self.devices[device_id]}
+
+    def _command_subscribe(self, command, sender, request_id):
+        with self.lock:
+            self.subscribers.append((sender, request_id))
+        return "OK", b"\n"
+
+    def _command_get_device_changes(self, command, sender, request_id):
+        since = command.get("since")
+        with self.lock:
+            changed = {device_id: dict(device) for device_id, device in self.devices.items()
+                       if since is None or self.device_versions[device_id] > since}
+            return {"version": self.version, "changed": changed, "removed": []}, b"\n"
+
+    def _set_state(self, device_id, state):
+        """
+        Egy eszköz állapotának beállítása és a megfigyelők értesítése.
+        """
+        timestamp = time.time()
+        with self.lock:
+            device = self.devices.get(device_id)
+            if device is None:
+                return False
+            if isinstance(state, dict):
+                device.update(state)
+            else:
+                device["status"] = state
+            self._bump_version(device_id)
+        for listener in self.state_listeners:
+            listener(device_id, state, timestamp)
+        return True
+
+# --------------------------
+# Főprogram
+# --------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Packet Tracer gateway szimulátor")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5000)
+    parser.add_argument("--devices", type=int, default=30, help="szintetikus eszközök száma")
+    parser.add_argument("--latency", type=float, default=0.0, help="válaszkésleltetés másodpercben")
+    parser.add_argument("--jitter", type=float, default=0.0, help="késleltetés ingadozása másodpercben")
+    parser.add_argument("--split", type=int, default=0, help="válaszok darabolása ennyi bájtonként")
+    parser.add_argument("--change-rate", type=float, default=0.0, help="szenzorváltozás / másodperc")
+    parser.add_argument("--length-prefixed", action="store_true", help="hosszelőtagos keretezés")
+    parser.add_argument("--json-only", action="store_true", help="bináris kódolás nélküli, régi gateway")
+    parser.add_argument("--no-delta", action="store_true", help="növekményes szenzorlekérdezés nélküli gateway")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    simulator = GatewaySimulator(
+        device_count=args.devices, host=args.host, port=args.port, latency=args.latency,
+        jitter=args.jitter, split_size=args.split, change_rate=args.change_rate,
+        length_prefixed=args.length_prefixed, seed=args.seed, binary=not args.json_only,
+        delta=not args.no_delta)
+    simulator.start()
+
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        simulator.stop()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+import argparse
+import asyncio
+import contextlib
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import time
+
+from SmartHome_script import AsyncPacketTracerInterface, AsyncSmartHomeController, Metrics, log
+
+# --------------------------
+# Otthonok szétosztása
+# --------------------------
+def load_gateways(path):
+    """
+    A gateway-lista betöltése egy JSON fájlból. Minden elem egy
+    {"name": ..., "host": ..., "port": ...} szótár; a név elhagyható.
+    """
+    with open(path, encoding="utf-8") as gateway_file:
+        gateways = json.load(gateway_file)
+    for gateway in gateways:
+        gateway.setdefault("host", "127.0.0.1")
+        gateway.setdefault("port", 5000)
+        gateway.setdefault("name", f"{gateway['host']}:{gateway['port']}")
+    return gateways
+
+def shard_gateways(gateways, shard_count):
+    """
+    A gateway-ek körbeforgó szétosztása shard_count shardra.
+    """
+    return [gateways[idx::shard_count] for idx in range(shard_count)]
+
+# --------------------------
+# Shard munkafolyamat
+# --------------------------
+async def start_home(gateway, previous=None):
+    """
+    Egy otthon vezérlőjének elindítása. Újraindításkor az előző vezérlő
+    mérőszámait átveszi, hogy a számlálók ne nullázódjanak.
+    """
+    pt_interface = AsyncPacketTracerInterface(gateway["host"], gateway["port"])
+    pt_interface.metrics.labels["home"] = gateway["name"]
+    if previous is not None:
+        pt_interface.metrics.merge_snapshot(previous.pt_interface.metrics.snapshot())
+
+    controller = AsyncSmartHomeController(
+        pt_interface, poll_interval=gateway.get("poll_interval", 2.0), report_interval=None)
+    if await controller.initialize():
+        controller.start_monitoring()
+    return controller
+
+async def stop_home(controller):
+    """
+    Egy otthon vezérlőjének leállítása.
+    """
+    controller.stop_monitoring()
+    await controller.pt_interface.close()
+
+def home_healthy(controller):
+    """
+    Egy otthon akkor egészséges, ha fut a monitorozása. A megszakadt
+    kapcsolatot az interfész maga építi újra, ezért egy átmeneti kiesés
+    miatt nem indítjuk újra az otthont.
+    """
+    task = controller.update_task
+    return task is not None and not task.done()
+
+def home_report(controller):
+    """
+    Egy otthon állapota és mérőszámai a felügyelőnek.
+    """
+    return {
+        "connected": controller.pt_interface.connected,
+        "monitoring": home_healthy(controller),
+        "devices": len(controller.pt_interface.device_registry),
+        "metrics": controller.pt_interface.metrics.snapshot(),
+    }
+
+async def run_homes(shard_index, gateways, reports, report_interval):
+    """
+    Egy shard összes otthonának futtatása egyetlen eseményhurkon. A nem
+    egészséges otthonokat minden jelentés előtt újraindítja.
+    """
+    controllers = {}
+    try:
+        while True:
+            failed = [gateway for gateway in gateways
+                      if gateway["name"] not in controllers or not home_healthy(controllers[gateway["name"]])]
+            for gateway in failed:
+                if gateway["name"] in controllers:
+                    await stop_home(controllers[gateway["name"]])
+            started = await asyncio.gather(*(start_home(gateway, controllers.get(gateway["name"]))
+                                             for gateway in failed))
+            for gateway, controller in zip(failed, started):
+                controllers[gateway["name"]] = controller
+
+            reports.put({
+                "shard": shard_index,
+                "pid": os.getpid(),
+                "time": time.time(),
+                "homes": {name: home_report(controller) for name, controller in controllers.items()},
+            })
+            await asyncio.sleep(report_interval)
+    finally:
+        for controller in controllers.values():
+            await stop_home(controller)
+
+def run_shard(shard_index, gateways, reports, report_interval, verbose=False):
+    """
+    Egy shard folyamat belépési pontja. A vezérlők konzolkimenete
+    alapértelmezésben el van nyelve (a felügyelő fej nélkül fut), a
+    figyelmeztetések és hibák JSON naplóként a standard hibakimenetre kerülnek.
+    """
+    with contextlib.ExitStack() as stack:
+        if not verbose:
+            log.configure(level="WARNING", format="json", stream=sys.stderr)
+            devnull = stack.enter_context(open(os.devnull, "w"))
+            stack.enter_context(contextlib.redirect_stdout(devnull))
+        try:
+            asyncio.run(run_homes(shard_index, gateways, reports, report_interval))
+        except KeyboardInterrupt:
+            pass
+
+# --------------------------
+# Felügyelő
+# --------------------------
+class SupervisorMetrics(Metrics):
+    """
+    A shardok által jelentett mérőszámok összesítése, kiegészítve az
+    otthonok és shardok állapotával. A /metrics végpont ezt szolgálja ki.
+    """
+    def __init__(self, supervisor):
+        super().__init__()
+        self.supervisor = supervisor
+
+    def prometheus_text(self):
+        """
+        Az összesített mérőszámok és az állapotjelzők Prometheus formátumban.
+        """
+        prefix = self.PREFIX
+        lines = [self.supervisor.aggregate_metrics().prometheus_text().rstrip("\n")]
+        health = self.supervisor.health()
+
+        lines.append(f"# HELP {prefix}_shard_up A shard folyamat fut és időben jelent")
+        lines.append(f"# TYPE {prefix}_shard_up gauge")
+        for shard in health["shards"]:
+            lines.append(f"{prefix}_shard_up{self._label_text(shard=shard['shard'])} {int(shard['healthy'])}")
+        lines.append(f"# HELP {prefix}_shard_restarts_total A shard folyamat újraindításai")
+        lines.append(f"# TYPE {prefix}_shard_restarts_total counter")
+        for shard in health["shards"]:
+            lines.append(f"{prefix}_shard_restarts_total{self._label_text(shard=shard['shard'])} {shard['restarts']}")
+        lines.append(f"# HELP {prefix}_home_up Az otthon kapcsolódva van és fut a monitorozása")
+        lines.append(f"# TYPE {prefix}_home_up gauge")
+        for name, home in sorted(health["homes"].items()):
+            lines.append(f"{prefix}_home_up{self._label_text(home=name)} {int(home['monitoring'])}")
+        return "\n".join(lines) + "\n"
+
+
+class HomeSupervisor:
+    """
+    Sok otthon vezérlőjének futtatása folyamatokra osztva. A gateway-eket
+    legfeljebb processes darab shardra osztja (alapértelmezésben ahány
+    processzormag van), és minden shard egy külön folyamatban, egyetlen
+    eseményhurkon futtatja az otthonai AsyncSmartHomeController-eit, így
+    az áteresztés a magok számával skálázódik. A shardok report_interval
+    másodpercenként jelentenek; a leállt vagy heartbeat_timeout ideig
+    nem jelentő shardot (növekvő várakozással) újraindítja.
+    """
+    # Az újraindítás előtti várakozás felső korlátja másodpercben
+    MAX_RESTART_DELAY = 60.0
+
+    def __init__(self, gateways, processes=None, report_interval=5.0,
+                 heartbeat_timeout=None, restart_delay=1.0, verbose=False):
+        self.gateways = gateways
+        shard_count = max(1, min(processes or os.cpu_count() or 1, len(gateways)))
+        self.shards = shard_gateways(gateways, shard_count)
+        self.report_interval = report_interval
+        self.heartbeat_timeout = heartbeat_timeout or max(30.0, 3 * report_interval)
+        self.restart_delay = restart_delay
+        self.verbose = verbose
+        self.context = multiprocessing.get_context()
+        self.reports = self.context.Queue()
+        self.workers = {}
+        # Shardonként: utolsó jelentés, utolsó életjel, újraindítások száma
+        self.last_reports = {}
+        self.last_seen = {}
+        self.restarts = {idx: 0 for idx in range(shard_count)}
+        # Az újraindításra váró shardok és az indítás legkorábbi ideje
+        self.restart_at = {}
+        self.metrics = SupervisorMetrics(self)
+        self.running = False
+
+    def start(self):
+        """
+        Az összes shard folyamat elindítása.
+        """
+        self.running = True
+        for shard_index in range(len(self.shards)):
+            self._spawn(shard_index)
+        print(f"Felügyelő elindítva: {len(self.gateways)} otthon, {len(self.shards)} shard")
+
+    def _spawn(self, shard_index):
+        """
+        Egy shard folyamat (újra)indítása.
+        """
+        process = self.context.Process(
+            target=run_shard,
+            args=(shard_index, self.shards[shard_index], self.reports, self.report_interval, self.verbose),
+            name=f"smarthome-shard-{shard_index}")
+        process.daemon = True
+        process.start()
+        self.workers[shard_index] = process
+        self.last_seen[shard_index] = time.time()
+
+    def receive_reports(self, timeout):
+        """
+        A shardok jelentéseinek begyűjtése legfeljebb timeout másodpercig.
+        """
+        deadline = time.time() + timeout
+        while True:
+            try:
+                report = self.reports.get(timeout=max(0.0, deadline - time.time()))
+            except queue.Empty:
+                return
+            self.last_reports[report["shard"]] = report
+            self.last_seen[report["shard"]] = time.time()
+
+    def check_shards(self):
+        """
+        A leállt vagy nem jelentő shardok újraindítása.
+        """
+        now = time.time()
+        for shard_index, process in list(self.workers.items()):
+            if shard_index in self.restart_at:
+                if now >= self.restart_at[shard_index]:
+                    del self.restart_at[shard_index]
+                    self.restarts[shard_index] += 1
+                    self._spawn(shard_index)
+                continue
+
+            if process.is_alive() and now - self.last_seen[shard_index] <= self.heartbeat_timeout:
+                continue
+            if process.is_alive():
+                print(f"A(z) {shard_index}. shard nem jelent, leállítjuk")
+                process.terminate()
+            else:
+                print(f"A(z) {shard_index}. shard leállt (kilépési kód: {process.exitcode})")
+            process.join(timeout=1.0)
+            self.last_reports.pop(shard_index, None)
+            delay = min(self.restart_delay * 2 ** self.restarts[shard_index], self.MAX_RESTART_DELAY)
+            self.restart_at[shard_index] = now + delay
+
+    def health(self):
+        """
+        A shardok és az otthonok állapota szótárként (lekérdező API).
+        """
+        now = time.time()
+        shards = []
+        homes = {}
+        for shard_index, gateways in enumerate(self.shards):
+            process = self.workers.get(shard_index)
+            report = self.last_reports.get(shard_index)
+            shards.append({
+                "shard": shard_index,
+                "pid": process.pid if process is not None else None,
+                "healthy": (process is not None and process.is_alive() and shard_index not in self.restart_at
+                            and now - self.last_seen.get(shard_index, 0) <= self.heartbeat_timeout),
+                "restarts": self.restarts[shard_index],
+                "homes": len(gateways),
+                "last_report_age": now - report["time"] if report else None,
+            })
+            for gateway in gateways:
+                home = report["homes"].get(gateway["name"]) if report else None
+                homes[gateway["name"]] = {
+                    "shard": shard_index,
+                    "connected": bool(home and home["connected"]),
+                    "monitoring": bool(home and home["monitoring"]),
+                    "devices": home["devices"] if home else 0,
+                    "tick_p99": home["metrics"]["tick"]["p99"] if home else None,
+                }
+        return {"shards": shards, "homes": homes}
+
+    def aggregate_metrics(self):
+        """
+        Az összes otthon legutóbb jelentett mérőszámainak összege.
+        """
+        total = Metrics()
+        for report in list(self.last_reports.values()):
+            for home in report["homes"].values():
+                total.merge_snapshot(home["metrics"])
+        return total
+
+    def print_health(self):
+        """
+        Egysoros állapotösszesítő a konzolra.
+        """
+        health = self.health()
+        healthy_shards = sum(shard["healthy"] for shard in health["shards"])
+        monitoring = sum(home["monitoring"] for home in health["homes"].values())
+        restarts = sum(shard["restarts"] for shard in health["shards"])
+        print(f"[{time.strftime('%H:%M:%S')}] Shardok: {healthy_shards}/{len(health['shards'])} fut, "
+              f"otthonok: {monitoring}/{len(health['homes'])} monitorozva, újraindítások: {restarts}")
+
+    def run(self, duration=None):
+        """
+        A felügyeleti ciklus: jelentések fogadása, shardok ellenőrzése és
+        report_interval másodpercenként állapotösszesítő. duration megadásakor
+        ennyi másodperc után leáll.
+        """
+        if not self.running:
+            self.start()
+        deadline = time.time() + duration if duration is not None else None
+        next_print = time.time() + self.report_interval
+        try:
+            while self.running and (deadline is None or time.time() < deadline):
+                self.receive_reports(timeout=min(1.0, self.report_interval))
+                self.check_shards()
+                if time.time() >= next_print:
+                    self.print_health()
+                    next_print = time.time() + self.report_interval
+        except KeyboardInterrupt:
+            print("Leállítás...")
+        finally:
+            self.stop()
+
+    def stop(self):
+        """
+        Az összes shard folyamat leállítása.
+        """
+        self.running = False
+        for process in self.workers.values():
+            if process.is_alive():
+                process.terminate()
+        for process in self.workers.values():
+            process.join(timeout=2.0)
+        self.metrics.stop_server()
+        print("Felügyelő leállítva")
+
+# --------------------------
+# Főprogram
+# --------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Okos otthon vezérlők futtatása folyamatokra osztva")
+    parser.add_argument("gateways", help="a gateway-ek listája (JSON fájl)")
+    parser.add_argument("--processes", type=int, default=None, help="shard folyamatok száma (alapértelmezés: magok száma)")
+    parser.add_argument("--report-interval", type=float, default=5.0, help="jelentések gyakorisága másodpercben")
+    parser.add_argument("--metrics-port", type=int, default=9108, help="Prometheus végpont portja (0: kikapcsolva)")
+    parser.add_argument("--duration", type=float, default=None, help="futási idő másodpercben")
+    parser.add_argument("--verbose", action="store_true", help="a vezérlők konzolkimenetének megjelenítése")
+    args = parser.parse_args()
+
+    supervisor = HomeSupervisor(load_gateways(args.gateways), processes=args.processes,
+                                report_interval=args.report_interval, verbose=args.verbose)
+    if args.metrics_port:
+        supervisor.metrics.start_server(args.metrics_port)
+    supervisor.run(duration=args.duration)
+
+if __name__ == "__main__":
+    main()
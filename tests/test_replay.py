@@ -0,0 +1,113 @@
+"""
+A felvétel és a visszajátszás regressziós tesztjei (python -m pytest).
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from SmartHome_script import SensorRecorder, SensorRecording, DeviceRegistry, log
+from SmartHome_simulator import generate_devices
+from SmartHome_replay import GENERATED_START, generate, replay
+
+START = 1000.0
+
+
+@pytest.fixture(autouse=True)
+def quiet_log():
+    log.configure(level="WARNING")
+
+
+def write_recording(path):
+    """
+    Kézzel összeállított felvétel: hőmérséklet-ugrások, egy ismeretlen
+    szenzor, majd mozgás és annak megszűnése.
+    """
+    recorder = SensorRecorder(path, DeviceRegistry(generate_devices(12)))
+    recorder.record(START, {"IoT:Sensor:Temp:1": 22.0})
+    recorder.record(START + 5, {"IoT:Sensor:Temp:1": 26.0})
+    recorder.record(START + 7, {"IoT:Sensor:Temp:1": 24.0})
+    recorder.record(START + 8, {"IoT:Sensor:Temp:1": 26.0, "NEW:sensor": 1})
+    recorder.record(START + 9, {"IoT:Sensor:Temp:1": 24.0})
+    recorder.record(START + 100, {"IoT:Sensor:Motion:1": True})
+    recorder.record(START + 500, {"IoT:Sensor:Motion:1": False})
+    recorder.close()
+
+
+def setup(controller):
+    controller.setup_routines()
+    controller.add_routine(
+        "hot_for",
+        {"type": "sensor", "device_id": "IoT:Sensor:Temp:1", "condition": "above", "value": 23, "for": 50},
+        [{"device_id": "IoT:AC:1", "command": {"status": False}}])
+    controller.add_routine(
+        "lights_off_later",
+        {"type": "sensor", "device_id": "IoT:Sensor:Motion:1", "condition": "equal", "value": True},
+        [{"device_id": "IoT:Light:2", "command": {"status": False}, "delay": 300}])
+    controller.add_routine(
+        "every",
+        {"type": "time", "every": 120},
+        [{"device_id": "IoT:Light:1", "command": {"status": False}}])
+
+
+def test_replay_handcrafted_recording(tmp_path):
+    path = str(tmp_path / "kezi.shr")
+    write_recording(path)
+
+    actions, span = replay(path, setup)
+
+    relative = [dict(action, time=action["time"] - START) for action in actions]
+    assert relative == [
+        {"time": 5.0, "routine": "cooling_routine"},
+        {"time": 5.0, "device_id": "IoT:Fan:1", "state": {"status": True, "speed": 2}},
+        {"time": 55.0, "routine": "hot_for"},
+        {"time": 100.0, "routine": "motion_lights"},
+        {"time": 100.0, "routine": "lights_off_later"},
+        {"time": 100.0, "device_id": "IoT:Light:1", "state": {"status": True}},
+        {"time": 100.0, "device_id": "IoT:Light:2", "state": {"status": True}},
+        {"time": 120.0, "routine": "every"},
+        {"time": 120.0, "device_id": "IoT:Light:1", "state": {"status": False}},
+        {"time": 240.0, "routine": "every"},
+        {"time": 360.0, "routine": "every"},
+        {"time": 400.0, "device_id": "IoT:Light:2", "state": {"status": False}},
+        {"time": 480.0, "routine": "every"},
+    ]
+    assert span == 500.0
+
+
+def test_replay_until(tmp_path):
+    path = str(tmp_path / "kezi.shr")
+    write_recording(path)
+
+    actions, span = replay(path, setup, until=START + 60)
+
+    assert [action.get("routine") for action in actions if "routine" in action] == ["cooling_routine", "hot_for"]
+    assert span == 60.0
+
+
+@pytest.mark.parametrize("file_name", ["nap.shr", "nap.shr.gz"])
+def test_generate_with_seed_is_reproducible(tmp_path, file_name):
+    first, second = str(tmp_path / "a" / file_name), str(tmp_path / "b" / file_name)
+    os.makedirs(os.path.dirname(first))
+    os.makedirs(os.path.dirname(second))
+
+    assert generate(first, device_count=12, hours=2, change_rate=0.5, seed=7) == \
+        generate(second, device_count=12, hours=2, change_rate=0.5, seed=7)
+
+    recording = SensorRecording(first)
+    assert GENERATED_START <= recording.start < GENERATED_START + 60
+    assert list(recording) == list(SensorRecording(second))
+
+    actions, span = replay(first)
+    assert actions
+    assert replay(second) == (actions, span)
+    assert replay(first) == (actions, span)
+
+
+def test_generate_start(tmp_path):
+    path = str(tmp_path / "nap.shr")
+    generate(path, device_count=12, hours=1, change_rate=0.5, start=START, seed=7)
+
+    assert START <= SensorRecording(path).start < START + 60